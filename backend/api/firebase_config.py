@@ -1,5 +1,5 @@
 import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import credentials
 import os
 
 def init_firebase_admin():
@@ -26,6 +26,7 @@ def init_firebase_admin():
 
 def verify_token(id_token: str):
     """Verifies a Firebase ID token sent from the frontend."""
+    from firebase_admin import auth
     try:
         decoded_token = auth.verify_id_token(id_token)
         return decoded_token
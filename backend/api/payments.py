@@ -4,7 +4,6 @@ import hashlib
 import razorpay
 from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from firebase_admin import firestore
 
 router = APIRouter()
 
@@ -81,6 +80,7 @@ async def verify_payment(request: VerifyRequest):
         if not pack:
             raise HTTPException(status_code=400, detail="Invalid pack")
             
+        from firebase_admin import firestore   # google-cloud-firestore is slow to import
         try:
             db = firestore.client()
             user_ref = db.collection('users').document(request.user_id)
@@ -1,17 +1,25 @@
 import os
+import json
 import asyncio
-import yt_dlp
+from typing import List
+from pydantic import BaseModel
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
 import uuid
 import threading
+import functools
 
-from services.audio_processor import process_audio
 from services.presets import get_preset_params, PRESETS
-from services.ai_service import separate_stems, transcribe_audio_smart, analyze_mood_smart, analyze_song_structure, generate_preset_description
-from services.audio_analyzer import analyze_track_dna
-from firebase_admin import firestore
+from services.live_stream import follow_file
+from services.render_queue import render_slots, PRIORITY_FULL, PRIORITY_PREVIEW
+from services import render_cache as rc
+from services import cpu_budget
+from services import metrics
+from services.batch_dna import batch_dna, BATCH_MAX_FILES
+# librosa / scipy / yt_dlp / firestore and the services built on them are imported
+# where they are used, so the API answers before they load (services/warmup.py preloads them)
 
 router = APIRouter()
 
@@ -24,14 +32,80 @@ PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 # In-memory mock DB for task tracking
 TASKS     = {}   # task_id → status string
 TASK_META = {}   # task_id → {mood: str, ...}
+TASK_MOOD = {}   # task_id → mood used for the (lazily derived) MP4 background
+STRUCTURE_CACHE = {}   # upload path → Hook/Chorus structure found by a full job (previews centre on it)
+
+FINAL_STATES = ("completed", "failed")
+
+# Identical (upload, params, seed) requests share one render — see services/render_cache.py
+RENDER_CACHE = rc.RenderCache(PROCESSED_DIR, rc.RENDER_CACHE_MB * 1024 * 1024)
+
+def _resolve_preset(task_id: str, preset: str, input_path: str, dna: dict) -> tuple:
+    """Auto Vibe → (preset, mood). Non-auto presets use the preset name as mood context."""
+    if preset.lower() == "auto":
+        from services.ai_service import analyze_mood_smart
+        print(f"Detecting honest mood for {task_id}...")
+        sentiment = analyze_mood_smart(input_path, dna=dna)
+        print(f"Honest Vibe Detected: {sentiment}")
+        TASK_META[task_id] = {"mood": sentiment}   # store mood for frontend
+        
+        if "Sad" in sentiment or "Heartbreak" in sentiment:
+            preset = "Heartbreak"
+        elif "Happy" in sentiment:
+            preset = "Late Night Coding"
+        elif "Romantic" in sentiment:
+            preset = "Rainy Cafe"
+        else:
+            preset = "Rainy Cafe"
+            
+        print(f"Auto Vibe selected: {preset}")
+    else:
+        # For non-auto presets, still store the preset name as mood context
+        TASK_META.setdefault(task_id, {})
+        sentiment = preset
+    return preset, sentiment
+
+def _render_params(preset: str, ambient_vol: float, track_vol: float, reverb_amount: float, playback_speed: float, vocal_vol: float) -> dict:
+    params = get_preset_params(preset)
+    # Override the preset's volumes if user provided custom ones
+    params["ambient_vol"]   = ambient_vol
+    params["track_vol"]     = track_vol
+    params["reverb_amount"] = reverb_amount
+    params["playback_speed"]= playback_speed
+    params["vocal_vol"]     = vocal_vol      # user voice level control
+    return params
+
+def _record_failure(task_id: str):
+    import traceback
+    error_msg = traceback.format_exc()
+    print(f"Error processing {task_id}: {error_msg}")
+    try:
+        with open("temp/process_error.txt", "w") as f:
+            f.write(error_msg)
+    except: pass
+    TASKS[task_id] = "failed"
+
+def _close_job_audio(task_id: str, pcm):
+    """Publishes the job's decode counts (shown in /status) and drops its decoded PCM."""
+    TASK_META.setdefault(task_id, {})["decodes"] = pcm.counts()
+    print(f"Decodes for {task_id}: {pcm.counts()}")
+    pcm.close()
+
+def background_process_audio(task_id: str, input_path: str, preset: str, ambient_vol: float, track_vol: float, reverb_amount: float, playback_speed: float, copyright_free: bool = False, vocal_vol: float = 1.0, seed: int = None, stems: dict = None):
+    from services.ai_service import separate_stems, transcribe_audio_smart, analyze_song_structure
+    from services.audio_analyzer import analyze_track_dna
+    from services.audio_processor import process_audio
+    from services.pcm_cache import JobAudio
 
-def background_process_audio(task_id: str, input_path: str, preset: str, ambient_vol: float, track_vol: float, reverb_amount: float, playback_speed: float, copyright_free: bool = False, vocal_vol: float = 1.0):
     TASKS[task_id] = "processing"
+    pcm = JobAudio(task_id)   # decode-once PCM shared by DNA, duration and render inputs
     try:
         # --- AI STEP 1: STEM SEPARATION (StemSplit RapidAPI → Bytez → Fallback) ---
-        TASKS[task_id] = "separating_stems"
-        print(f"Starting Smart Stem Separation for {task_id}...")
-        stems = separate_stems(input_path)
+        # (already done when started by background_full_job)
+        if stems is None:
+            TASKS[task_id] = "separating_stems"
+            print(f"Starting Smart Stem Separation for {task_id}...")
+            stems = separate_stems(input_path)
         
         vocals_path = stems.get("vocals", "")
         instrumental_path = stems.get("other", input_path)  # Fallback to original if API fails
@@ -45,73 +119,156 @@ def background_process_audio(task_id: str, input_path: str, preset: str, ambient
             
             print(f"Detecting Chorus/Hooks for {task_id}...")
             structure_data = analyze_song_structure(transcript_json)
+            if structure_data:
+                STRUCTURE_CACHE[input_path] = structure_data
             
-        # --- AI STEP 3: AUTO VIBE (DNA-Aware v15) ---
-        TASKS[task_id] = "analyzing_vibe"
-        print(f"Performing technical DNA analysis for {task_id}...")
-        dna = analyze_track_dna(input_path)  # Get technical facts
-        
-        if preset.lower() == "auto":
-            print(f"Detecting honest mood for {task_id}...")
-            sentiment = analyze_mood_smart(input_path, dna=dna)
-            print(f"Honest Vibe Detected: {sentiment}")
-            TASK_META[task_id] = {"mood": sentiment}   # store mood for frontend
-            
-            if "Sad" in sentiment or "Heartbreak" in sentiment:
-                preset = "Heartbreak"
-            elif "Happy" in sentiment:
-                preset = "Late Night Coding"
-            elif "Romantic" in sentiment:
-                preset = "Rainy Cafe"
-            else:
-                preset = "Rainy Cafe"
-                
-            print(f"Auto Vibe selected: {preset}")
-        else:
-            # For non-auto presets, still store the preset name as mood context
-            TASK_META.setdefault(task_id, {})
-            sentiment = preset
+        # CPU-heavy part (DNA + render) runs in a render slot — previews go first
+        TASKS[task_id] = "waiting_for_render"
+        with render_slots.slot(PRIORITY_FULL), cpu_budget.job():
+            # --- AI STEP 3: AUTO VIBE (DNA-Aware v15) ---
+            TASKS[task_id] = "analyzing_vibe"
+            print(f"Performing technical DNA analysis for {task_id}...")
+            # Already analysed by /analyze-batch? (waits if that analysis is still running)
+            dna = batch_dna.dna_for(input_path) or analyze_track_dna(input_path, pcm=pcm)  # Get technical facts
+            preset, sentiment = _resolve_preset(task_id, preset, input_path, dna)
 
-        TASKS[task_id] = "applying_lofi_effects"
-        
-        params = get_preset_params(preset)
-        # Override the preset's volumes if user provided custom ones
-        params["ambient_vol"]   = ambient_vol
-        params["track_vol"]     = track_vol
-        params["reverb_amount"] = reverb_amount
-        params["playback_speed"]= playback_speed
-        params["vocal_vol"]     = vocal_vol      # user voice level control
-        
-        output_wav = PROCESSED_DIR / f"{task_id}.wav"
-        output_mp3 = PROCESSED_DIR / f"{task_id}.mp3"
-        output_mp4 = PROCESSED_DIR / f"{task_id}.mp4"
-        
-        # Pass both the instrumental, clean vocals, AND structure data to the processor
-        success = process_audio(
-            str(instrumental_path), 
-            str(vocals_path), 
-            str(output_wav), 
-            str(output_mp3), 
-            str(output_mp4), 
-            params, 
-            structure_data=structure_data, 
-            copyright_free=copyright_free,
-            dna_data=dna,
-            mood=sentiment # ← v16: Mood-aware video selection
-        )
+            TASKS[task_id] = "applying_lofi_effects"
+            params = _render_params(preset, ambient_vol, track_vol, reverb_amount, playback_speed, vocal_vol)
+            
+            output_mp3 = PROCESSED_DIR / f"{task_id}.mp3"
+            TASK_MOOD[task_id] = sentiment
+            
+            # Pass both the instrumental, clean vocals, AND structure data to the processor
+            # Only the MP3 master is rendered — WAV/MP4 are derived on first download
+            success = process_audio(
+                str(instrumental_path), 
+                str(vocals_path), 
+                None, 
+                str(output_mp3), 
+                None, 
+                params, 
+                structure_data=structure_data, 
+                copyright_free=copyright_free,
+                dna_data=dna,
+                mood=sentiment, # ← v16: Mood-aware video selection
+                seed=seed,
+                pcm=pcm
+            )
         if success:
             TASKS[task_id] = "completed"
         else:
             TASKS[task_id] = "failed"
+    except Exception:
+        _record_failure(task_id)
+    finally:
+        _close_job_audio(task_id, pcm)
+
+def background_process_preview(task_id: str, input_path: str, preset: str, ambient_vol: float, track_vol: float, reverb_amount: float, playback_speed: float, copyright_free: bool = False, vocal_vol: float = 1.0, seed: int = None):
+    """
+    Preview: a PREVIEW_SECONDS excerpt through the same process_audio chain.
+    No stem separation / lyrics lookup (zero-loss fallback stems), MP3 only.
+    """
+    from services.audio_analyzer import analyze_track_dna
+    from services.audio_processor import process_audio
+    from services.pcm_cache import JobAudio
+    from services.preview import pick_preview_window, cut_excerpt
+
+    excerpt = PROCESSED_DIR / f"preview_src_{task_id}.wav"
+    pcm = JobAudio(task_id)
+    TASKS[task_id] = "waiting_for_render"
+    try:
+        with render_slots.slot(PRIORITY_PREVIEW), cpu_budget.job():
+            TASKS[task_id] = "cutting_preview"
+            start, reason = pick_preview_window(input_path, STRUCTURE_CACHE.get(input_path), pcm=pcm)
+            print(f"Preview {task_id}: {reason} window @ {start:.1f}s")
+            cut_excerpt(input_path, start, str(excerpt), pcm=pcm)
+
+            TASKS[task_id] = "analyzing_vibe"
+            dna = analyze_track_dna(str(excerpt), pcm=pcm)
+            preset, sentiment = _resolve_preset(task_id, preset, input_path, dna)
+            TASK_META[task_id].update({"preview": True, "preview_start": round(start, 2), "preview_window": reason})
+
+            TASKS[task_id] = "applying_lofi_effects"
+            params = _render_params(preset, ambient_vol, track_vol, reverb_amount, playback_speed, vocal_vol)
+            TASK_MOOD[task_id] = sentiment
+            success = process_audio(
+                str(excerpt),
+                str(excerpt),
+                None,
+                str(PROCESSED_DIR / f"{task_id}.mp3"),
+                None,
+                params,
+                copyright_free=copyright_free,
+                dna_data=dna,
+                mood=sentiment,
+                seed=seed,
+                pcm=pcm
+            )
+        TASKS[task_id] = "completed" if success else "failed"
+    except Exception:
+        _record_failure(task_id)
+    finally:
+        _close_job_audio(task_id, pcm)
+        if excerpt.exists():
+            try: excerpt.unlink()
+            except: pass
+
+async def background_full_job(cache_key, task_id: str, *job_args):
+    """
+    background_process_audio with the stem separation awaited on the event loop:
+    the StemSplit job is watched by the shared poller (services/stem_poller.py),
+    so no worker thread sleeps through it. The rest runs on the threadpool as before.
+    """
+    from services.ai_service import separate_stems_async
+    input_path = job_args[0]
+    TASKS[task_id] = "separating_stems"
+    print(f"Starting Smart Stem Separation for {task_id}...")
+    try:
+        stems = await separate_stems_async(input_path)
     except Exception as e:
-        import traceback
-        error_msg = traceback.format_exc()
-        print(f"Error processing {task_id}: {error_msg}")
-        try:
-            with open("temp/process_error.txt", "w") as f:
-                f.write(error_msg)
-        except: pass
-        TASKS[task_id] = "failed"
+        print(f"Stem separation error for {task_id}: {e}")
+        stems = {"vocals": input_path, "other": input_path}
+    job = functools.partial(background_process_audio, stems=stems)
+    if cache_key:
+        await run_in_threadpool(background_cached_job, job, cache_key, task_id, *job_args)
+    else:
+        await run_in_threadpool(job, task_id, *job_args)
+
+def background_cached_job(job, cache_key: str, task_id: str, *args):
+    """Runs a render job and publishes (or releases) its render-cache key."""
+    try:
+        job(task_id, *args)
+    finally:
+        if TASKS.get(task_id) == "completed":
+            RENDER_CACHE.complete(cache_key, task_id, {"meta": TASK_META.get(task_id, {}), "mood": TASK_MOOD.get(task_id, "Neutral")})
+        else:
+            RENDER_CACHE.abandon(cache_key)
+
+def _spend_credit(user_id: str, preview: bool):
+    from firebase_admin import firestore
+    try:
+        db = firestore.client()
+        user_ref = db.collection('users').document(user_id)
+        user_doc = user_ref.get()
+        
+        current_credits = user_doc.to_dict().get('credits', 0) if user_doc.exists else 0
+        if current_credits <= 0:
+            raise HTTPException(status_code=402, detail="Insufficient credits for Copyright-Free mode")
+        
+        if not preview:   # previews are free, but still need a credit in the bank
+            user_ref.update({'credits': current_credits - 1})
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error checking credits: {e}")
+        raise HTTPException(status_code=500, detail="Failed to verify credits")
+
+def _upload_path(file_id: str):
+    for ext in ['mp3', 'wav']:
+        potential_path = UPLOAD_DIR / f"{file_id}.{ext}"
+        if potential_path.exists():
+            return potential_path
+    return None
 
 @router.post("/upload")
 async def upload_audio(file: UploadFile = File(...)):
@@ -142,6 +299,7 @@ async def youtube_download(background_tasks: BackgroundTasks, url: str = Form(..
     YT_TASKS[task_id] = {"status": "downloading", "file_id": file_id}
 
     def run_download(task_id: str, file_id: str, dl_url: str):
+        import yt_dlp
         ydl_opts = {
             'format': 'bestaudio/best',
             'outtmpl': str(UPLOAD_DIR / f"{file_id}.%(ext)s"),
@@ -198,65 +356,151 @@ async def process_audio_endpoint(
     playback_speed: float = Form(0.85),
     copyright_free: bool = Form(False),
     vocal_vol: float = Form(1.0),       # voice level, 0.3–2.0
-    user_id: str = Form(None)
+    user_id: str = Form(None),
+    preview: bool = Form(False),        # 30s excerpt, scheduled ahead of full renders
+    seed: int = Form(None)              # deterministic copyright-free beat (makes it cacheable)
 ):
+    if copyright_free and not user_id:
+        raise HTTPException(status_code=401, detail="Must be logged in to use Copyright-Free mode")
+
+    input_file = _upload_path(file_id)
+    if not input_file:
+        raise HTTPException(status_code=404, detail="Uploaded file not found.")
+
+    task_id = str(uuid.uuid4())
+    job_args = (str(input_file), preset, ambient_vol, track_vol, reverb_amount, playback_speed, copyright_free, vocal_vol, seed)
+
+    # Copyright-free without a seed picks a random beat → not reproducible, never cached
+    cache_key = None
+    if rc.RENDER_CACHE_ENABLED and not (copyright_free and seed is None):
+        digest = await asyncio.to_thread(rc.input_digest, str(input_file))
+        cache_key = rc.render_key(digest, {
+            "preset": preset, "ambient_vol": ambient_vol, "track_vol": track_vol, "reverb_amount": reverb_amount,
+            "playback_speed": playback_speed, "vocal_vol": vocal_vol, "copyright_free": copyright_free,
+            "preview": preview, "seed": seed,
+        })
+        task_id, state = RENDER_CACHE.claim(cache_key, task_id)
+    else:
+        state = rc.NEW
+
     if copyright_free:
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Must be logged in to use Copyright-Free mode")
         try:
-            db = firestore.client()
-            user_ref = db.collection('users').document(user_id)
-            user_doc = user_ref.get()
-            
-            current_credits = user_doc.to_dict().get('credits', 0) if user_doc.exists else 0
-            if current_credits <= 0:
-                raise HTTPException(status_code=402, detail="Insufficient credits for Copyright-Free mode")
-            
-            user_ref.update({'credits': current_credits - 1})
+            await asyncio.to_thread(_spend_credit, user_id, preview)
         except HTTPException:
+            if cache_key and state == rc.NEW:
+                RENDER_CACHE.abandon(cache_key)
             raise
-        except Exception as e:
-            print(f"Error checking credits: {e}")
-            raise HTTPException(status_code=500, detail="Failed to verify credits")
 
-    input_file = None
-    for ext in ['mp3', 'wav']:
-        potential_path = UPLOAD_DIR / f"{file_id}.{ext}"
-        if potential_path.exists():
-            input_file = potential_path
-            break
-            
-    if not input_file:
-        raise HTTPException(status_code=404, detail="Uploaded file not found.")
-        
-    task_id = str(uuid.uuid4())
+    if state == rc.HIT:
+        # Same upload + params already rendered — serve the existing master
+        cached = RENDER_CACHE.meta(cache_key)
+        TASKS[task_id] = "completed"
+        TASK_META.setdefault(task_id, cached.get("meta", {}))
+        TASK_MOOD.setdefault(task_id, cached.get("mood", "Neutral"))
+        return {"task_id": task_id, "status": "completed", "copyright_free": copyright_free, "preview": preview, "cached": True}
+    if state == rc.COALESCED:
+        # Identical request still rendering — attach to it
+        return {"task_id": task_id, "status": TASKS.get(task_id, "queued"), "copyright_free": copyright_free, "preview": preview, "coalesced": True}
+
     TASKS[task_id] = "queued"
     
-    background_tasks.add_task(
-        background_process_audio, task_id, str(input_file),
-        preset, ambient_vol, track_vol, reverb_amount, playback_speed, copyright_free, vocal_vol
-    )
+    if not preview:
+        background_tasks.add_task(background_full_job, cache_key, task_id, *job_args)
+    elif cache_key:
+        background_tasks.add_task(background_cached_job, background_process_preview, cache_key, task_id, *job_args)
+    else:
+        background_tasks.add_task(background_process_preview, task_id, *job_args)
     
-    return {"task_id": task_id, "status": "processing", "copyright_free": copyright_free}
+    return {"task_id": task_id, "status": "processing", "copyright_free": copyright_free, "preview": preview}
+
+class BatchAnalyzeRequest(BaseModel):
+    file_ids: List[str]
+
+@router.post("/analyze-batch")
+async def analyze_batch_endpoint(request: BatchAnalyzeRequest):
+    """
+    DNA for many uploads at once on the batch process pool (services/batch_dna.py).
+    Streams one NDJSON line per file as it finishes: {file_id, dna, secs, cached} or {file_id, error}.
+    Results are kept, so the /process calls that follow skip the analysis.
+    """
+    if not request.file_ids:
+        raise HTTPException(status_code=400, detail="No file_ids given.")
+    if len(request.file_ids) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch.")
+
+    paths = {fid: _upload_path(fid) for fid in dict.fromkeys(request.file_ids)}
+    # Submitted before the response starts: the work runs even if the client stops reading
+    futures = await asyncio.to_thread(lambda: {fid: batch_dna.submit(str(p)) for fid, p in paths.items() if p})
+
+    async def one(fid: str, fut) -> dict:
+        try:
+            return {"file_id": fid, **(await asyncio.wrap_future(fut))}
+        except Exception as e:
+            return {"file_id": fid, "error": str(e) or type(e).__name__}
+
+    async def results():
+        for fid, p in paths.items():
+            if not p:
+                yield json.dumps({"file_id": fid, "error": "Uploaded file not found."}) + "\n"
+        for done in asyncio.as_completed([one(fid, fut) for fid, fut in futures.items()]):
+            yield json.dumps(await done) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 @router.get("/description/{mood}")
 async def get_mood_description(mood: str):
     from services.ai_service import generate_preset_description
-    desc = generate_preset_description(mood)
+    # Cached (services/lookup_cache.py); a miss blocks on OpenRouter — off the event loop
+    desc = await asyncio.to_thread(generate_preset_description, mood)
     return {"description": desc}
 
 @router.get("/status/{task_id}")
 async def get_status(task_id: str):
     status = TASKS.get(task_id, "not_found")
     meta   = TASK_META.get(task_id, {})
-    return {"task_id": task_id, "status": status, **meta}
+    resp = {"task_id": task_id, "status": status, **meta}
+    if status == "applying_lofi_effects" and (PROCESSED_DIR / f"{task_id}.mp3").exists():
+        # Master is being written — it can be played progressively already
+        resp["stream"] = f"/api/stream/{task_id}"
+    return resp
+
+@router.get("/metrics")
+async def get_metrics():
+    """Process-wide counters since startup (decodes per stage, PCM cache decode time, ...)."""
+    from services import http_client, lookup_cache
+    return {**metrics.snapshot(), **http_client.pool_stats(), **lookup_cache.stats()}
+
+@router.get("/stream/{task_id}")
+async def stream_audio(task_id: str):
+    """Plays the MP3 master while it is still rendering (chunked), or the finished file."""
+    if task_id not in TASKS:
+        raise HTTPException(status_code=404, detail="Task not found.")
+    file_path = PROCESSED_DIR / f"{task_id}.mp3"
+    if TASKS[task_id] in FINAL_STATES:
+        if TASKS[task_id] == "failed" or not file_path.exists():
+            raise HTTPException(status_code=404, detail="File not found.")
+        return FileResponse(path=file_path, media_type="audio/mpeg")
+
+    is_live = lambda: TASKS.get(task_id) not in FINAL_STATES
+    return StreamingResponse(follow_file(str(file_path), is_live), media_type="audio/mpeg",
+                             headers={"Cache-Control": "no-cache"})
 
 @router.get("/download/{task_id}")
 async def download_audio(task_id: str, format: str = "mp3"):
     if format not in ["mp3", "wav", "mp4"]:
         raise HTTPException(status_code=400, detail="Invalid format requested.")
         
+    if TASKS.get(task_id, "completed") not in FINAL_STATES:
+        # The master on disk is still growing — /stream plays it, /download waits for the full file
+        raise HTTPException(status_code=404, detail="Processing not complete.")
+
     file_path = PROCESSED_DIR / f"{task_id}.{format}"
+    if not file_path.exists() and format != "mp3" and TASKS.get(task_id, "completed") == "completed":
+        # Lazy derivative: first request renders it (single-flight), later ones hit the file
+        from services.artifacts import ensure_artifact
+        derived = await asyncio.to_thread(ensure_artifact, str(PROCESSED_DIR), task_id, format, TASK_MOOD.get(task_id, "Neutral"))
+        if derived:
+            file_path = Path(derived)
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found or processing not complete.")
         
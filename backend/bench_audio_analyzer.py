@@ -0,0 +1,140 @@
+"""
+bench_audio_analyzer.py — speed and peak memory of analyze_track_dna vs the legacy multi-STFT analyzer.
+
+Usage:
+    python bench_audio_analyzer.py [audio ...]
+
+Without arguments the DNA fixture set is used (synthetic, built into
+temp/bench/dna_fixtures on first run). For every file both analyzers run
+on the same decoded signal; the decode itself is timed once and excluded.
+Peak memory is the tracemalloc peak of the analysis (NumPy buffers included).
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from bench_render import BENCH_DIR
+from services.audio_analyzer import dna_from_signal, dna_result
+
+FIXTURE_DIR = os.path.join(BENCH_DIR, "dna_fixtures")
+FIXTURE_SR = 22050
+FIXTURE_SECONDS = 45
+FIXTURE_NAMES = ("dark_pad", "drum_heavy", "bright_hiss", "mid_melody", "bass_groove", "lofi_beat", "busy_mix",
+                 "perc_below", "perc_above", "bass_below", "bass_above", "cent_below", "cent_above")
+# Pairs a few % either side of one DNA threshold: fixture → (flag, expected value)
+THRESHOLD_FIXTURES = {
+    "perc_below": ("is_drum_heavy", False),   "perc_above": ("is_drum_heavy", True),     # percussiveness 0.35
+    "bass_below": ("is_bass_heavy", False),   "bass_above": ("is_bass_heavy", True),     # bass_ratio 1.2
+    "cent_below": ("is_already_dark", True),  "cent_above": ("is_already_dark", False),  # centroid 1200 Hz
+}
+
+
+def legacy_dna_from_signal(y: np.ndarray, sr: int) -> dict:
+    """The analyzer as it was: beat_track, hpss + iSTFT, rms, centroid and band STFT each on their own."""
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    bpm = float(tempo[0]) if isinstance(tempo, (list, np.ndarray)) else float(tempo)
+
+    y_harmonic, y_percussive = librosa.effects.hpss(y)
+    percussive_energy = np.mean(librosa.feature.rms(y=y_percussive))
+    harmonic_energy = np.mean(librosa.feature.rms(y=y_harmonic))
+    percussiveness = float(percussive_energy / (harmonic_energy + 1e-6))
+
+    avg_cent = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
+
+    stft = np.abs(librosa.stft(y))
+    freqs = librosa.fft_frequencies(sr=sr)
+    bass_energy = np.mean(stft[(freqs >= 10) & (freqs <= 250), :])
+    mid_energy = np.mean(stft[(freqs > 250) & (freqs <= 2000), :])
+    bass_ratio = float(bass_energy / (mid_energy + 1e-6))
+
+    return dna_result(bpm, percussiveness, avg_cent, bass_ratio)
+
+
+def _fixture_signals(sr: int = FIXTURE_SR, seconds: float = FIXTURE_SECONDS) -> dict:
+    """Deterministic tracks spread over the DNA flag space, plus pairs straddling each flag's threshold."""
+    from scipy.signal import butter, sosfilt
+    from services.drum_generator import render_drum_loop
+    from services.lofi_beat_generator import generate_lofi_beat
+
+    rng = np.random.default_rng(7)
+    n = int(sr * seconds)
+    t = np.arange(n) / sr
+
+    def chord(freqs, amp=0.2):
+        return sum(np.sin(2 * np.pi * f * t) for f in freqs) * amp / len(freqs)
+
+    def drums(bpm, amp=1.0):
+        loop = librosa.resample(render_drum_loop(bpm).astype(np.float64), orig_sr=44100, target_sr=sr)
+        return np.resize(loop, n) * amp
+
+    def noise(lo, hi, amp):
+        return sosfilt(butter(4, [lo, hi], btype="band", fs=sr, output="sos"), rng.standard_normal(n)) * amp
+
+    beat = librosa.resample(generate_lofi_beat(seconds + 1, 80).astype(np.float64), orig_sr=44100, target_sr=sr)
+
+    return {
+        "dark_pad":      chord([55, 110, 165, 220]),
+        "drum_heavy":    drums(90) + chord([220, 277, 330], 0.05),
+        "bright_hiss":   noise(3000, 9000, 0.3) + chord([880, 1320], 0.05),
+        "mid_melody":    chord([440, 554, 659, 880]) * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t)),
+        "bass_groove":   chord([41, 82], 0.5) + drums(75, 0.4) + noise(500, 2000, 0.02),
+        "lofi_beat":     beat[:n],
+        "busy_mix":      drums(110, 0.6) + chord([110, 220, 440, 880]) + noise(2000, 8000, 0.1),
+        # legacy analyzer: percussiveness 0.330 / 0.373, bass_ratio 1.147 / 1.286, centroid ~1149 / ~1265 Hz
+        "perc_below":    drums(90, 0.47) + chord([220, 277, 330]),
+        "perc_above":    drums(90, 0.53) + chord([220, 277, 330]),
+        "bass_below":    chord([55, 110], 0.033) + chord([440, 660]),
+        "bass_above":    chord([55, 110], 0.037) + chord([440, 660]),
+        "cent_below":    chord([600]) + chord([2400], 0.2 * 0.45),
+        "cent_above":    chord([600]) + chord([2400], 0.2 * 0.6),
+    }
+
+
+def make_dna_fixtures() -> list:
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    signals, paths = None, []
+    for name in FIXTURE_NAMES:
+        path = os.path.join(FIXTURE_DIR, f"{name}.wav")
+        if not os.path.exists(path):
+            signals = signals or _fixture_signals()
+            x = signals[name]
+            sf.write(path, (x / max(1e-9, np.abs(x).max()) * 0.8).astype(np.float32), FIXTURE_SR, subtype="PCM_16")
+        paths.append(path)
+    return paths
+
+
+def measure(fn, y: np.ndarray, sr: int) -> tuple:
+    """(result, seconds, peak MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(y, sr)
+    secs = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, secs, peak
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or make_dna_fixtures()
+
+    # Warm librosa / numba so neither side pays the JIT
+    y0, sr0 = librosa.load(paths[0], sr=22050, mono=True, duration=5)
+    legacy_dna_from_signal(y0, sr0), dna_from_signal(y0, sr0)
+
+    print(f"\n--- analyze_track_dna: legacy vs single STFT ---")
+    print(f"  {'file':<16} {'audio':>6} | {'legacy':>16} | {'single STFT':>16} | speedup")
+    totals = np.zeros(4)
+    for path in paths:
+        y, sr = librosa.load(path, sr=22050, mono=True)
+        _, t_old, m_old = measure(legacy_dna_from_signal, y, sr)
+        _, t_new, m_new = measure(dna_from_signal, y, sr)
+        totals += (t_old, t_new, m_old, m_new)
+        print(f"  {os.path.basename(path)[:16]:<16} {len(y) / sr:5.0f}s | {t_old:6.2f}s {m_old:6.0f} MB | "
+              f"{t_new:6.2f}s {m_new:6.0f} MB | {t_old / t_new:5.2f}x")
+    print(f"  {'total':<16} {'':>6} | {totals[0]:6.2f}s {totals[2]:6.0f} MB | {totals[1]:6.2f}s {totals[3]:6.0f} MB | "
+          f"{totals[0] / totals[1]:5.2f}x")
@@ -0,0 +1,78 @@
+"""
+bench_batch_dna.py — batch DNA on the process pool vs one file at a time.
+
+Usage:
+    python bench_batch_dna.py [audio ...]        (default: the DNA fixture set, twice over)
+
+Serial = analyze_track_dna per file in this process (librosa already warm),
+like one /process job after another. Batch = services/batch_dna.BatchDNA
+with 1 and with os.cpu_count() workers, three passes each:
+  • cold   — fresh pool and result store: worker spawn, imports and numba JIT included
+  • warm   — result store wiped, same pool (the steady state of a running server)
+  • stored — same files again: every result comes from the store
+"""
+import os
+import shutil
+import sys
+import time
+
+from bench_audio_analyzer import make_dna_fixtures
+from bench_render import BENCH_DIR
+from services.audio_analyzer import analyze_track_dna
+from services.batch_dna import BatchDNA
+
+
+def serial(paths: list) -> float:
+    start = time.perf_counter()
+    for p in paths:
+        analyze_track_dna(p)
+    return time.perf_counter() - start
+
+
+def timed_pass(runner: BatchDNA, paths: list) -> tuple:
+    """(secs, errors, cached)"""
+    start = time.perf_counter()
+    results = [r for _, r in runner.analyze(paths)]
+    secs = time.perf_counter() - start
+    time.sleep(0.2)            # results are persisted from the pool's callback thread
+    return secs, sum("error" in r for r in results), sum(bool(r.get("cached")) for r in results)
+
+
+def batch(paths: list, workers: int) -> list:
+    store = os.path.join(BENCH_DIR, f"dna_store_{workers}")
+    shutil.rmtree(store, ignore_errors=True)
+    runner = BatchDNA(store, workers)
+    try:
+        cold = timed_pass(runner, paths)
+        shutil.rmtree(store, ignore_errors=True)
+        warm = timed_pass(runner, paths)
+        stored = timed_pass(runner, paths)
+    finally:
+        runner.shutdown()
+    return [cold, warm, stored]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        paths = sys.argv[1:]
+    else:
+        # Distinct copies so identical content is not coalesced into one analysis
+        fixtures = make_dna_fixtures()
+        copy_dir = os.path.join(BENCH_DIR, "dna_batch")
+        os.makedirs(copy_dir, exist_ok=True)
+        paths = []
+        for i, src in enumerate(fixtures * 2):
+            dst = os.path.join(copy_dir, f"{i:02d}_{os.path.basename(src)}")
+            if not os.path.exists(dst):
+                with open(src, "rb") as f, open(dst, "wb") as g:
+                    g.write(f.read() + bytes([i]))   # one trailing byte → a different digest
+            paths.append(dst)
+
+    analyze_track_dna(paths[0])   # warm librosa / numba in this process
+    print(f"\n--- batch DNA: {len(paths)} files, {os.cpu_count()} cores on this host ---")
+    t_serial = serial(paths)
+    print(f"  serial            : {t_serial:6.1f}s  ({len(paths) / t_serial * 60:5.1f} files/min)")
+    for workers in sorted({1, os.cpu_count() or 1}):
+        for name, (secs, errors, cached) in zip(("cold", "warm", "stored"), batch(paths, workers)):
+            print(f"  pool × {workers:<2} {name:<6} : {secs:6.1f}s  ({len(paths) / secs * 60:7.1f} files/min, "
+                  f"{errors} errors, {cached} from the store)")
@@ -0,0 +1,125 @@
+"""
+bench_beat_generator.py — copyright-free beat synthesis: legacy per-note synthesis vs cached note templates.
+
+Usage:
+    python bench_beat_generator.py [seconds ...]      (default: 60 300 600)
+
+For every duration both generators render the same beat (same BPM, same
+seeded humanization). The template engine is timed cold (caches cleared:
+what the first song of a process pays) and warm (templates already built by
+a previous song at that tempo). The beats are compared sample for sample:
+max |Δ| and the signal-to-difference ratio. The difference is the legacy
+side's: it evaluates the sines on a float32 time axis (phase error grows with
+note length), the templates use float64 phases and match an exact float64
+render of each note to ~1e-7.
+"""
+import random
+import sys
+import time
+
+import numpy as np
+from scipy.signal import butter, sosfilt
+
+from services import lofi_beat_generator as gen
+from services.lofi_beat_generator import SR, CHORDS, EP, BASS, hz
+
+BPM = 75.0
+
+
+def legacy_lp(data: np.ndarray, cutoff: float, order: int = 2) -> np.ndarray:
+    sos = butter(order, cutoff / (SR / 2), btype='low', output='sos')
+    return sosfilt(sos, data).astype(np.float32)
+
+
+def legacy_make_note(freq, dur, harmonics, vel=0.6, cutoff=2800.0) -> np.ndarray:
+    n = int(dur * SR)
+    t = np.linspace(0, dur, n, endpoint=False, dtype=np.float32)
+    wave_out = np.zeros(n, dtype=np.float32)
+    for h, amp in harmonics:
+        wave_out += amp * np.sin(2 * np.pi * freq * h * t)
+    atk, dec, sus, rel = max(1, int(0.012 * SR)), max(1, int(0.08 * SR)), 0.60, max(1, int(0.18 * SR))
+    env = np.full(n, sus, dtype=np.float32)
+    env[:atk] = np.linspace(0, 1, atk)
+    d_end = min(atk + dec, n)
+    env[atk:d_end] = np.linspace(1, sus, d_end - atk)
+    if rel < n:
+        env[-rel:] = np.linspace(sus, 0, rel)
+    return legacy_lp(wave_out * env * vel, cutoff)
+
+
+def legacy_generate_lofi_beat(duration: float, bpm: float) -> np.ndarray:
+    """
+    The generator as it was: every note synthesized, enveloped and filtered
+    (fresh design) on its own. Mastered with today's fixed gain, not the old
+    peak normalization, so the comparison is of the synthesis alone.
+    """
+    n_samples = int(duration * SR)
+    out = np.zeros(n_samples, dtype=np.float32)
+    spb = (60.0 / bpm) * SR
+    sp_bar = spb * 4
+    rng = random.Random(42)
+    chord_idx = bar = 0
+    while True:
+        bar_start = int(bar * sp_bar)
+        if bar_start >= n_samples:
+            break
+        _, semitones = CHORDS[chord_idx % len(CHORDS)]
+        freqs = [hz(st) for st in semitones]
+        chord_dur = 2 * sp_bar / SR
+        for freq in freqs:
+            note_dur = min(chord_dur, (n_samples - bar_start) / SR)
+            if note_dur <= 0: break
+            vel = 0.38 + rng.uniform(-0.06, 0.06)
+            note = legacy_make_note(freq, note_dur, EP, vel, cutoff=2400)
+            off = int(rng.uniform(-0.020, 0.020) * SR)
+            start = max(0, bar_start + off)
+            end = min(start + len(note), n_samples)
+            out[start:end] += note[:end - start] * 0.28
+        bass_hz = freqs[0] / 2.0
+        for beat in [0, 2]:
+            for b_offset in range(2):
+                bb = int(bar_start + b_offset * spb * 4 + beat * spb)
+                if bb >= n_samples: break
+                bass_dur = min(0.48 + rng.uniform(-0.04, 0.04), (n_samples - bb) / SR)
+                vel = 0.58 + rng.uniform(-0.07, 0.07)
+                note = legacy_make_note(bass_hz, bass_dur, BASS, vel, cutoff=650)
+                swing = int(0.018 * SR) if beat == 2 else 0
+                off = int(rng.uniform(-0.012, 0.015) * SR) + swing
+                start = max(0, bb + off)
+                end = min(start + len(note), n_samples)
+                out[start:end] += note[:end - start] * 0.52
+        bar += 2
+        chord_idx += 1
+    out = legacy_lp(out, 9000)
+    out = np.tanh(out * 2.2) / 2.2
+    return out * np.float32(gen.master_gain())
+
+
+def clear_caches():
+    gen.note_template.cache_clear()
+    gen.lowpass_sos.cache_clear()
+
+
+def timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    durations = [float(s) for s in sys.argv[1:]] or [60.0, 300.0, 600.0]
+
+    print(f"\n--- generate_lofi_beat @ {BPM:.0f} BPM: legacy vs cached note templates ---")
+    print(f"  {'audio':>6} | {'legacy':>7} | {'cold':>7} {'warm':>7} | {'speedup':>13} | {'max |Δ|':>8} {'SDR':>8}")
+    for seconds in durations:
+        legacy, t_legacy = timed(legacy_generate_lofi_beat, seconds, BPM)
+        clear_caches()
+        cold, t_cold = timed(gen.generate_lofi_beat, seconds, BPM)
+        warm, t_warm = timed(gen.generate_lofi_beat, seconds, BPM)
+        assert np.array_equal(cold, warm)
+        diff = cold.astype(np.float64) - legacy
+        sdr = 10 * np.log10(np.sum(legacy.astype(np.float64) ** 2) / max(np.sum(diff ** 2), 1e-30))
+        print(f"  {seconds:5.0f}s | {t_legacy:6.2f}s | {t_cold:6.2f}s {t_warm:6.2f}s | "
+              f"{t_legacy / t_cold:5.1f}x {t_legacy / t_warm:5.1f}x | {np.abs(diff).max():.2e} {sdr:6.1f} dB")
+    info = gen.note_template.cache_info()
+    print(f"  note templates: {info.currsize} cached, {info.hits} hits / {info.misses} misses")
@@ -0,0 +1,83 @@
+"""
+bench_concurrency.py — render throughput at 1/2/4/8 concurrent jobs, with and without the CPU budget.
+
+Usage:
+    python bench_concurrency.py [input.mp3] [levels]      e.g. "" 1,2,4,8 (synthetic 60s input)
+
+Every job is a full DNA analysis + process_audio render of the same input,
+run in threads like the FastAPI background tasks. Each (mode, level) runs in
+a fresh interpreter so the native thread caps (services/cpu_budget.py) take
+effect before NumPy loads:
+  • budget   — ATMOS_THREAD_BUDGET=1 (default)
+  • unbudgeted — ATMOS_THREAD_BUDGET=0: every tool sizes itself to the machine
+Throughput = rendered audio minutes per wall-clock minute.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench_render import BENCH_DIR, make_synthetic_input
+
+DEFAULT_LEVELS = (1, 2, 4, 8)
+
+
+def run_level(src: str, jobs: int) -> dict:
+    """Child side: `jobs` concurrent jobs in this interpreter → timing dict."""
+    from services.cpu_budget import cap_native_threads
+    cap_native_threads()
+
+    import threading
+    from services import cpu_budget
+    from services.audio_processor import process_audio
+    from services.presets import get_preset_params
+    from services.video_renderer import media_duration
+
+    results = []
+
+    def job(i: int):
+        out_mp3 = os.path.join(BENCH_DIR, f"concurrency_{i}.mp3")
+        with cpu_budget.job():
+            ok = process_audio(src, src, None, out_mp3, None, get_preset_params("Rainy Cafe"), mood="Neutral")
+        results.append(ok and media_duration(out_mp3))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(jobs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    if not all(results):
+        raise RuntimeError("a render failed")
+    return {"jobs": jobs, "wall": wall, "audio": sum(results)}
+
+
+def measure(src: str, jobs: int, budget: bool) -> dict:
+    env = dict(os.environ, ATMOS_THREAD_BUDGET="1" if budget else "0")
+    proc = subprocess.run([sys.executable, __file__, "--child", src, str(jobs)], env=env,
+                          capture_output=True, text=True)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"benchmark child failed:\n{proc.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(run_level(sys.argv[2], int(sys.argv[3]))))
+        sys.exit(0)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] else make_synthetic_input(os.path.join(BENCH_DIR, "in60.mp3"), 60.0)
+    levels = [int(x) for x in sys.argv[2].split(",")] if len(sys.argv) > 2 else DEFAULT_LEVELS
+
+    print(f"\n--- render throughput vs concurrency ({os.cpu_count()} cores on this host) ---")
+    print(f"  {'jobs':>4} | {'unbudgeted':>22} | {'budgeted':>22}")
+    for jobs in levels:
+        row = []
+        for budget in (False, True):
+            r = measure(src, jobs, budget)
+            row.append(f"{r['wall']:6.1f}s {r['audio'] / r['wall']:5.2f} min/min")
+        print(f"  {jobs:>4} | {row[0]:>22} | {row[1]:>22}")
@@ -0,0 +1,99 @@
+"""
+bench_dna_sampling.py — full vs excerpt-sampled DNA analysis: speed and flag agreement.
+
+Usage:
+    python bench_dna_sampling.py [audio ...]
+
+Without arguments a song corpus is built (temp/bench/dna_songs on first run):
+each song strings DNA fixture sections together — intro / body / outro with
+different character — into 3–6 minutes, and is encoded as wav, mp3, flac,
+ogg and m4a so the seek path of every container is exercised. For every
+file both modes run from the file itself, decode included:
+  • full    — analyze_track_dna(sampled=False)
+  • sampled — SAMPLE_WINDOWS × SAMPLE_SECONDS windows, each decoded by seek
+Reported: speedup, per-flag disagreements, and BPM agreement (within BPM_TOLERANCE).
+"""
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+import ffmpeg
+
+from bench_audio_analyzer import make_dna_fixtures, FIXTURE_DIR, FIXTURE_SR
+from bench_render import BENCH_DIR
+from services.audio_analyzer import analyze_track_dna, SAMPLE_WINDOWS, SAMPLE_SECONDS
+
+SONG_DIR = os.path.join(BENCH_DIR, "dna_songs")
+FORMATS = ("wav", "mp3", "flac", "ogg", "m4a")
+LOSSY = {"mp3": {"audio_bitrate": "128k"}, "ogg": {"acodec": "libvorbis", "aq": 4},
+         "m4a": {"audio_bitrate": "128k"}}
+FLAGS = ("is_drum_heavy", "is_bass_heavy", "is_already_dark")
+BPM_TOLERANCE = 2.0
+
+# (name, [fixture sections]) — every section is one 45 s fixture; 4–8 sections → 3–6 min
+SONGS = (
+    ("beat_song",   ["dark_pad", "lofi_beat", "lofi_beat", "lofi_beat", "lofi_beat", "dark_pad"]),
+    ("drum_song",   ["drum_heavy"] * 5),
+    ("bass_song",   ["bass_groove"] * 4 + ["mid_melody"] + ["bass_groove"] * 3),
+    ("bright_song", ["bright_hiss", "bright_hiss", "mid_melody", "bright_hiss", "bright_hiss"]),
+    ("busy_song",   ["mid_melody", "busy_mix", "busy_mix", "busy_mix", "busy_mix", "busy_mix", "mid_melody"]),
+)
+
+
+def make_song_corpus() -> list:
+    os.makedirs(SONG_DIR, exist_ok=True)
+    make_dna_fixtures()
+    paths = []
+    for name, sections in SONGS:
+        wav = os.path.join(SONG_DIR, f"{name}.wav")
+        if not os.path.exists(wav):
+            y = np.concatenate([sf.read(os.path.join(FIXTURE_DIR, f"{s}.wav"), dtype="float32")[0] for s in sections])
+            sf.write(wav, y, FIXTURE_SR, subtype="PCM_16")
+        for fmt in FORMATS:
+            path = os.path.join(SONG_DIR, f"{name}.{fmt}")
+            if not os.path.exists(path):
+                (ffmpeg.input(wav)
+                       .output(path, ac=1, **LOSSY.get(fmt, {}))
+                       .run(overwrite_output=True, quiet=True))
+            paths.append(path)
+    return paths
+
+
+def timed(path: str, sampled: bool) -> tuple:
+    start = time.perf_counter()
+    dna = analyze_track_dna(path, streaming=False, sampled=sampled)
+    return dna, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or make_song_corpus()
+
+    # Warm librosa / numba so neither side pays the JIT
+    y0, sr0 = librosa.load(paths[0], sr=22050, mono=True, duration=5)
+    librosa.beat.beat_track(y=y0, sr=sr0)
+
+    print(f"\n--- DNA: full vs sampled ({SAMPLE_WINDOWS} × {SAMPLE_SECONDS:.0f}s windows) ---")
+    print(f"  {'file':<18} | {'full':>7} | {'sampled':>7} | speedup | bpm            | flags")
+    t_full = t_samp = 0.0
+    flag_misses = dict.fromkeys(FLAGS, 0)
+    bpm_hits = 0
+    for path in paths:
+        full, tf = timed(path, False)
+        samp, ts = timed(path, True)
+        t_full, t_samp = t_full + tf, t_samp + ts
+        diff = [f[3:] for f in FLAGS if bool(full[f]) != bool(samp[f])]
+        for f in FLAGS:
+            flag_misses[f] += bool(full[f]) != bool(samp[f])
+        bpm_ok = abs(full["bpm"] - samp["bpm"]) <= BPM_TOLERANCE
+        bpm_hits += bpm_ok
+        print(f"  {os.path.basename(path)[:18]:<18} | {tf:6.2f}s | {ts:6.2f}s | {tf / ts:6.2f}x | "
+              f"{full['bpm']:6.1f}→{samp['bpm']:6.1f} {'✓' if bpm_ok else '✗'} | "
+              f"{'same' if not diff else 'differ: ' + ','.join(diff)}")
+
+    n = len(paths)
+    print(f"\n  total {t_full:.1f}s → {t_samp:.1f}s  ({t_full / t_samp:.2f}x)")
+    print("  flag disagreements: " + "  ".join(f"{f[3:]} {flag_misses[f]}/{n}" for f in FLAGS))
+    print(f"  bpm within ±{BPM_TOLERANCE}: {bpm_hits}/{n}")
@@ -0,0 +1,119 @@
+"""
+bench_dsp_engine.py — ffmpeg subprocess chain vs in-process NumPy/SciPy engine.
+
+Usage:
+    python bench_dsp_engine.py [input.mp3]
+
+Each engine renders in a fresh child process so CPU time (including the
+ffmpeg children it spawns) and peak RSS are measured in isolation. The
+two WAV masters are then compared for numerical closeness.
+"""
+import os
+import sys
+import time
+import multiprocessing as mp
+
+import numpy as np
+
+from bench_render import BENCH_DIR, BENCH_DNA, make_synthetic_input
+
+try:
+    import resource   # Unix only
+except ImportError:
+    resource = None
+
+BANDS = [(20, 150), (150, 500), (500, 2000), (2000, 5000), (5000, 10000), (10000, 20000)]
+
+
+def _render(engine: str, input_path: str, out_wav: str, out_mp3: str, queue):
+    from services.audio_processor import process_audio
+    from services.presets import get_preset_params
+
+    start = time.perf_counter()
+    ok = process_audio(input_path, input_path, out_wav, out_mp3, None, get_preset_params("Rainy Cafe"),
+                       dna_data=BENCH_DNA, mood="Neutral", single_pass=True, engine=engine)
+    wall = time.perf_counter() - start
+
+    stats = {"ok": ok, "wall": wall}
+    if resource:
+        me = resource.getrusage(resource.RUSAGE_SELF)
+        kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+        stats["cpu"] = me.ru_utime + me.ru_stime + kids.ru_utime + kids.ru_stime
+        stats["rss_mb"] = me.ru_maxrss / 1024
+        # ru_maxrss of forked children starts at the parent's size (fork before exec),
+        # so report the larger of the two as the job's peak footprint
+        stats["peak_rss_mb"] = max(me.ru_maxrss, kids.ru_maxrss) / 1024
+    queue.put(stats)
+
+
+def run_engine(engine: str, input_path: str) -> dict:
+    out_wav = os.path.join(BENCH_DIR, f"dsp_{engine}.wav")
+    out_mp3 = os.path.join(BENCH_DIR, f"dsp_{engine}.mp3")
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_render, args=(engine, input_path, out_wav, out_mp3, queue))
+    proc.start()
+    stats = queue.get()
+    proc.join()
+    stats["wav"] = out_wav
+    return stats
+
+
+def band_levels(x: np.ndarray, sr: int = 44100) -> list:
+    spec = np.abs(np.fft.rfft(x))
+    freqs = np.fft.rfftfreq(len(x), 1 / sr)
+    return [20 * np.log10(np.mean(spec[(freqs >= lo) & (freqs < hi)]) + 1e-12) for lo, hi in BANDS]
+
+
+def compare(wav_a: str, wav_b: str) -> dict:
+    import soundfile as sf
+    from scipy.signal import correlate
+
+    a, sr = sf.read(wav_a, dtype='float32')
+    b, _ = sf.read(wav_b, dtype='float32')
+    n = min(len(a), len(b))
+    a, b = a[:n], b[:n]
+    a = a.mean(axis=1) if a.ndim > 1 else a
+    b = b.mean(axis=1) if b.ndim > 1 else b
+
+    # Align on a 10s window (limiter lookahead / resampler latency differ)
+    win = slice(min(5 * sr, n // 4), min(15 * sr, n))
+    cc = correlate(b[win], a[win], mode='full', method='fft')
+    lag = int(np.argmax(cc) - (win.stop - win.start) + 1)
+    if lag > 0:
+        a, b = a[:n - lag], b[lag:]
+    elif lag < 0:
+        a, b = a[-lag:], b[:n + lag]
+
+    rms = lambda x: 20 * np.log10(np.sqrt(np.mean(x ** 2)) + 1e-12)
+    return {
+        "lag_ms": lag / sr * 1000,
+        "corr": float(np.corrcoef(a, b)[0, 1]),
+        "rms_diff_db": rms(b) - rms(a),
+        "band_diff_db": [lb - la for la, lb in zip(band_levels(a, sr), band_levels(b, sr))],
+    }
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "synthetic_5min.mp3"))
+
+    results = {engine: run_engine(engine, src) for engine in ("ffmpeg", "numpy")}
+
+    print("\n--- render engine benchmark ---")
+    print(f"  {'engine':8} {'wall':>8} {'cpu':>8} {'python rss':>11} {'peak rss':>9}")
+    for engine, r in results.items():
+        if not r["ok"]:
+            print(f"  {engine:8} FAILED")
+            continue
+        print(f"  {engine:8} {r['wall']:7.2f}s {r.get('cpu', float('nan')):7.2f}s "
+              f"{r.get('rss_mb', float('nan')):9.0f}MB {r.get('peak_rss_mb', float('nan')):7.0f}MB")
+
+    if all(r["ok"] for r in results.values()):
+        c = compare(results["ffmpeg"]["wav"], results["numpy"]["wav"])
+        print("\n--- numpy vs ffmpeg output ---")
+        print(f"  alignment lag : {c['lag_ms']:.1f} ms")
+        print(f"  correlation   : {c['corr']:.3f}")
+        print(f"  rms diff      : {c['rms_diff_db']:+.2f} dB")
+        for (lo, hi), d in zip(BANDS, c["band_diff_db"]):
+            print(f"  {lo:>5}-{hi:<5} Hz : {d:+.2f} dB")
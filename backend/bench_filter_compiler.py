@@ -0,0 +1,64 @@
+"""
+bench_filter_compiler.py — raw lofi filtergraph vs compiled filtergraph.
+
+Usage:
+    python bench_filter_compiler.py [instrumental.mp3] [vocals.mp3] [runs]
+
+Renders the same job (single-pass, ffmpeg engine) with the raw chain specs
+and with the compiled ones from services/filter_compiler.py, then prints
+filter counts, best wall time and how far the two WAV masters differ.
+Without a vocals file the instrumental is reused (fallback vocal path).
+"""
+import os
+import sys
+import time
+
+from bench_render import BENCH_DIR, BENCH_DNA, make_synthetic_input
+from bench_dsp_engine import BANDS, compare
+from services.audio_processor import process_audio
+from services.filter_compiler import compile_graph, uncompiled_graph
+from services.presets import get_preset_params
+
+
+def time_render(inst: str, vocals: str, compiled: bool, runs: int) -> tuple:
+    tag = "compiled" if compiled else "raw"
+    out_wav = os.path.join(BENCH_DIR, f"graph_{tag}.wav")
+    out_mp3 = os.path.join(BENCH_DIR, f"graph_{tag}.mp3")
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        ok = process_audio(inst, vocals, out_wav, out_mp3, None, get_preset_params("Rainy Cafe"),
+                           dna_data=BENCH_DNA, mood="Neutral", single_pass=True, compiled=compiled)
+        if not ok:
+            raise RuntimeError(f"{tag} render failed")
+        best = min(best, time.perf_counter() - start)
+    return best, out_wav
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    inst = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "synthetic_5min.mp3"))
+    vocals = sys.argv[2] if len(sys.argv) > 2 else inst
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    params = get_preset_params("Rainy Cafe")
+    # Same slider defaults and DNA decisions process_audio applies for BENCH_DNA
+    args = (5, 7500, params.get("track_vol", 2.0), params.get("ambient_vol", 0.05),
+            float(params.get("vocal_vol", 1.0)), params.get("playback_speed", 0.85), "Neutral")
+    raw_graph, comp_graph = uncompiled_graph(*args), compile_graph(*args)
+
+    raw_t, raw_wav = time_render(inst, vocals, compiled=False, runs=runs)
+    comp_t, comp_wav = time_render(inst, vocals, compiled=True, runs=runs)
+
+    print("\n--- filtergraph compiler benchmark ---")
+    print(f"  filters     : {comp_graph.report()}")
+    print(f"  raw graph   : {raw_t:.2f}s  (best of {runs})")
+    print(f"  compiled    : {comp_t:.2f}s  (best of {runs})")
+    print(f"  speedup     : {raw_t / comp_t:.2f}x")
+
+    c = compare(raw_wav, comp_wav)
+    print("\n--- compiled vs raw output ---")
+    print(f"  correlation : {c['corr']:.6f}")
+    print(f"  rms diff    : {c['rms_diff_db']:+.3f} dB")
+    for (lo, hi), d in zip(BANDS, c["band_diff_db"]):
+        print(f"  {lo:>5}-{hi:<5} Hz : {d:+.3f} dB")
@@ -0,0 +1,85 @@
+"""
+bench_pcm_cache.py — decodes per job and wall time with and without the decode-once PCM cache.
+
+Usage:
+    python bench_pcm_cache.py [input.mp3]       (default: synthetic 3-minute MP3)
+
+Runs the stages of the two job types the way api/routes.py does, once with
+JobAudio(enabled=False) (every stage decodes the upload itself) and once with
+the cache on (services/pcm_cache.py):
+  • full    — analyze_track_dna + process_audio (fallback stems: vocals = instrumental)
+  • preview — pick_preview_window + cut_excerpt + analyze_track_dna + process_audio
+Both the single-pass and the two-pass render are timed. Decodes are the job's
+JobAudio.counts(); the rendered masters are compared sample-for-sample (preview
+masters differ a little more: without the cache the excerpt is cut by an MP3
+seek, with it the excerpt is a slice of the whole-file decode).
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench_render import BENCH_DIR, make_synthetic_input
+from services.audio_analyzer import analyze_track_dna
+from services.audio_processor import process_audio
+from services.dsp_engine import decode_audio
+from services.pcm_cache import JobAudio
+from services.presets import get_preset_params
+from services.preview import pick_preview_window, cut_excerpt
+
+PARAMS = get_preset_params("Rainy Cafe")
+
+
+def full_job(src: str, out_mp3: str, pcm: JobAudio, single_pass: bool):
+    dna = analyze_track_dna(src, pcm=pcm)
+    return process_audio(src, src, None, out_mp3, None, PARAMS, dna_data=dna, mood="Neutral",
+                         single_pass=single_pass, segmented=False, pcm=pcm)
+
+
+def preview_job(src: str, out_mp3: str, pcm: JobAudio, single_pass: bool):
+    excerpt = os.path.join(BENCH_DIR, f"pcm_excerpt_{pcm.job_id}.wav")
+    start, _ = pick_preview_window(src, pcm=pcm)
+    cut_excerpt(src, start, excerpt, pcm=pcm)
+    dna = analyze_track_dna(excerpt, pcm=pcm)
+    ok = process_audio(excerpt, excerpt, None, out_mp3, None, PARAMS, dna_data=dna, mood="Neutral",
+                       single_pass=single_pass, segmented=False, pcm=pcm)
+    os.remove(excerpt)
+    return ok
+
+
+def run(kind, src: str, cached: bool, single_pass: bool) -> tuple:
+    """(decode counts, seconds, output path)"""
+    tag = f"{kind.__name__}_{'cache' if cached else 'nocache'}_{'sp' if single_pass else 'tp'}"
+    out_mp3 = os.path.join(BENCH_DIR, f"pcm_{tag}.mp3")
+    pcm = JobAudio(tag, enabled=cached)
+    start = time.perf_counter()
+    try:
+        if not kind(src, out_mp3, pcm, single_pass):
+            raise RuntimeError(f"{tag} failed")
+        return pcm.counts(), time.perf_counter() - start, out_mp3
+    finally:
+        pcm.close()
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "in180.mp3"), 180.0)
+    analyze_track_dna(src)   # warm librosa / numba
+
+    rows = []
+    for kind in (full_job, preview_job):
+        for single_pass in (True, False):
+            legacy, t_legacy, out_legacy = run(kind, src, False, single_pass)
+            cached, t_cached, out_cached = run(kind, src, True, single_pass)
+            a, b = decode_audio(out_legacy), decode_audio(out_cached)
+            n = min(a.shape[1], b.shape[1])
+            diff = float(np.abs(a[:, :n] - b[:, :n]).max())
+            rows.append((f"{kind.__name__[:-4]} {'single' if single_pass else 'two'}-pass",
+                         legacy, t_legacy, cached, t_cached, diff))
+
+    print(f"\n--- decodes per job: no cache vs decode-once PCM ({os.path.basename(src)}) ---")
+    print(f"  {'job':<18} | {'decodes':>7} {'wall':>7} | {'decodes':>7} {'wall':>7} | max |Δ| of master")
+    for name, legacy, t_legacy, cached, t_cached, diff in rows:
+        print(f"  {name:<18} | {legacy['total']:>7} {t_legacy:6.1f}s | {cached['total']:>7} {t_cached:6.1f}s | {diff:.2e}")
+        print(f"  {'':<18} |   {legacy}\n  {'':<18} |   {cached}")
@@ -0,0 +1,64 @@
+"""
+bench_render.py — two-pass vs single-pass wall time for process_audio.
+
+Usage:
+    python bench_render.py [input.mp3] [runs]
+
+Without an input file a 5-minute synthetic track is rendered with ffmpeg's
+lavfi sources. Video export is skipped so only the audio render is timed.
+"""
+import os
+import sys
+import time
+import ffmpeg
+
+from services.audio_processor import process_audio
+from services.presets import get_preset_params
+
+BENCH_DIR = os.path.join("temp", "bench")
+
+# Fixed DNA so the benchmark never depends on librosa timing
+BENCH_DNA = {
+    "bpm": 80.0, "percussiveness": 0.2, "brightness": 1600, "bass_ratio": 1.0,
+    "is_drum_heavy": False, "is_bass_heavy": False, "is_already_dark": False
+}
+
+
+def make_synthetic_input(path: str, duration: float = 300.0) -> str:
+    if not os.path.exists(path):
+        tone = ffmpeg.input(f"sine=f=220:d={duration}:r=44100", f="lavfi")
+        noise = ffmpeg.input(f"anoisesrc=d={duration}:c=pink:r=44100:a=0.1", f="lavfi")
+        mix = ffmpeg.filter([tone, noise], "amix", inputs=2).filter("aformat", channel_layouts="stereo")
+        ffmpeg.output(mix, path, audio_bitrate="192k").run(overwrite_output=True, quiet=True)
+    return path
+
+
+def time_render(input_path: str, single_pass: bool, runs: int) -> float:
+    params = get_preset_params("Rainy Cafe")
+    best = float("inf")
+    for i in range(runs):
+        tag = "single" if single_pass else "two"
+        out_wav = os.path.join(BENCH_DIR, f"bench_{tag}.wav")
+        out_mp3 = os.path.join(BENCH_DIR, f"bench_{tag}.mp3")
+        start = time.perf_counter()
+        ok = process_audio(input_path, input_path, out_wav, out_mp3, None, params,
+                           dna_data=BENCH_DNA, mood="Neutral", single_pass=single_pass)
+        elapsed = time.perf_counter() - start
+        if not ok:
+            raise RuntimeError(f"{tag}-pass render failed")
+        best = min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "synthetic_5min.mp3"))
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    two = time_render(src, single_pass=False, runs=runs)
+    one = time_render(src, single_pass=True, runs=runs)
+
+    print("\n--- process_audio render benchmark (best of %d) ---" % runs)
+    print(f"  two-pass    : {two:7.2f}s")
+    print(f"  single-pass : {one:7.2f}s")
+    print(f"  saving      : {two - one:7.2f}s  ({(1 - one / two) * 100:.1f}%)")
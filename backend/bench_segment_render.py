@@ -0,0 +1,55 @@
+"""
+bench_segment_render.py — wall-time scaling of the segmented render with core count.
+
+Usage:
+    python bench_segment_render.py [input.mp3] [max_workers]
+
+Renders the same job once as a single ffmpeg graph (process_audio's normal
+single-pass path) and then segmented with 1, 2, 4, ... workers up to
+max_workers (default: all cores). Without an input a 10-minute synthetic
+track is used — the copyright-free duration cap.
+"""
+import os
+import sys
+import time
+
+from bench_render import BENCH_DIR, BENCH_DNA, make_synthetic_input
+from services.audio_processor import process_audio
+from services.presets import get_preset_params
+from services.segment_render import default_workers
+
+
+def time_job(src: str, tag: str, **kwargs) -> float:
+    out_mp3 = os.path.join(BENCH_DIR, f"segbench_{tag}.mp3")
+    start = time.perf_counter()
+    ok = process_audio(src, src, None, out_mp3, None, get_preset_params("Rainy Cafe"),
+                       dna_data=BENCH_DNA, mood="Neutral", single_pass=True, **kwargs)
+    if not ok:
+        raise RuntimeError(f"{tag} render failed")
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    import services.segment_render as segment_render
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "synthetic_10min.mp3"), 600.0)
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else default_workers()
+
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+
+    baseline = time_job(src, "graph", segmented=False)
+    results = {}
+    for workers in counts:
+        segment_render.default_workers = lambda w=workers: w
+        results[workers] = time_job(src, f"seg{workers}", segmented=True)
+
+    print(f"\n--- segmented render scaling ({os.cpu_count()} cores on this host) ---")
+    print(f"  single graph     : {baseline:7.2f}s")
+    for workers, secs in results.items():
+        print(f"  {workers:2d} worker(s)     : {secs:7.2f}s  ({baseline / secs:.2f}x vs single graph, "
+              f"{results[1] / secs:.2f}x vs 1 worker)")
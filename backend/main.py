@@ -6,6 +6,10 @@ import os
 # Ensure environment variables are loaded FIRST
 load_dotenv()
 
+# Cap BLAS / OpenMP thread pools to the per-job budget before NumPy loads
+from services.cpu_budget import cap_native_threads
+cap_native_threads()
+
 from api.routes import router as api_router
 from api.firebase_config import init_firebase_admin
 
@@ -31,6 +35,35 @@ async def add_cors_headers(request: Request, call_next):
     response.headers["Access-Control-Allow-Headers"] = "*"
     return response
 
+# Pre-render the cached ambience beds and drum loops off the request path,
+# refill the copyright-free beat pool in a niced process (services/beat_pool.py),
+# preload + JIT-warm the analysis stack (imported lazily, see services/warmup.py)
+# and clear decoded PCM a previous process left in temp/pcm (services/pcm_cache.py)
+@app.on_event("startup")
+async def warm_render_caches():
+    import threading
+    from services.warmup import warm_up
+
+    def warm_all():
+        # Imported here, not in the hook: NumPy & co. would otherwise load before the first request
+        from services.ambience import warm_ambience_beds
+        from services.drum_generator import warm_drum_loops
+        from services.beat_pool import start_refill
+        from services.pcm_cache import sweep_stale
+        sweep_stale()
+        threading.Thread(target=warm_ambience_beds, daemon=True).start()
+        threading.Thread(target=warm_drum_loops, daemon=True).start()
+        start_refill()
+        warm_up()
+
+    threading.Thread(target=warm_all, daemon=True).start()
+
+# Stop the batch DNA worker processes with the server
+@app.on_event("shutdown")
+async def stop_batch_workers():
+    from services.batch_dna import batch_dna
+    batch_dna.shutdown()
+
 from api.payments import router as payments_router
 
 app.include_router(api_router, prefix="/api")
@@ -1,10 +1,15 @@
 import os
-import requests
 import json
+import asyncio
+import threading
 import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
 from dotenv import load_dotenv
 
+from services import http_client
+from services.lookup_cache import cached
+
 load_dotenv()
 
 # ── API KEYS ─────────────────────────────────────────────────────────────────
@@ -21,6 +26,19 @@ LYRICSOVH_BASE   = "https://api.lyrics.ovh/v1"
 MUSICBRAINZ_BASE = "https://musicbrainz.org/ws/2"
 JIOSAAVN_BASE    = "https://saavn.dev/api"   # Community mirror of JioSaavn API
 
+OPENROUTER_URL   = "https://openrouter.ai/api/v1/chat/completions"
+STEMSPLIT_HOST   = "stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com"
+STEMSPLIT_BASE   = f"https://{STEMSPLIT_HOST}"
+
+# Every call below goes through services/http_client.py: one keep-alive
+# connection pool per host, retries with backoff for idempotent requests.
+# The @cached lookups answer repeats from services/lookup_cache.py.
+
+# Concurrent lookups (section 8): overall deadlines, lookup threads
+MOOD_DEADLINE   = float(os.getenv("ATMOS_MOOD_DEADLINE", "20"))
+LYRICS_DEADLINE = float(os.getenv("ATMOS_LYRICS_DEADLINE", "12"))
+LOOKUP_WORKERS  = 16
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 1. LYRICS (FREE — No Key)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -29,10 +47,15 @@ def get_lyrics_free(artist: str, title: str) -> str:
     Fetch song lyrics using Lyrics.ovh — completely FREE, no API key needed.
     Falls back to JioSaavn for Indian songs.
     """
-    # Try Lyrics.ovh first (works great for Bollywood/Hindi too)
+    # Try Lyrics.ovh first (works great for Bollywood/Hindi too), then JioSaavn for Indian songs
+    return _lyrics_ovh(artist, title) or _lyrics_jiosaavn(artist, title)
+
+
+@cached("lyrics")
+def _lyrics_ovh(artist: str, title: str) -> str:
     try:
         url = f"{LYRICSOVH_BASE}/{urllib.parse.quote(artist)}/{urllib.parse.quote(title)}"
-        r = requests.get(url, timeout=10)
+        r = http_client.get(url, timeout=10)
         if r.status_code == 200:
             lyrics = r.json().get("lyrics", "")
             if lyrics and len(lyrics) > 50:
@@ -40,11 +63,14 @@ def get_lyrics_free(artist: str, title: str) -> str:
                 return lyrics
     except Exception as e:
         print(f"Lyrics.ovh error: {e}")
+    return ""
 
-    # Try JioSaavn for Indian songs
+
+@cached("lyrics")
+def _lyrics_jiosaavn(artist: str, title: str) -> str:
     try:
         search_url = f"{JIOSAAVN_BASE}/search/songs?query={urllib.parse.quote(title + ' ' + artist)}&limit=1"
-        r = requests.get(search_url, timeout=10)
+        r = http_client.get(search_url, timeout=10)
         if r.status_code == 200:
             data = r.json()
             songs = data.get("data", {}).get("results", [])
@@ -60,6 +86,7 @@ def get_lyrics_free(artist: str, title: str) -> str:
 # ─────────────────────────────────────────────────────────────────────────────
 # 2. SONG METADATA & MOOD TAGS (FREE — No Key)
 # ─────────────────────────────────────────────────────────────────────────────
+@cached("metadata", is_miss=lambda m: not m.get("tags") and m.get("genre") == "Unknown")
 def get_song_metadata_free(artist: str, title: str) -> dict:
     """
     Get song tags, genre, mood from MusicBrainz — FREE, no API key.
@@ -75,7 +102,7 @@ def get_song_metadata_free(artist: str, title: str) -> dict:
             "fmt": "json",
             "limit": 1
         }
-        r = requests.get(search_url, params=params, headers=headers, timeout=10)
+        r = http_client.get(search_url, params=params, headers=headers, timeout=10)
         
         if r.status_code == 200:
             data = r.json()
@@ -130,6 +157,7 @@ def _infer_mood_from_tags(tags: list) -> str:
 # ─────────────────────────────────────────────────────────────────────────────
 # 3. JIOSAAVN SONG SEARCH (FREE — No Key, great for Indian songs)
 # ─────────────────────────────────────────────────────────────────────────────
+@cached("jiosaavn")
 def search_jiosaavn(query: str) -> dict:
     """
     Search JioSaavn for song info — FREE, no API key.
@@ -137,7 +165,7 @@ def search_jiosaavn(query: str) -> dict:
     """
     try:
         url = f"{JIOSAAVN_BASE}/search/songs?query={urllib.parse.quote(query)}&limit=5"
-        r = requests.get(url, timeout=10)
+        r = http_client.get(url, timeout=10)
         if r.status_code == 200:
             data = r.json()
             songs = data.get("data", {}).get("results", [])
@@ -163,58 +191,45 @@ def search_jiosaavn(query: str) -> dict:
 def analyze_mood_smart(filename: str, dna: dict = None) -> str:
     """
     Smart mood analysis using metadata + technical DNA.
+    Sync wrapper of analyze_mood_smart_async (the lookups run concurrently).
     """
-    dna = dna or {}
-    bpm = dna.get('bpm', 0)
-    percussive = dna.get('percussiveness', 0)
-    # Step 1: Parse filename for artist/title hints
-    base = os.path.splitext(os.path.basename(filename))[0]
+    return _run_sync(analyze_mood_smart_async(filename, dna))
+
+
+def _artist_title(path: str) -> tuple:
+    """(artist, title) guessed from an "Artist - Title" file name."""
+    base = os.path.splitext(os.path.basename(path))[0]
     parts = base.replace("_", " ").replace("-", " - ").split(" - ")
-    
     artist = parts[0].strip() if len(parts) > 0 else "Unknown"
     title  = parts[1].strip() if len(parts) > 1 else base.strip()
-    
-    print(f"🎵 Analyzing mood for: {artist} — {title}")
-    
-    # Step 2: Try MusicBrainz (free)
-    metadata = get_song_metadata_free(artist, title)
-    if metadata.get("mood") not in ["Neutral", "Calm"]:
-        print(f"🎭 Mood from MusicBrainz: {metadata['mood']}")
-        return metadata["mood"]
-    
-    # Step 3: Try JioSaavn (free — gives language clue)
-    jio_data = search_jiosaavn(base)
-    if jio_data.get("language") in ["hindi", "punjabi", "tamil"]:
-        # Indian songs have different mood patterns
-        if metadata.get("tags"):
-            return metadata["mood"]
-    
-    # Step 4: If we have OpenRouter key, use it for final analysis
-    if OPENROUTER_API_KEY:
-        tags_str = ", ".join(metadata["tags"][:10])
-        dna_context = f"BPM: {bpm}, Percussiveness: {percussive}, Brightness Score: {dna.get('brightness', 'N/A')}"
-        
-        try:
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
-                data=json.dumps({
-                    "model": "meta-llama/llama-3-8b-instruct:free",
-                    "messages": [{
-                        "role": "user",
-                        "content": f"Analyze this song honestly: '{title}' by {artist}.\nTechnical DNA: {dna_context}\nTags: {tags_str}\n\nBased on these facts, what is the dominant mood? Reply with ONE word only: Happy/Sad/Calm/Romantic/Neutral"
-                    }]
-                }),
-                timeout=15
-            )
-            mood = response.json()['choices'][0]['message']['content'].strip().split()[0].replace(".", "").replace(",", "")
-            if mood in ["Happy", "Sad", "Calm", "Romantic", "Neutral"]:
-                print(f"🤖 AI Producer Choice: {mood}")
-                return mood
-        except Exception as e:
-            print(f"OpenRouter mood error: {e}")
-    
-    return metadata.get("mood", "Neutral")
+    return artist, title
+
+
+@cached("mood")
+def _openrouter_mood(artist: str, title: str, dna: dict, tags: list) -> Optional[str]:
+    """One-word mood from OpenRouter, or None."""
+    tags_str = ", ".join(tags[:10])
+    dna_context = f"BPM: {dna.get('bpm', 0)}, Percussiveness: {dna.get('percussiveness', 0)}, Brightness Score: {dna.get('brightness', 'N/A')}"
+    try:
+        response = http_client.post(
+            url=OPENROUTER_URL,
+            headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
+            data=json.dumps({
+                "model": "meta-llama/llama-3-8b-instruct:free",
+                "messages": [{
+                    "role": "user",
+                    "content": f"Analyze this song honestly: '{title}' by {artist}.\nTechnical DNA: {dna_context}\nTags: {tags_str}\n\nBased on these facts, what is the dominant mood? Reply with ONE word only: Happy/Sad/Calm/Romantic/Neutral"
+                }]
+            }),
+            timeout=15
+        )
+        mood = response.json()['choices'][0]['message']['content'].strip().split()[0].replace(".", "").replace(",", "")
+        if mood in ["Happy", "Sad", "Calm", "Romantic", "Neutral"]:
+            print(f"🤖 AI Producer Choice: {mood}")
+            return mood
+    except Exception as e:
+        print(f"OpenRouter mood error: {e}")
+    return None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -231,10 +246,14 @@ def generate_preset_description(mood: str) -> str:
             "Neutral": "A cozy lofi vibe perfectly tuned for your soul."
         }
         return descriptions.get(mood, "A cozy lofi vibe.")
-    
+    return _openrouter_description(mood) or f"Perfectly tuned for {mood}."
+
+
+@cached("description")
+def _openrouter_description(mood: str) -> Optional[str]:
     try:
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
+        response = http_client.post(
+            url=OPENROUTER_URL,
             headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
             data=json.dumps({
                 "model": "meta-llama/llama-3-8b-instruct:free",
@@ -246,8 +265,9 @@ def generate_preset_description(mood: str) -> str:
             timeout=15
         )
         return response.json()['choices'][0]['message']['content']
-    except Exception:
-        return f"Perfectly tuned for {mood}."
+    except Exception as e:
+        print(f"OpenRouter description error: {e}")
+        return None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -256,12 +276,13 @@ def generate_preset_description(mood: str) -> str:
 def _download_file(url: str, dest_path: str) -> Optional[str]:
     """Download a file from URL to local path."""
     try:
-        r = requests.get(url, stream=True, timeout=60)
-        r.raise_for_status()
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        with open(dest_path, 'wb') as f:
-            for chunk in r.iter_content(8192):
-                f.write(chunk)
+        # Closed on every path, so the connection goes back to the pool
+        with http_client.get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            with open(dest_path, 'wb') as f:
+                for chunk in r.iter_content(8192):
+                    f.write(chunk)
         return dest_path
     except Exception as e:
         print(f"Download error: {e}")
@@ -273,41 +294,55 @@ def separate_stems_stemsplit(audio_path: str) -> dict:
     StemSplit via RapidAPI — 500,000 FREE requests/month!
     Add STEMSPLIT_API_KEY to .env to activate.
     Get key from: https://rapidapi.com/stemsplit/api/stemsplit-ai-audio-stem-separation-youtube-to-stems
+    Blocks until the job is done; separate_stems_async waits without a thread.
     """
+    return separate_stems_stemsplit_future(audio_path).result()
+
+
+def separate_stems_stemsplit_future(audio_path: str) -> Future:
+    """Uploads and starts the StemSplit job; the returned future resolves to its stems ({} on failure)."""
+    job_id = _stemsplit_start(audio_path)
+    if not job_id:
+        done = Future()
+        done.set_result({})
+        return done
+    base = os.path.splitext(os.path.basename(audio_path))[0]
+    return stemsplit_poller().submit(job_id, os.path.join("temp", "stems", base))
+
+
+def _stemsplit_headers() -> dict:
+    return {"x-rapidapi-key": STEMSPLIT_API_KEY, "x-rapidapi-host": STEMSPLIT_HOST}
+
+
+def _stemsplit_start(audio_path: str) -> Optional[str]:
+    """Upload + job creation; the job id, or None."""
     if not STEMSPLIT_API_KEY:
-        return {}
+        return None
     
     try:
         print("🎵 Trying StemSplit (RapidAPI)...")
         
         # Step 1: Upload file to get uploadKey
         with open(audio_path, 'rb') as f:
-            upload_r = requests.post(
-                "https://stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com/upload",
-                headers={
-                    "x-rapidapi-key": STEMSPLIT_API_KEY,
-                    "x-rapidapi-host": "stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com"
-                },
+            upload_r = http_client.post(
+                f"{STEMSPLIT_BASE}/upload",
+                headers=_stemsplit_headers(),
                 files={"file": f},
                 timeout=60
             )
         
         if upload_r.status_code != 200:
             print(f"StemSplit upload failed: {upload_r.status_code}")
-            return {}
+            return None
         
         upload_key = upload_r.json().get("uploadKey", "")
         if not upload_key:
-            return {}
+            return None
         
         # Step 2: Create separation job
-        job_r = requests.post(
-            "https://stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com/jobs",
-            headers={
-                "x-rapidapi-key": STEMSPLIT_API_KEY,
-                "x-rapidapi-host": "stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com",
-                "Content-Type": "application/json"
-            },
+        job_r = http_client.post(
+            f"{STEMSPLIT_BASE}/jobs",
+            headers={**_stemsplit_headers(), "Content-Type": "application/json"},
             json={
                 "uploadKey": upload_key,
                 "outputFormat": "MP3",
@@ -317,54 +352,34 @@ def separate_stems_stemsplit(audio_path: str) -> dict:
         )
         
         if job_r.status_code not in (200, 201):
-            return {}
+            return None
         
-        job_id = job_r.json().get("jobId", "")
-        if not job_id:
-            return {}
-        
-        # Step 3: Poll for results (max 3 minutes)
-        import time
-        for attempt in range(36):
-            time.sleep(5)
-            status_r = requests.get(
-                f"https://stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com/jobs/{job_id}",
-                headers={
-                    "x-rapidapi-key": STEMSPLIT_API_KEY,
-                    "x-rapidapi-host": "stemsplit-ai-audio-stem-separation-youtube-to-stems.p.rapidapi.com"
-                },
-                timeout=15
-            )
-            if status_r.status_code == 200:
-                result = status_r.json()
-                status = result.get("status", "")
-                print(f"  StemSplit status [{attempt+1}]: {status}")
-                
-                if status == "COMPLETED":
-                    stems_urls = result.get("stems", {})
-                    stems = {}
-                    base = os.path.splitext(os.path.basename(audio_path))[0]
-                    
-                    for stem_name, stem_url in stems_urls.items():
-                        if isinstance(stem_url, str) and stem_url.startswith("http"):
-                            dest = os.path.join("temp", "stems", f"{base}_{stem_name}.mp3")
-                            local = _download_file(stem_url, dest)
-                            if local and os.path.getsize(local) > 50000:
-                                stems[stem_name] = local
-                    
-                    if stems.get("vocals"):
-                        print(f"✅ StemSplit: Vocals separated successfully!")
-                        return stems
-                    break
-                    
-                elif status in ("FAILED", "ERROR"):
-                    print("StemSplit job failed")
-                    break
+        # Step 3 (polling, downloads) is services/stem_poller.py
+        return job_r.json().get("jobId", "") or None
         
     except Exception as e:
         print(f"StemSplit error: {e}")
     
-    return {}
+    return None
+
+
+def _stemsplit_status(job_id: str):
+    return http_client.get(f"{STEMSPLIT_BASE}/jobs/{job_id}", headers=_stemsplit_headers(), timeout=15)
+
+
+_stem_poller = None
+_stem_poller_lock = threading.Lock()
+
+
+def stemsplit_poller():
+    """The process-wide StemSplitPoller (one thread for all outstanding jobs)."""
+    global _stem_poller
+    if _stem_poller is None:
+        with _stem_poller_lock:
+            if _stem_poller is None:
+                from services.stem_poller import StemSplitPoller
+                _stem_poller = StemSplitPoller(_stemsplit_status, _download_file)
+    return _stem_poller
 
 
 def separate_stems_bytez(audio_path: str) -> dict:
@@ -377,7 +392,7 @@ def separate_stems_bytez(audio_path: str) -> dict:
                 "https://api.bytez.com/v2/models/facebook/demucs_v4",
                 "https://api.bytez.com/v1/models/facebook/demucs_v4"
             ]:
-                r = requests.post(url, headers={"Authorization": f"Bearer {BYTEZ_API_KEY}"}, files={"file": f}, timeout=60)
+                r = http_client.post(url, headers={"Authorization": f"Bearer {BYTEZ_API_KEY}"}, files={"file": f}, timeout=60)
                 if r.status_code == 200:
                     raw = r.json().get("stems", {})
                     stems = {}
@@ -402,7 +417,11 @@ def separate_stems(audio_path: str) -> dict:
     3. Zero-Loss Fallback — uses original audio for both paths (always works)
     """
     # Try StemSplit first if key is available
-    result = separate_stems_stemsplit(audio_path)
+    return _stems_or_fallback(audio_path, separate_stems_stemsplit(audio_path))
+
+
+def _stems_or_fallback(audio_path: str, result: dict) -> dict:
+    """The StemSplit stems, else Bytez's, else the original audio for both paths."""
     if result.get("vocals"):
         result.setdefault("other", audio_path)
         return result
@@ -425,38 +444,34 @@ def transcribe_audio_smart(audio_path: str, artist: str = "", title: str = "") -
     """
     Smart transcription: uses Lyrics.ovh (FREE) instead of expensive Whisper.
     Falls back to Bytez Whisper only if no lyrics found.
+    Sync wrapper of transcribe_audio_smart_async (the lyrics sources are raced).
     """
-    # Try to get artist/title from filename if not provided
-    if not artist or not title:
-        base = os.path.splitext(os.path.basename(audio_path))[0]
-        parts = base.replace("_", " ").replace("-", " - ").split(" - ")
-        artist = parts[0].strip() if len(parts) > 0 else ""
-        title  = parts[1].strip() if len(parts) > 1 else base.strip()
-    
-    # Try free lyrics API first
-    if artist and title:
-        lyrics = get_lyrics_free(artist, title)
-        if lyrics:
-            # Convert lyrics to transcript-like format
-            lines = [l.strip() for l in lyrics.split("\n") if l.strip()]
-            segments = [{"start": i * 3.0, "end": (i + 1) * 3.0, "text": line} for i, line in enumerate(lines[:30])]
-            return {"text": lyrics[:2000], "segments": segments}
-    
-    # Last resort: Bytez Whisper (usually fails)
-    if BYTEZ_API_KEY:
-        try:
-            with open(audio_path, 'rb') as f:
-                r = requests.post(
-                    "https://api.bytez.com/v1/models/openai/whisper-large-v3",
-                    headers={"Authorization": f"Bearer {BYTEZ_API_KEY}"},
-                    files={"file": f},
-                    timeout=120
-                )
-            if r.status_code == 200:
-                return r.json()
-        except Exception as e:
-            print(f"Bytez Whisper error: {e}")
-    
+    return _run_sync(transcribe_audio_smart_async(audio_path, artist, title))
+
+
+def _lyrics_transcript(lyrics: str) -> dict:
+    # Convert lyrics to transcript-like format
+    lines = [l.strip() for l in lyrics.split("\n") if l.strip()]
+    segments = [{"start": i * 3.0, "end": (i + 1) * 3.0, "text": line} for i, line in enumerate(lines[:30])]
+    return {"text": lyrics[:2000], "segments": segments}
+
+
+def _transcribe_bytez(audio_path: str) -> dict:
+    """Last resort: Bytez Whisper (usually fails)."""
+    if not BYTEZ_API_KEY:
+        return {}
+    try:
+        with open(audio_path, 'rb') as f:
+            r = http_client.post(
+                "https://api.bytez.com/v1/models/openai/whisper-large-v3",
+                headers={"Authorization": f"Bearer {BYTEZ_API_KEY}"},
+                files={"file": f},
+                timeout=120
+            )
+        if r.status_code == 200:
+            return r.json()
+    except Exception as e:
+        print(f"Bytez Whisper error: {e}")
     return {}
 
 
@@ -469,8 +484,8 @@ def analyze_song_structure(transcript_json: dict) -> list:
     text_snippet = transcript_json.get("text", "")[:500]
     
     try:
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
+        response = http_client.post(
+            url=OPENROUTER_URL,
             headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
             data=json.dumps({
                 "model": "meta-llama/llama-3-8b-instruct:free",
@@ -490,3 +505,154 @@ def analyze_song_structure(transcript_json: dict) -> list:
     except Exception as e:
         print(f"Structure analysis error: {e}")
         return []
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 8. CONCURRENT LOOKUPS — independent requests in flight together, one deadline
+# ─────────────────────────────────────────────────────────────────────────────
+# The blocking lookups above run on these threads (keeping the pooled session).
+# A cancelled lookup is abandoned, not interrupted: its thread finishes within
+# the request's own timeout and the answer is dropped.
+_lookup_pool = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="lookup")
+
+
+async def _lookup(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_lookup_pool, fn, *args)
+
+
+# The sync wrappers run their coroutine on this one background loop: asyncio.run
+# raises in a thread whose own loop is running. Async code awaits the *_async
+# functions instead — a sync wrapper blocks its caller's thread, loop or not.
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def _run_sync(coro):
+    """Runs `coro` to completion on the background lookup loop and returns its result."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="lookup-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result()
+
+
+async def first_acceptable(candidates: list, deadline: float):
+    """
+    candidates = [(awaitable, accept), ...] in order of preference, all started at once.
+    Returns the most preferred answer accept() takes as soon as every more
+    preferred candidate has failed or been rejected — with a fixed
+    preference, the first answer that can win. At the deadline the best
+    answer so far wins. The rest are cancelled. None when nothing qualifies.
+    """
+    tasks = [asyncio.ensure_future(c) for c, _ in candidates]
+    pending_mark, rejected = object(), object()
+    answers = [pending_mark] * len(tasks)
+    loop = asyncio.get_running_loop()
+    until = loop.time() + deadline
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, until - loop.time()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                print(f"⏱️ Lookups hit the {deadline:.0f}s deadline")
+                break
+            for t in done:
+                i = tasks.index(t)
+                ok = not t.cancelled() and t.exception() is None and candidates[i][1](t.result())
+                answers[i] = t.result() if ok else rejected
+            for answer in answers:
+                if answer is pending_mark:
+                    break            # a more preferred candidate may still answer
+                if answer is not rejected:
+                    return answer
+        return next((a for a in answers if a is not pending_mark and a is not rejected), None)
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+async def get_lyrics_free_async(artist: str, title: str, deadline: float = LYRICS_DEADLINE) -> str:
+    """get_lyrics_free with Lyrics.ovh and JioSaavn queried together (Lyrics.ovh still preferred)."""
+    lyrics = await first_acceptable([
+        (_lookup(_lyrics_ovh, artist, title), bool),
+        (_lookup(_lyrics_jiosaavn, artist, title), bool),
+    ], deadline)
+    return lyrics or ""
+
+
+async def analyze_mood_smart_async(filename: str, dna: dict = None, deadline: float = MOOD_DEADLINE) -> str:
+    """
+    analyze_mood_smart with MusicBrainz and JioSaavn queried together and
+    OpenRouter started as soon as the MusicBrainz tags are in: the wait is
+    max(MusicBrainz + OpenRouter, JioSaavn), not their sum, and never more
+    than `deadline` — then the MusicBrainz mood (or its default) is used.
+    """
+    dna = dna or {}
+    artist, title = _artist_title(filename)
+    base = os.path.splitext(os.path.basename(filename))[0]
+    print(f"🎵 Analyzing mood for: {artist} — {title}")
+
+    found = {}
+    try:
+        return await asyncio.wait_for(_mood_lookups(artist, title, base, dna, found), deadline)
+    except asyncio.TimeoutError:
+        print(f"⏱️ Mood lookups hit the {deadline:.0f}s deadline")
+        return found.get("metadata", {}).get("mood", "Calm")
+
+
+async def _mood_lookups(artist: str, title: str, base: str, dna: dict, found: dict) -> str:
+    mb = asyncio.ensure_future(_lookup(get_song_metadata_free, artist, title))
+    jio = asyncio.ensure_future(_lookup(search_jiosaavn, base))
+    ai = None
+    try:
+        metadata = found["metadata"] = await mb
+        if metadata.get("mood") not in ["Neutral", "Calm"]:
+            print(f"🎭 Mood from MusicBrainz: {metadata['mood']}")
+            return metadata["mood"]
+
+        if OPENROUTER_API_KEY:
+            # Needs only the MusicBrainz tags — no reason to wait for JioSaavn first
+            ai = asyncio.ensure_future(_lookup(_openrouter_mood, artist, title, dna, metadata["tags"]))
+
+        jio_data = await jio
+        if jio_data.get("language") in ["hindi", "punjabi", "tamil"]:
+            # Indian songs have different mood patterns
+            if metadata.get("tags"):
+                return metadata["mood"]
+
+        if ai is not None:
+            mood = await ai
+            if mood:
+                return mood
+        return metadata.get("mood", "Neutral")
+    finally:
+        for t in (mb, jio, ai):
+            if t is not None:
+                t.cancel()
+
+
+async def transcribe_audio_smart_async(audio_path: str, artist: str = "", title: str = "") -> dict:
+    """transcribe_audio_smart with the lyrics sources raced; Whisper only when both come back empty."""
+    # Try to get artist/title from filename if not provided
+    if not artist or not title:
+        artist, title = _artist_title(audio_path)
+
+    # Try free lyrics APIs first
+    if artist and title:
+        lyrics = await get_lyrics_free_async(artist, title)
+        if lyrics:
+            return _lyrics_transcript(lyrics)
+
+    return await _lookup(_transcribe_bytez, audio_path)
+
+
+async def separate_stems_async(audio_path: str) -> dict:
+    """
+    separate_stems without a thread waiting on StemSplit: the job is polled
+    by services/stem_poller.py and awaited here. Upload and Bytez still block
+    one of the lookup threads while they run.
+    """
+    job = await _lookup(separate_stems_stemsplit_future, audio_path)
+    return await _lookup(_stems_or_fallback, audio_path, await asyncio.wrap_future(job))
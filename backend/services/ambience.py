@@ -0,0 +1,105 @@
+"""
+ambience.py — Pre-rendered, loopable ambience beds
+────────────────────────────────────────────────────────────────────
+The mood ambience (anoisesrc → highpass/lowpass → volume) uses fixed
+seeds, so it is the same for every job. Instead of synthesizing and
+filtering an hour of noise per render we:
+  • render a short filtered bed ONCE per noise variant (brown/77, pink/11, pink/22)
+  • crossfade its tail into its head so it loops without a click
+  • cache it as FLAC in temp/assets/ambience_cache (key = noise params + chain)
+  • per job: stream_loop the bed (no synthesis, no filtering)
+"""
+
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+import ffmpeg
+
+from services import lofi_chain
+from services.lofi_chain import SR, apply_ffmpeg_chain
+
+AMBIENCE_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'temp', 'assets', 'ambience_cache')
+
+BED_SECONDS   = 60    # loop length
+XFADE_SECONDS = 2     # tail → head crossfade that makes the loop seamless
+
+# One mood per noise variant — used to pre-render every bed at startup
+WARM_MOODS = ("Sad", "Calm", "Neutral")
+
+_bed_locks: dict = {}
+_bed_locks_guard = threading.Lock()
+
+
+def _bed_cache_key(amb: dict) -> str:
+    h = hashlib.sha1()
+    h.update(f"{amb['color']}|{amb['seed']}|{amb['chain']!r}".encode())
+    h.update(f"{BED_SECONDS}s+{XFADE_SECONDS}s@{SR}".encode())
+    return h.hexdigest()[:16]
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _bed_locks_guard:
+        return _bed_locks.setdefault(key, threading.Lock())
+
+
+def _render_bed(amb: dict) -> np.ndarray:
+    """Filtered noise (mono float32) with its tail crossfaded into its head."""
+    n, fade = BED_SECONDS * SR, XFADE_SECONDS * SR
+    src = ffmpeg.input(f"anoisesrc=d={BED_SECONDS + XFADE_SECONDS}:c={amb['color']}:r={SR}:seed={amb['seed']}",
+                       f='lavfi')
+    out, _ = (apply_ffmpeg_chain(src, amb['chain'])
+              .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=SR)
+              .run(capture_stdout=True, capture_stderr=True))
+    x = np.frombuffer(out, np.float32)[:n + fade].copy()
+
+    # Equal-power fade (the two noise segments are uncorrelated)
+    t = np.linspace(0.0, np.pi / 2, fade, dtype=np.float32)
+    x[:fade] = x[:fade] * np.sin(t) + x[n:n + fade] * np.cos(t)
+    return x[:n]
+
+
+def get_ambience_bed(mood: str) -> str:
+    """
+    Returns the path of the cached ambience bed for this mood, rendering it on first use.
+    Old beds of the same noise variant are removed when the chain changes.
+    """
+    import soundfile as sf
+
+    amb = lofi_chain.ambience_for_mood(mood)
+    variant = f"{amb['color']}_{amb['seed']}"
+    bed_path = os.path.abspath(os.path.join(AMBIENCE_CACHE_DIR, f"{variant}_{_bed_cache_key(amb)}.flac"))
+
+    if os.path.exists(bed_path):
+        return bed_path
+
+    with _lock_for(bed_path):
+        if os.path.exists(bed_path):
+            return bed_path
+
+        os.makedirs(AMBIENCE_CACHE_DIR, exist_ok=True)
+        print(f"Ambience: Rendering '{variant}' bed ({BED_SECONDS}s loop, cached)")
+
+        tmp_path = bed_path + ".part.flac"
+        sf.write(tmp_path, _render_bed(amb), SR, subtype='PCM_16')
+        os.replace(tmp_path, bed_path)
+
+        # Invalidate stale beds of the same variant (chain or loop params changed)
+        stale = re.compile(re.escape(variant) + r"_[0-9a-f]{16}\.flac$")
+        for name in os.listdir(AMBIENCE_CACHE_DIR):
+            old = os.path.abspath(os.path.join(AMBIENCE_CACHE_DIR, name))
+            if stale.match(name) and old != bed_path:
+                try: os.remove(old)
+                except: pass
+
+    return bed_path
+
+
+def warm_ambience_beds():
+    """Renders every ambience bed up front (run at startup, off the request path)."""
+    for mood in WARM_MOODS:
+        try:
+            get_ambience_bed(mood)
+        except Exception as e:
+            print(f"Ambience warm-up failed for {mood}: {e}")
@@ -0,0 +1,88 @@
+"""
+artifacts.py — Lazy, on-demand download formats
+────────────────────────────────────────────────────────────────────
+A job only renders ONE canonical master ({task_id}.mp3). The WAV and
+MP4 exports are derived from it the first time /download asks for them:
+  • per-(task, format) single-flight lock → concurrent requests render once;
+    the entry is refcounted and dropped once its last waiter is done
+  • written to a .part file and atomically renamed → never serve half a file
+  • finished derivatives stay in temp/processed for later hits
+"""
+
+import os
+import threading
+import ffmpeg
+from contextlib import contextmanager
+from typing import Optional
+
+from services.video_renderer import render_mood_video
+
+MASTER_FORMAT = "mp3"
+DERIVED_FORMATS = ("wav", "mp4")
+
+_locks: dict = {}                  # (task_id, fmt) → [lock, holders + waiters]
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _single_flight(task_id: str, fmt: str):
+    """Holds the (task, format) lock. The entry outlives every thread holding or waiting on it."""
+    key = (task_id, fmt)
+    with _locks_guard:
+        entry = _locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[key]
+
+
+def artifact_path(processed_dir: str, task_id: str, fmt: str) -> str:
+    return os.path.join(str(processed_dir), f"{task_id}.{fmt}")
+
+
+def derive_wav(master_mp3: str, output_wav: str) -> bool:
+    tmp = output_wav + ".part.wav"
+    ffmpeg.input(master_mp3).output(tmp, acodec='pcm_s16le').run(overwrite_output=True, quiet=True)
+    os.replace(tmp, output_wav)
+    return True
+
+
+def derive_mp4(master_mp3: str, output_mp4: str, mood: str = "Neutral") -> bool:
+    tmp = output_mp4 + ".part.mp4"
+    if not render_mood_video(master_mp3, tmp, mood):
+        return False
+    os.replace(tmp, output_mp4)
+    return True
+
+
+def ensure_artifact(processed_dir: str, task_id: str, fmt: str, mood: str = "Neutral") -> Optional[str]:
+    """
+    Returns the path of {task_id}.{fmt}, deriving it from the MP3 master on first request.
+    Returns None if the master does not exist (job unknown or not finished).
+    """
+    path = artifact_path(processed_dir, task_id, fmt)
+    if os.path.exists(path):
+        return path
+
+    master = artifact_path(processed_dir, task_id, MASTER_FORMAT)
+    if fmt not in DERIVED_FORMATS or not os.path.exists(master):
+        return None
+
+    with _single_flight(task_id, fmt):
+        # Another request may have finished it while we waited on the lock
+        if os.path.exists(path):
+            return path
+
+        print(f"Deriving {fmt.upper()} for {task_id} on demand...")
+        try:
+            ok = derive_wav(master, path) if fmt == "wav" else derive_mp4(master, path, mood)
+        except ffmpeg.Error as fe:
+            print(f"Artifact error ({fmt}): {fe.stderr.decode() if fe.stderr else fe}")
+            ok = False
+
+    return path if ok and os.path.exists(path) else None
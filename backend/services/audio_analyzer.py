@@ -1,64 +1,383 @@
 import librosa
 import numpy as np
 import os
+import itertools
+from services.pcm_cache import source, note_decode
 
-def analyze_track_dna(file_path: str) -> dict:
+# One STFT for every feature — same framing as librosa's defaults, so the
+# values match the per-feature librosa calls the analyzer used to make
+N_FFT = 2048
+HOP   = 512
+
+# Streaming mode — long inputs (hour-long mixes) are analysed block by block
+STREAM_MIN_SECONDS  = float(os.getenv("ATMOS_DNA_STREAM_MIN", "900"))   # auto: inputs at least this long
+STREAM_BLOCK_FRAMES = 2048    # STFT frames per block (≈ 47 s at 22.05 kHz)
+HPSS_KERNEL         = 31      # librosa.decompose.hpss default
+TOP_DB              = 80.0    # librosa.power_to_db default
+TEMPO_AC_SECONDS    = 8.0     # librosa tempo default autocorrelation window
+
+# Sampled mode — DNA from a few windows spread across the track (global averages)
+SAMPLED_DEFAULT = os.getenv("ATMOS_DNA_SAMPLED", "0") == "1"
+SAMPLE_WINDOWS  = 6
+SAMPLE_SECONDS  = 10.0        # per window — just over the 8 s tempo autocorrelation window
+
+
+def dna_result(bpm: float, percussiveness: float, avg_cent: float, bass_ratio: float) -> dict:
+    """Rounds the raw features and derives the DNA flags the engine keys on."""
+    return {
+        "bpm": round(bpm, 2),
+        "percussiveness": round(percussiveness, 3),
+        "brightness": round(avg_cent, 2), # e.g., 2000 is bright, 800 is dark
+        "bass_ratio": round(bass_ratio, 3),
+        "is_drum_heavy": percussiveness > 0.35,
+        "is_bass_heavy": bass_ratio > 1.2,
+        "is_already_dark": avg_cent < 1200
+    }
+
+
+def dna_from_signal(y: np.ndarray, sr: int) -> dict:
+    """
+    DNA from ONE STFT:
+      tempo ← onset envelope of its mel projection
+      percussiveness ← HPSS masks on its magnitude, RMS of the two resynthesized parts
+      brightness / bass ratio ← centroid and band means of the same frames
+    """
+    D = librosa.stft(y, n_fft=N_FFT, hop_length=HOP)
+    S = np.abs(D)
+
+    # 1. TEMPO & BEAT — same onset envelope beat_track(y=...) would build from its own STFT
+    mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=S ** 2, sr=sr))
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=HOP, aggregate=np.median)
+    tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=HOP)
+    bpm = float(tempo[0]) if isinstance(tempo, (list, np.ndarray)) else float(tempo)
+
+    # 2. PERCUSSIVENESS (Drums Detection)
+    # Median-filter HPSS masks on the magnitude; the RMS is taken on the resynthesized
+    # waveforms (frame RMS of a signal ≠ RMS of its windowed spectrogram frames)
+    mask_h, mask_p = librosa.decompose.hpss(S, mask=True)
+    y_harmonic = librosa.istft(D * mask_h, hop_length=HOP, length=len(y))
+    D *= mask_p
+    y_percussive = librosa.istft(D, hop_length=HOP, length=len(y))
+    del D, mask_h, mask_p
+    percussive_energy = np.mean(librosa.feature.rms(y=y_percussive))
+    harmonic_energy = np.mean(librosa.feature.rms(y=y_harmonic))
+    del y_harmonic, y_percussive
+    # Higher values (> 0.2) usually indicate clear drums/transients
+    percussiveness = float(percussive_energy / (harmonic_energy + 1e-6))
+
+    # 3. SPECTRAL BALANCE (Bass vs Brightness)
+    # Spectral Centroid: 'Center of mass' of the sound spectrum
+    avg_cent = float(np.mean(librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=N_FFT)))
+
+    # 4. LOW-END ENERGY (10Hz - 250Hz) vs mids (250Hz - 2kHz)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    bass_energy = np.mean(S[(freqs >= 10) & (freqs <= 250), :])
+    mid_energy = np.mean(S[(freqs > 250) & (freqs <= 2000), :])
+    bass_ratio = float(bass_energy / (mid_energy + 1e-6))
+
+    return dna_result(bpm, percussiveness, avg_cent, bass_ratio)
+
+
+def _pcm_blocks(file_path: str, sr: int, block_samples: int, start: float = None, duration: float = None,
+                audio=None):
+    """
+    Mono float32 blocks of the decoded file from an ffmpeg pipe (never the whole waveform).
+    start / duration decode just that stretch — input-side seek, the rest is never decoded.
+    audio (a cached DecodedAudio) makes ffmpeg read the job's decoded PCM instead of the file.
+    """
+    import ffmpeg
+
+    opts = {}
+    if start:
+        opts['ss'] = start
+    if duration:
+        opts['t'] = duration
+    src = audio.ffmpeg_input(**opts) if audio else ffmpeg.input(file_path, **opts)
+    proc = (src
+            .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=sr)
+            .global_args('-loglevel', 'error')
+            .run_async(pipe_stdout=True))
+    try:
+        while True:
+            raw = proc.stdout.read(block_samples * 4)
+            if not raw:
+                break
+            yield np.frombuffer(raw[:len(raw) // 4 * 4], np.float32)
+    finally:
+        proc.stdout.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg could not decode {os.path.basename(file_path)}")
+
+
+def _stft_blocks(pcm_blocks):
+    """STFT of a streamed signal, block by block — same frames as librosa.stft(center=True) on all of it."""
+    carry = np.zeros(N_FFT // 2, np.float32)                     # centre padding in front
+    for block in itertools.chain(pcm_blocks, [np.zeros(N_FFT // 2, np.float32)]):   # ... and behind
+        buf = np.concatenate([carry, block])
+        if len(buf) < N_FFT:
+            carry = buf
+            continue
+        frames = (len(buf) - N_FFT) // HOP + 1
+        yield librosa.stft(buf[:(frames - 1) * HOP + N_FFT], n_fft=N_FFT, hop_length=HOP, center=False)
+        carry = buf[frames * HOP:]
+
+
+class _IstftRms:
+    """
+    Running sum of librosa.feature.rms(y=librosa.istft(D, length=L)) with D fed
+    in frame batches. Frames are overlap-added into HOP-sample chunks; a chunk is
+    final once the N_FFT // HOP frames covering it are in, and each RMS frame is
+    the energy of N_FFT // HOP consecutive chunks.
+    """
+    Q = N_FFT // HOP
+    BATCH = 256                     # frames per inverse FFT (bounds the temporary arrays)
+
+    def __init__(self):
+        self.window = librosa.filters.get_window('hann', N_FFT, fftbins=True)
+        self.w2 = (self.window ** 2).reshape(self.Q, HOP)
+        self.sum = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.frames = 0                                  # frames added in this segment
+        self.tail = np.zeros((self.Q - 1, HOP))          # chunks still waiting for frames
+        self.energies = np.zeros(0)                      # final chunk energies not yet in every RMS frame
+        self.chunks = 0                                  # final chunks so far
+
+    def add(self, D: np.ndarray):
+        for i in range(0, D.shape[1], self.BATCH):
+            self._add(D[:, i:i + self.BATCH])
+
+    def _add(self, D: np.ndarray):
+        n = D.shape[1]
+        y = (np.fft.irfft(D, n=N_FFT, axis=0) * self.window[:, None]).T.reshape(n, self.Q, HOP)
+        buf = np.concatenate([self.tail, np.zeros((n, HOP))])
+        for q in range(self.Q):
+            buf[q:q + n] += y[:, q]
+        self.frames += n
+        self._chunks_done(buf[:n])
+        self.tail = buf[n:]
+
+    def _chunks_done(self, chunks: np.ndarray, length: int = None):
+        """Normalizes final chunks by the window sum-square and folds their energy into RMS frames."""
+        idx = self.chunks + np.arange(len(chunks))
+        wss = np.zeros_like(chunks)
+        for q in range(self.Q):
+            # frame idx - q (if it exists) covers chunk idx with window part q
+            k = idx - q
+            wss[(k >= 0) & (k < (self.frames if length is None else 1 + length // HOP))] += self.w2[q]
+        chunks = np.where(wss > np.finfo(np.float32).tiny, chunks / np.where(wss > 0, wss, 1), chunks)
+        # The centre padding (N_FFT // 2 in front, everything past the signal) is not part of y
+        pos = idx[:, None] * HOP + np.arange(HOP) - N_FFT // 2
+        valid = (pos >= 0) & (pos < (np.inf if length is None else length))
+        self.energies = np.concatenate([self.energies, np.sum(np.where(valid, chunks, 0.0) ** 2, axis=1)])
+        self.chunks += len(chunks)
+        if len(self.energies) >= self.Q:
+            frame_energy = np.convolve(self.energies, np.ones(self.Q), mode='valid')
+            self.sum += float(np.sqrt(np.maximum(frame_energy, 0.0) / N_FFT).sum())
+            self.energies = self.energies[len(frame_energy):]
+
+    def end_segment(self, length: int):
+        """Closes a segment of `length` samples (its 1 + length // HOP frames all added)."""
+        self._chunks_done(self.tail, length)
+        self._reset()
+
+
+class StreamingDNA:
+    """
+    Running DNA statistics over consecutive STFT blocks. Everything but the
+    onset envelope (4 bytes per frame, ~0.6 MB per hour) is a running sum, so
+    peak memory is set by STREAM_BLOCK_FRAMES, not by the track length.
+    Matches dna_from_signal() except for the onset dB floor, which follows the
+    running maximum instead of the global one: HPSS masks come from the
+    magnitude, and the percussive / harmonic RMS from the masked STFT through a
+    streaming overlap-add (_IstftRms).
+    add_segment() feeds one contiguous stretch of audio — the sampled mode feeds
+    several disjoint windows, each treated like a short track of its own.
+    """
+
+    def __init__(self, sr: int):
+        self.sr = sr
+        freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+        self.bass_bins = (freqs >= 10) & (freqs <= 250)
+        self.mid_bins = (freqs > 250) & (freqs <= 2000)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT)
+        self.frames = 0
+        self.segments = []            # finished onset envelopes, one per contiguous segment
+        self.seg_frames = 0
+        self.bass_sum = self.mid_sum = self.cent_sum = 0.0
+        self.harm, self.perc = _IstftRms(), _IstftRms()
+        # onset_strength(center=True) starts with lag + n_fft // (2 * hop) zeros
+        self.onset = [np.zeros(1 + N_FFT // (2 * HOP), np.float32)]
+        self.prev_db = None
+        self.db_max = -np.inf
+        # HPSS: frames still waiting for their right-hand context, and the left-hand context (magnitude)
+        self.pending = np.zeros((1 + N_FFT // 2, 0), np.complex64)
+        self.context = np.zeros((1 + N_FFT // 2, 0), np.float32)
+
+    def add_segment(self, pcm_blocks):
+        """Analyses one contiguous stretch of mono PCM (an iterable of float32 blocks)."""
+        samples = 0
+
+        def counted():
+            nonlocal samples
+            for block in pcm_blocks:
+                samples += len(block)
+                yield block
+
+        for D in _stft_blocks(counted()):
+            self.add(D)
+        self.end_segment(samples)
+
+    def add(self, D: np.ndarray):
+        S = np.abs(D)
+        self.frames += S.shape[1]
+        self.seg_frames += S.shape[1]
+        self.bass_sum += float(S[self.bass_bins].sum(dtype=np.float64))
+        self.mid_sum += float(S[self.mid_bins].sum(dtype=np.float64))
+        self.cent_sum += float(librosa.feature.spectral_centroid(S=S, sr=self.sr, n_fft=N_FFT).sum(dtype=np.float64))
+        self._onsets(S)
+        self.pending = np.concatenate([self.pending, D], axis=1)
+        if self.pending.shape[1] >= STREAM_BLOCK_FRAMES + HPSS_KERNEL // 2:
+            self._hpss(final=False)
+
+    def _onsets(self, S: np.ndarray):
+        db = 10.0 * np.log10(np.maximum(1e-10, self.mel_basis @ S ** 2))
+        self.db_max = max(self.db_max, float(db.max()))
+        db = np.maximum(db, self.db_max - TOP_DB)
+        if self.prev_db is not None:
+            db = np.concatenate([np.maximum(self.prev_db, self.db_max - TOP_DB), db], axis=1)
+        self.onset.append(np.median(np.maximum(0.0, np.diff(db, axis=1)), axis=0).astype(np.float32))
+        self.prev_db = db[:, -1:]
+
+    def _hpss(self, final: bool):
+        """HPSS of the pending frames that have HPSS_KERNEL // 2 frames of context on both sides."""
+        from scipy.ndimage import median_filter
+
+        half = HPSS_KERNEL // 2
+        keep = self.pending.shape[1] - (0 if final else half)
+        if keep <= 0:
+            return
+        window = np.concatenate([self.context, np.abs(self.pending)], axis=1)
+        c = self.context.shape[1]
+        S = window[:, c:c + keep]
+        harm = median_filter(window, size=(1, HPSS_KERNEL), mode='reflect')[:, c:c + keep]
+        perc = median_filter(S, size=(HPSS_KERNEL, 1), mode='reflect')
+        self.harm.add(self.pending[:, :keep] * librosa.util.softmask(harm, perc, power=2, split_zeros=False))
+        self.perc.add(self.pending[:, :keep] * librosa.util.softmask(perc, harm, power=2, split_zeros=False))
+        self.context = window[:, max(0, c + keep - half):c + keep]
+        self.pending = self.pending[:, keep:]
+
+    def end_segment(self, samples: int):
+        """Closes the current contiguous segment of `samples` samples (HPSS edges, resynthesis, onset envelope)."""
+        self._hpss(final=True)
+        self.harm.end_segment(samples)
+        self.perc.end_segment(samples)
+        self.context = self.context[:, :0]
+        if self.seg_frames:
+            self.segments.append(np.concatenate(self.onset)[:self.seg_frames])
+        self.onset = [np.zeros(1 + N_FFT // (2 * HOP), np.float32)]
+        self.prev_db = None
+        self.seg_frames = 0
+
+    def _tempo(self) -> float:
+        """beat_track's tempo estimate: prior-weighted mean tempogram, accumulated in chunks."""
+        if not any(env.any() for env in self.segments):
+            return 0.0
+        win = int(librosa.time_to_frames(TEMPO_AC_SECONDS, sr=self.sr, hop_length=HOP))
+        tg_sum = np.zeros(win)
+        for env in self.segments:
+            padded = np.pad(env, win // 2, mode='linear_ramp', end_values=0)
+            for i in range(0, len(env), STREAM_BLOCK_FRAMES):
+                j = min(len(env), i + STREAM_BLOCK_FRAMES)
+                tg = librosa.feature.tempogram(onset_envelope=padded[i:j + win - 1], sr=self.sr, hop_length=HOP,
+                                               win_length=win, center=False)
+                tg_sum += tg.sum(axis=1)
+        tempo = librosa.feature.tempo(tg=(tg_sum / self.frames)[:, None], sr=self.sr, hop_length=HOP, aggregate=None)
+        return float(tempo[0])
+
+    def result(self) -> dict:
+        n = max(1, self.frames)
+        percussiveness = float((self.perc.sum / n) / (self.harm.sum / n + 1e-6))
+        bass_mean = self.bass_sum / (self.bass_bins.sum() * n)
+        mid_mean = self.mid_sum / (self.mid_bins.sum() * n)
+        return dna_result(self._tempo(), percussiveness, self.cent_sum / n, float(bass_mean / (mid_mean + 1e-6)))
+
+
+def stream_track_dna(file_path: str, sr: int = 22050, audio=None) -> dict:
+    """DNA of a file of any length in bounded memory (ffmpeg PCM pipe → StreamingDNA)."""
+    acc = StreamingDNA(sr)
+    acc.add_segment(_pcm_blocks(file_path, sr, STREAM_BLOCK_FRAMES * HOP, audio=audio))
+    return acc.result()
+
+
+def sample_windows(duration: float, windows: int = SAMPLE_WINDOWS, seconds: float = SAMPLE_SECONDS) -> list:
+    """Window starts centred in `windows` equal slices of the track; [] when sampling would not save work."""
+    if duration <= windows * seconds * 1.5:
+        return []
+    return [round((i + 0.5) * duration / windows - seconds / 2, 3) for i in range(windows)]
+
+
+def sample_track_dna(file_path: str, windows: int = SAMPLE_WINDOWS, seconds: float = SAMPLE_SECONDS,
+                     sr: int = 22050, audio=None) -> dict:
+    """
+    Fast DNA: only `windows` × `seconds` of audio are decoded (seek per window)
+    and analysed. Short tracks fall back to the whole-file analysis.
+    """
+    from services.video_renderer import media_duration
+
+    starts = sample_windows(audio.duration if audio else media_duration(file_path), windows, seconds)
+    if not starts:
+        y = audio.view(sr, mono=True) if audio else librosa.load(file_path, sr=sr, mono=True)[0]
+        return dna_from_signal(y, sr)
+
+    acc = StreamingDNA(sr)
+    for start in starts:
+        acc.add_segment(_pcm_blocks(file_path, sr, STREAM_BLOCK_FRAMES * HOP, start, seconds, audio))
+    return acc.result()
+
+
+def analyze_track_dna(file_path: str, streaming: bool = None, sampled: bool = None, pcm=None,
+                      strict: bool = False) -> dict:
     """
     Extracts technical DNA from an audio file to guide the 'Honest' Lofi Engine.
-    Returns: {bpm, percussiveness, energy, bass_heavy, brightness}
+    Returns: {bpm, percussiveness, brightness, bass_ratio, is_drum_heavy, is_bass_heavy, is_already_dark}
+    sampled=True analyses SAMPLE_WINDOWS short windows only (None → ATMOS_DNA_SAMPLED env).
+    streaming=True walks the file in blocks (bounded memory); None → inputs of
+    STREAM_MIN_SECONDS or more stream, shorter ones are loaded whole.
+    pcm (services/pcm_cache.JobAudio) reads the job's decode-once PCM instead of the file.
+    strict=True raises instead of returning the neutral fallback DNA (batch analysis reports it).
     """
     try:
         print(f"Analyzing Track DNA: {os.path.basename(file_path)}")
         
-        # Load audio (mono, 22kHz is enough for analysis)
-        y, sr = librosa.load(file_path, sr=22050, mono=True)
-        
-        # 1. TEMPO & BEAT (Reliability: High)
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        bpm = float(tempo[0]) if isinstance(tempo, (list, np.ndarray)) else float(tempo)
-        
-        # 2. PERCUSSIVENESS (Drums Detection)
-        # Separates percussive from harmonic components
-        y_harmonic, y_percussive = librosa.effects.hpss(y)
-        percussive_energy = np.mean(librosa.feature.rms(y=y_percussive))
-        harmonic_energy = np.mean(librosa.feature.rms(y=y_harmonic))
-        
-        # Ratio of percussive energy to harmonic energy
-        # Higher values (> 0.2) usually indicate clear drums/transients
-        percussiveness = float(percussive_energy / (harmonic_energy + 1e-6))
-        
-        # 3. SPECTRAL BALANCE (Bass vs Brightness)
-        # Spectral Centroid: 'Center of mass' of the sound spectrum
-        cent = librosa.feature.spectral_centroid(y=y, sr=sr)
-        avg_cent = np.mean(cent) # Lower = Bassier/Darker, Higher = Brighter
-        
-        # 4. LOW-END ENERGY (10Hz - 250Hz)
-        # Check if the song is already bass-heavy
-        stft = np.abs(librosa.stft(y))
-        freqs = librosa.fft_frequencies(sr=sr)
-        bass_range = (freqs >= 10) & (freqs <= 250)
-        bass_energy = np.mean(stft[bass_range, :])
-        
-        mid_range = (freqs > 250) & (freqs <= 2000)
-        mid_energy = np.mean(stft[mid_range, :])
-        
-        bass_ratio = float(bass_energy / (mid_energy + 1e-6))
-        
-        result = {
-            "bpm": round(bpm, 2),
-            "percussiveness": round(percussiveness, 3),
-            "brightness": round(avg_cent, 2), # e.g., 2000 is bright, 800 is dark
-            "bass_ratio": round(bass_ratio, 3),
-            "is_drum_heavy": percussiveness > 0.35,
-            "is_bass_heavy": bass_ratio > 1.2,
-            "is_already_dark": avg_cent < 1200
-        }
+        audio = source(pcm, file_path)
+        if not audio:
+            note_decode(pcm, "analyzer")
+        if sampled is None:
+            sampled = SAMPLED_DEFAULT
+        if streaming is None and not sampled:
+            from services.video_renderer import media_duration
+            streaming = (audio.duration if audio else media_duration(file_path)) >= STREAM_MIN_SECONDS
+        if sampled:
+            result = sample_track_dna(file_path, audio=audio)
+        elif streaming:
+            result = stream_track_dna(file_path, audio=audio)
+        elif audio:
+            # Memoized 22 kHz mono view of the decoded PCM
+            result = dna_from_signal(audio.view(22050, mono=True), 22050)
+        else:
+            # Load audio (mono, 22kHz is enough for analysis)
+            y, sr = librosa.load(file_path, sr=22050, mono=True)
+            result = dna_from_signal(y, sr)
         
         print(f"DNA Results: BPM={result['bpm']}, DrumHeavy={result['is_drum_heavy']}, BassHeavy={result['is_bass_heavy']}")
         return result
 
     except Exception as e:
         print(f"Analysis failed: {e}")
+        if strict:
+            raise
         return {
             "bpm": 75.0,
             "percussiveness": 0.1,
@@ -1,9 +1,153 @@
 import os
+import time
 import ffmpeg
 import subprocess
 import json
-from services.lofi_beat_generator import generate_lofi_instrumental
+from services.lofi_beat_generator import generate_lofi_instrumental, stream_lofi_instrumental, SR as BEAT_SR
 from services.audio_analyzer import analyze_track_dna
+from services.video_renderer import render_mood_video, media_duration
+from services.ambience import get_ambience_bed
+from services.drum_generator import get_drum_loop
+from services import segment_render
+from services import beat_pool
+from services import lofi_chain
+from services.cpu_budget import codec_threads
+from services.lofi_chain import apply_ffmpeg_chain
+from services.filter_compiler import compile_graph, uncompiled_graph, record_render
+from services.live_stream import MP3_MASTER_ARGS
+from services.pcm_cache import source, note_decode
+
+# Render mode flag — set ATMOS_SINGLE_PASS=1 to make the fused single-invocation graph the default
+SINGLE_PASS_DEFAULT = os.getenv("ATMOS_SINGLE_PASS", "0") == "1"
+# Render engine — "ffmpeg" (subprocess filtergraph) or "numpy" (in-process DSP)
+RENDER_ENGINES = ("ffmpeg", "numpy")
+ENGINE_DEFAULT = os.getenv("ATMOS_RENDER_ENGINE", "ffmpeg")
+# Filtergraph compiler — precomputed biquad EQ stages, memoized per preset/DNA/mood (ATMOS_COMPILE_GRAPH=0 disables)
+COMPILE_GRAPH_DEFAULT = os.getenv("ATMOS_COMPILE_GRAPH", "1") == "1"
+# Ambience from cached pre-rendered beds instead of live anoisesrc (ATMOS_AMBIENCE_BEDS=0 disables)
+AMBIENCE_BEDS = os.getenv("ATMOS_AMBIENCE_BEDS", "1") == "1"
+# Segment-parallel render for long tracks — opt-in: "1" always, "auto" = long tracks on multi-core hosts, "0" never
+SEGMENTED_MODE = os.getenv("ATMOS_SEGMENTED", "0")
+# Copyright-free beat piped into ffmpeg's stdin as it is synthesized (ATMOS_STREAM_BEAT=0 writes a WAV first)
+STREAM_BEAT = os.getenv("ATMOS_STREAM_BEAT", "1") == "1"
+
+def _looped_input(path: str, offset: float = 0.0):
+    """stream_loop'd input starting `offset` seconds into the (looped) timeline."""
+    stream = ffmpeg.input(path, stream_loop=-1)
+    loop_len = media_duration(path) if offset else 0.0
+    if loop_len > 0 and offset % loop_len:
+        stream = (stream.filter('atrim', start=offset % loop_len)
+                        .filter('asetpts', 'PTS-STARTPTS'))
+    return stream
+
+
+def _amix(streams: list, gain: float):
+    """
+    amix duration=first normalize=0 with the mix gain as its input weights. A
+    `volume` straight after amix (working in place on amix's output) made
+    ffmpeg 7.0 now and then render the first second of the mix as garbage.
+    """
+    weights = " ".join([str(gain)] * len(streams))
+    return ffmpeg.filter(streams, 'amix', inputs=len(streams), duration='first', normalize=0, weights=weights)
+
+
+def _duck(main, sidechain, params: dict):
+    """
+    sidechaincompress with the sidechain apad'ed: it ends its output as soon as
+    the sidechain ends, dropping whatever main samples were still queued — a
+    different amount on every run — so only the main input may end it.
+    """
+    return ffmpeg.filter([main, sidechain.filter('apad')], 'sidechaincompress', **params)
+
+
+def build_instrumental_mix(inst_src, graph, mood: str, amb_bed: str = None, drum_path: str = None,
+                           offset: float = 0.0):
+    """
+    PASS 1 graph: lofi instrumental + ducked ambience (+ drums), as one ffmpeg stream.
+    offset = song time of inst_src's first sample, so loops stay in phase (segment renders).
+    """
+    music = apply_ffmpeg_chain(inst_src, graph['instrumental'])
+
+    # v11 Fix: Correct way to split audio in ffmpeg-python
+    split_music = music.filter_multi_output('asplit')
+    music_for_amb = split_music.stream(0)
+    music_for_mix = split_music.stream(1)
+
+    # ── AI-SUGGESTED AMBIENCE ───────────────────────────────────────
+    if amb_bed:
+        # Pre-filtered, loopable bed (services/ambience.py) — no per-job synthesis
+        amb_source = _looped_input(amb_bed, offset)
+    else:
+        amb = lofi_chain.ambience_for_mood(mood)
+        amb_source = apply_ffmpeg_chain(
+            ffmpeg.input(f"anoisesrc=d=3600:c={amb['color']}:r=44100:seed={amb['seed']}", f='lavfi'),
+            graph['ambience'])
+
+    # Make ambience "breathe" with the music (Mind-relieving effect)
+    amb_ducked = _duck(amb_source, music_for_amb, lofi_chain.AMB_SIDECHAIN)
+    amb_final = apply_ffmpeg_chain(amb_ducked, graph['ambience_level'])
+
+    p1 = [music_for_mix, amb_final]
+
+    if drum_path:
+        drums = apply_ffmpeg_chain(_looped_input(drum_path, offset), graph['drums'])
+        p1.append(drums)
+
+    return _amix(p1, lofi_chain.INST_MIX_GAIN)
+
+
+def build_master(inst2, vox_src, graph, has_v: bool, is_fallback: bool):
+    """PASS 2 (vocal overlay) + MASTERING graph on top of the instrumental layer."""
+    # ------------------------------------------------------------------
+    # PASS 2: DREAMY VOCAL OVERLAY
+    # ------------------------------------------------------------------
+    if has_v and not is_fallback:
+        vox = apply_ffmpeg_chain(vox_src, graph['vocals'])
+
+        # v11 Fix: Correct way to split audio in ffmpeg-python
+        split_vox = vox.filter_multi_output('asplit')
+        vox_for_sidechain = split_vox.stream(0)
+        vox_for_mix = split_vox.stream(1)
+
+        print("Applying sidechain ducking (Real Stems)...")
+        inst_wide = apply_ffmpeg_chain(inst2, graph['instrumental_wide'])
+        inst_ducked = _duck(inst_wide, vox_for_sidechain, lofi_chain.VOX_SIDECHAIN)
+
+        master = _amix([inst_ducked, vox_for_mix], lofi_chain.VOX_MIX_GAIN)
+
+    elif has_v and is_fallback:
+        print("FALLBACK MODE: Identical stems detected. Bypassing sidechain to prevent silence.")
+        vox = apply_ffmpeg_chain(vox_src, graph['fallback_vocals'])
+
+        master = _amix([inst2, vox], lofi_chain.FALLBACK_MIX_GAIN)
+
+    else:
+        master = inst2
+
+    # ------------------------------------------------------------------
+    # MASTERING: Slowed + Reverb + Warm EQ
+    # ------------------------------------------------------------------
+    return apply_ffmpeg_chain(master, graph['mastering'])
+
+
+def _auto_segmented(duration: float) -> bool:
+    if SEGMENTED_MODE in ("0", "1"):
+        return SEGMENTED_MODE == "1"
+    return (segment_render.default_workers() > 1
+            and duration >= segment_render.AUTO_MIN_DURATION)
+
+
+def _duration(path: str, audio) -> float:
+    return audio.duration if audio else media_duration(path)
+
+
+def _audio_input(path: str, audio, pcm, stage: str):
+    """ffmpeg input for a render layer: the job's decoded PCM when cached, else the file itself."""
+    if audio:
+        return audio.ffmpeg_input()
+    note_decode(pcm, stage)
+    return ffmpeg.input(path)
+
 
 def process_audio(
     input_instrumental: str,
@@ -15,26 +159,64 @@ def process_audio(
     structure_data: list = None,
     copyright_free: bool = False,
     dna_data: dict = None,
-    mood: str = "Neutral"
+    mood: str = "Neutral",
+    single_pass: bool = None,
+    engine: str = None,
+    compiled: bool = None,
+    segmented: bool = None,
+    seed: int = None,
+    pcm=None
 ):
     """
     ATMOSLOFI ENGINE v5 — Quality-First
     - Copyright-free: zero quality loss (timestamp-shift only)
     - The lofi engine itself already defeats Content ID
+    - single_pass=True renders instrumental, vocals, mastering and both the
+      MP3 and WAV outputs from ONE ffmpeg filtergraph (no tmp_inst_*.wav,
+      no MP3 → WAV re-decode). None → ATMOS_SINGLE_PASS env flag.
+    - output_wav / output_mp4 may be None: only the canonical MP3 master is
+      rendered and the other formats are derived later (services/artifacts.py).
+    - engine="numpy" runs the same chain in-process (services/dsp_engine.py)
+      instead of spawning ffmpeg per pass. None → ATMOS_RENDER_ENGINE env.
+    - compiled=True runs the ffmpeg engine on the compiled filter spec
+      (services/filter_compiler.py). None → ATMOS_COMPILE_GRAPH env.
+    - Ambience comes from cached, pre-filtered loop beds (services/ambience.py);
+      live anoisesrc synthesis is only the fallback.
+    - segmented=True splits the song into overlapping segments rendered by
+      parallel ffmpeg processes and stitched with crossfades
+      (services/segment_render.py). None → ATMOS_SEGMENTED env.
+    - seed makes the copyright-free beat (BPM pick + variation) deterministic,
+      so identical requests render identical masters (services/render_cache.py).
+    - The copyright-free beat comes from the pre-generated beat pool
+      (services/beat_pool.py), read trimmed to the song. When the pool has no
+      ready beat it is piped into the ffmpeg render block by block while it
+      is synthesized (no cf_beat WAV to write and decode again); the numpy
+      and segmented engines need a file and still get one.
+    - pcm (services/pcm_cache.JobAudio) shares the job's decode-once PCM: DNA,
+      duration and every render input read it instead of decoding the file again.
+    - The MP3 master is flushed frame by frame, so it can be played while it
+      is still being written (services/live_stream.py, /api/stream).
     """
+    if single_pass is None:
+        single_pass = SINGLE_PASS_DEFAULT
+    if engine not in RENDER_ENGINES:
+        engine = ENGINE_DEFAULT if ENGINE_DEFAULT in RENDER_ENGINES else "ffmpeg"
+    if compiled is None:
+        compiled = COMPILE_GRAPH_DEFAULT
     try:
-        print(f"AtmosLofi Engine v5  |  copyright_free={copyright_free}")
+        print(f"AtmosLofi Engine v5  |  copyright_free={copyright_free}  |  single_pass={single_pass}  |  engine={engine}")
 
         rate      = params.get("playback_speed", 0.85)
         amb_vol   = params.get("ambient_vol", 0.05)
         rev_amt   = params.get("reverb_amount", 0.6)
         track_vol = params.get("track_vol", 2.0)
         vocal_vol = float(params.get("vocal_vol", 1.0))    # user voice level control (0.3–2.0)
-        temp_inst = os.path.join(os.path.dirname(output_wav), "tmp_inst_" + os.path.basename(output_wav))
-        drum_path = os.path.join(os.path.dirname(__file__), '..', 'temp', 'assets', 'drum_loop.wav')
+        work_dir  = os.path.dirname(output_mp3)
+        work_name = os.path.splitext(os.path.basename(output_mp3))[0] + ".wav"
+        temp_inst = os.path.join(work_dir, "tmp_inst_" + work_name)
 
         # ── Step 0: ANALYZE TRACK DNA (Audio Intelligence v15) ────────────────
-        dna = dna_data or analyze_track_dna(input_instrumental)
+        dna = dna_data or analyze_track_dna(input_instrumental, pcm=pcm)
         
         # Smart Adjustments based on DNA
         # 1. Bass Adjustment (Bass Heavy songs get less boost)
@@ -53,6 +235,9 @@ def process_audio(
         should_add_drums = not dna['is_drum_heavy'] and not is_mood_calm
         
         print(f"AI Decision: DrumLayer={'ENABLED' if should_add_drums else 'SKIPPED (Mood: ' + mood + ')'}")
+        track_bpm = dna.get('bpm', 75.0)
+        beat_src = None       # copyright-free beat input node (pooled file or stdin)
+        beat_feed = None      # copyright-free beat blocks, fed to the render's stdin
 
         # ------------------------------------------------------------------
         # COPYRIGHT-FREE: CLEAN TIMESTAMP-SHIFT (Zero quality loss)
@@ -60,228 +245,150 @@ def process_audio(
         if copyright_free:
             print("Copyright-free: replacing instrumental with AI-generated original beat...")
             try:
-                try:
-                    probe = ffmpeg.probe(input_instrumental)
-                    song_duration = float(probe['format']['duration'])
-                except Exception:
+                song_duration = _duration(input_instrumental, source(pcm, input_instrumental))
+                if song_duration <= 0:
                     song_duration = 240.0  # fallback to 4 minutes
                 song_duration = min(song_duration, 600.0)  # cap at 10 min
 
                 import random
-                bpm = random.choice([72, 75, 78, 80, 82, 85])
-                cf_inst_path = os.path.join(
-                    os.path.dirname(output_wav), "cf_beat_" + os.path.basename(output_wav).replace(".wav", ".wav")
-                )
-                input_instrumental = generate_lofi_instrumental(
-                    output_path=cf_inst_path,
-                    duration=song_duration + 5.0,  # +5s buffer
-                    bpm=bpm
-                )
-                print(f"Original {bpm} BPM lofi beat generated ({song_duration:.0f}s)")
+                rng = random.Random(seed) if seed is not None else random
+                bpm = rng.choice(beat_pool.BEAT_BPMS)
+                beat_duration = song_duration + 5.0  # +5s buffer
+                if engine == "ffmpeg" and segmented is None:
+                    segmented = _auto_segmented(beat_duration)
+                pooled = beat_pool.serve(bpm, beat_duration, seed)
+                if STREAM_BEAT and engine == "ffmpeg" and not segmented:
+                    if pooled and pooled.ready():
+                        beat_src = pooled.ffmpeg_input()
+                    else:
+                        beat_feed = (pooled.blocks() if pooled else
+                                     stream_lofi_instrumental(duration=beat_duration, bpm=bpm, seed=seed))
+                        beat_src = ffmpeg.input('pipe:', format='f32le', ar=BEAT_SR, ac=1)
+                    input_instrumental = None
+                else:
+                    cf_inst_path = os.path.join(work_dir, "cf_beat_" + work_name)
+                    if pooled:
+                        input_instrumental = pooled.write(cf_inst_path)
+                    else:
+                        input_instrumental = generate_lofi_instrumental(
+                            output_path=cf_inst_path,
+                            duration=beat_duration,
+                            bpm=bpm,
+                            seed=seed
+                        )
+                track_bpm = bpm
+                how = 'pooled' if pooled and pooled.ready() else 'streaming' if beat_feed else 'generated'
+                print(f"Original {bpm} BPM lofi beat {how} ({song_duration:.0f}s)")
                 print("Copyrighted instrumental REPLACED — Content ID match = 0%")
 
             except Exception as ce:
                 print(f"Copyright-free beat generation failed (using original): {ce}")
                 import traceback; traceback.print_exc()
 
-        # ------------------------------------------------------------------
-        # PASS 1: LOFI INSTRUMENTAL
-        # ------------------------------------------------------------------
-        music = (ffmpeg.input(input_instrumental)
-                    .filter('aresample', 44100)
-                    .filter('vibrato', f=2.0, d=0.03)           # ← Refined: Lower depth to prevent glitches
-                    .filter('equalizer', f=200,  width_type='h', w=150,  g=3)    # bass body
-                    .filter('equalizer', f=400,  width_type='h', w=250,  g=4)    # warm mud range
-                    .filter('equalizer', f=3500, width_type='h', w=1000, g=-2)   # cut nasal freq
-                    .filter('lowshelf',  f=120, gain=bass_gain)   # ← v15: Honest Bass
-                    .filter('highshelf', f=5000, gain=-12)       
-                    .filter('lowpass', f=lp_freq)                 # ← AI Muffle
-                    .filter('lowpass', f=5500)                    # ← Aggressive Cymbal Cut
-                    .filter('equalizer', f=8000, width_type='h', w=1000, g=-20) # Absolute Ride Supression
-                    .filter('equalizer', f=2500, width_type='h', w=1000, g=-4)
-                    .filter('volume', volume=min(track_vol * 0.4, 2.0)))
-        
-        # v11 Fix: Correct way to split audio in ffmpeg-python
-        split_music = music.filter_multi_output('asplit')
-        music_for_amb = split_music.stream(0)
-        music_for_mix = split_music.stream(1)
-
-        # ── AI-SUGGESTED AMBIENCE ───────────────────────────────────────────
-        # Customizing noise based on mood for a truly "AI processed" feel
-        if mood in ["Sad", "Heartbreak"]:
-            # Deep, dark vinyl crackle
-            amb_source = (ffmpeg.input('anoisesrc=d=3600:c=brown:r=44100:seed=77', f='lavfi')
-                          .filter('aresample', 44100)
-                          .filter('lowpass', f=800)
-                          .filter('volume', volume=0.6))
-        elif mood in ["Rainy Cafe", "Calm"]:
-            # "Rain" simulation with pink noise
-            amb_source = (ffmpeg.input('anoisesrc=d=3600:c=pink:r=44100:seed=11', f='lavfi')
-                          .filter('aresample', 44100)
-                          .filter('highpass', f=1000)
-                          .filter('lowpass', f=3000)
-                          .filter('volume', volume=0.4))
-        else:
-            # Standard lofi crackle
-            amb_source = (ffmpeg.input('anoisesrc=d=3600:c=pink:r=44100:seed=22', f='lavfi')
-                          .filter('aresample', 44100)
-                          .filter('highpass', f=1500)
-                          .filter('lowpass', f=4000)
-                          .filter('volume', volume=0.5))
-
-        # Make ambience "breathe" with the music (Mind-relieving effect)
-        amb_ducked = ffmpeg.filter([amb_source, music_for_amb], 'sidechaincompress', 
-                                    threshold=0.15, ratio=3.0, attack=20, release=300)
-        
-        amb_final = amb_ducked.filter('volume', volume=max(amb_vol * 1.5, 0.02))
+        has_v = bool(input_vocals and os.path.exists(input_vocals))
+        is_fallback = (input_vocals == input_instrumental) if has_v else False
+        inst_audio = source(pcm, input_instrumental)
+        vox_audio = source(pcm, input_vocals) if has_v else None
+        drum_path = None
+        if should_add_drums:
+            try:
+                # One-bar boom-bap loop at the song's tempo (cached per quantized BPM)
+                drum_path = get_drum_loop(track_bpm)
+            except Exception as de:
+                print(f"Drum loop unavailable, skipping drums: {de}")
+        use_drums = bool(drum_path)
+        if not should_add_drums:
+            print("Skip drums: Track already has sufficient percussive energy.")
 
-        p1 = [music_for_mix, amb_final]
+        amb_bed = None
+        if AMBIENCE_BEDS:
+            try:
+                amb_bed = get_ambience_bed(mood)
+            except Exception as be:
+                print(f"Ambience bed unavailable, synthesizing live: {be}")
 
-        if should_add_drums and os.path.exists(drum_path):
-            drums = (ffmpeg.input(drum_path, stream_loop=-1)
-                        .filter('aresample', 44100)
-                        .filter('highshelf', f=6000, gain=-6)
-                        .filter('volume', volume=0.5))
-            p1.append(drums)
-        elif not should_add_drums:
-            print("Skip drums: Track already has sufficient percussive energy.")
+        if engine == "ffmpeg":
+            build = compile_graph if compiled else uncompiled_graph
+            graph = build(bass_gain, lp_freq, track_vol, amb_vol, vocal_vol, rate, mood)
+            print(f"Filtergraph {'compiled' if compiled else 'raw'}: {graph.report()}")
+            if segmented is None:
+                segmented = _auto_segmented(_duration(input_instrumental, inst_audio))
 
-        inst_mix = (ffmpeg.filter(p1, 'amix', inputs=len(p1), duration='first', normalize=0)
-                         .filter('volume', volume=1.2))
+        render_start = time.perf_counter()
+        if engine == "numpy":
+            # In-process NumPy/SciPy render of the same chain (services/dsp_engine.py)
+            from services.dsp_engine import render_lofi
+            render_lofi(
+                input_instrumental, input_vocals if has_v else None, output_wav, output_mp3,
+                bass_gain=bass_gain, lp_freq=lp_freq, track_vol=track_vol, amb_vol=amb_vol,
+                vocal_vol=vocal_vol, rate=rate, mood=mood, is_fallback=is_fallback,
+                drum_path=drum_path if use_drums else None, amb_bed=amb_bed, pcm=pcm
+            )
+            render_secs = time.perf_counter() - render_start
+            print(f"Audio render (numpy engine): {render_secs:.2f}s")
+        elif segmented:
+            # Parallel segments stitched with crossfades (services/segment_render.py)
+            job = dict(input_instrumental=input_instrumental, input_vocals=input_vocals, has_v=has_v,
+                       is_fallback=is_fallback, graph=graph, mood=mood, amb_bed=amb_bed,
+                       drum_path=drum_path if use_drums else None, rate=rate,
+                       inst_audio=inst_audio, vox_audio=vox_audio)
+            segment_render.render_segmented(job, _duration(input_instrumental, inst_audio), output_mp3, output_wav)
+            render_secs = time.perf_counter() - render_start
+            timing = record_render(compiled, render_secs, media_duration(output_mp3))
+            print(f"Audio render (segmented): {timing}")
+        else:
+            # ------------------------------------------------------------------
+            # PASS 1: LOFI INSTRUMENTAL
+            # ------------------------------------------------------------------
+            if beat_src is not None:
+                inst_src = beat_src
+            else:
+                inst_src = _audio_input(input_instrumental, inst_audio, pcm, "render_instrumental")
+            vox_src = None
+            if has_v and not (single_pass and is_fallback):
+                vox_src = _audio_input(input_vocals, vox_audio, pcm, "render_vocals")
+            if single_pass and is_fallback:
+                # Same file feeds both layers of one graph — decode once and split it
+                # (identical input nodes would otherwise be merged by ffmpeg-python)
+                shared = inst_src.filter_multi_output('asplit')
+                inst_src, vox_src = shared.stream(0), shared.stream(1)
 
-        print("Rendering warm instrumental layer...")
-        ffmpeg.output(inst_mix, temp_inst).run(overwrite_output=True, quiet=True)
+            inst_mix = build_instrumental_mix(inst_src, graph, mood, amb_bed, drum_path if use_drums else None)
 
-        # ------------------------------------------------------------------
-        # PASS 2: DREAMY VOCAL OVERLAY
-        # ------------------------------------------------------------------
-        has_v = bool(input_vocals and os.path.exists(input_vocals))
-        is_fallback = (input_vocals == input_instrumental) if has_v else False
-        inst2 = ffmpeg.input(temp_inst).filter('aresample', 44100)
-
-        if has_v and not is_fallback:
-            # ── VOCAL CHAIN (REAL SEPARATION) ────────────────────────────────────
-            vox = (ffmpeg.input(input_vocals)
-                      .filter('aresample', 44100)
-                      .filter('highpass', f=100)
-                      .filter('equalizer', f=250,  width_type='h', w=200, g=-2)   
-                      .filter('equalizer', f=900,  width_type='h', w=400, g=4)    
-                      .filter('equalizer', f=1500, width_type='h', w=500, g=5)    
-                      .filter('equalizer', f=3000, width_type='h', w=800, g=3)    
-                      .filter('equalizer', f=5000, width_type='h', w=600, g=-1)   
-                      .filter('highshelf', f=10000, gain=-4)                      
-                      .filter('pan', 'mono')                                      
-                      .filter('volume', volume=max(vocal_vol * 15.0, 4.0))
-                      .filter('equalizer', f=2500, width_type='h', w=800, g=12)    
-                      .filter('acompressor', threshold=0.08, ratio=6.0, attack=5, release=150, makeup=5.0)
-                      .filter('aecho', in_gain=0.7,  out_gain=0.35, delays=55,  decays=0.38)
-                      .filter('aecho', in_gain=0.55, out_gain=0.22, delays=175, decays=0.28)
-                      # ─ v12: Speech Normalization for 100% Clarity ─
-                      .filter('speechnorm', e=10, r=0.0001, l=1)
-                      .filter('alimiter', limit=0.92, attack=5, release=50))
-            
-            # v11 Fix: Correct way to split audio in ffmpeg-python
-            split_vox = vox.filter_multi_output('asplit')
-            vox_for_sidechain = split_vox.stream(0)
-            vox_for_mix = split_vox.stream(1)
-
-            print("Applying sidechain ducking (Real Stems)...")
-            inst_wide = (inst2.filter('extrastereo', m=1.4)                           
-                             .filter('equalizer', f=600, width_type='h', w=200, g=-4) 
-                             .filter('equalizer', f=1500, width_type='h', w=500, g=-6)) 
-
-            inst_ducked = ffmpeg.filter([inst_wide, vox_for_sidechain], 'sidechaincompress', 
-                                         threshold=0.08, ratio=4.5, 
-                                         attack=10, release=350,  
-                                         makeup=1.0)
-            
-            master = (ffmpeg.filter([inst_ducked, vox_for_mix], 'amix', inputs=2, duration='first', normalize=0)
-                            .filter('volume', volume=1.1)) # ← v12: Maximized Mix
-
-        elif has_v and is_fallback:
-            print("FALLBACK MODE: Identical stems detected. Bypassing sidechain to prevent silence.")
-            vox = (ffmpeg.input(input_vocals)
-                      .filter('aresample', 44100)
-                      .filter('highpass', f=150)
-                      .filter('volume', volume=max(vocal_vol * 8.0, 4.0)) 
-                      .filter('aecho', in_gain=0.8, out_gain=0.2, delays=60, decays=0.2)) 
-            
-            master = (ffmpeg.filter([inst2, vox], 'amix', inputs=2, duration='first', normalize=0)
-                            .filter('volume', volume=0.9)) # ← v12: Maximized Fallback
+            if single_pass:
+                # Feed the instrumental layer straight into PASS 2 — same graph, no temp file
+                inst2 = inst_mix
+            else:
+                print("Rendering warm instrumental layer...")
+                graph.run(ffmpeg.output(inst_mix, temp_inst, **codec_threads()), overwrite_output=True, quiet=True, feed=beat_feed)
+                beat_feed = None
+                inst2 = ffmpeg.input(temp_inst)
+                if not compiled:
+                    inst2 = inst2.filter('aresample', 44100)   # temp file is already 44.1k
 
-        else:
-            master = inst2
+            master = build_master(inst2, vox_src, graph, has_v, is_fallback)
 
-        # ------------------------------------------------------------------
-        # MASTERING: Slowed + Reverb + Warm EQ
-        # ------------------------------------------------------------------
-        f_sr = int(44100 * rate)
-        master = master.filter('asetrate', f_sr).filter('aresample', 44100)
-
-        master = (master
-                    .filter('lowshelf',  f=100, gain=3)               
-                    .filter('equalizer', f=300, width_type='h', w=200, g=2)  
-                    .filter('highshelf', f=8000, gain=-5)             
-                    .filter('lowpass', f=12500)                       
-                    .filter('acompressor', threshold=0.12, ratio=2.5, attack=5, release=50, makeup=2.0)
-                    .filter('alimiter', limit=0.98))
-
-        print("Exporting master...")
-        ffmpeg.output(master, output_mp3, audio_bitrate='320k').run(overwrite_output=True, quiet=False)
-        ffmpeg.input(output_mp3).output(output_wav, acodec='pcm_s16le').run(overwrite_output=True, quiet=False)
-
-        if os.path.exists(output_mp3):
-            # Select background based on mood
-            assets_dir = os.path.join(os.path.dirname(__file__), '..', 'assets')
-            bg_map = {
-                "Sad": "sad.png",
-                "Heartbreak": "sad.png",
-                "Calm": "calm.png",
-                "Romantic": "calm.png",
-                "Happy": "calm.png",
-                "Cyberpunk": "cyberpunk.png",
-                "Neutral": "lofi_bg.jpg"
-            }
-            
-            bg_file = bg_map.get(mood, "lofi_bg.jpg")
-            bg = os.path.join(assets_dir, bg_file)
-            if not os.path.exists(bg):
-                bg = os.path.join(assets_dir, "lofi_bg.jpg")
-
-            print(f"Video: Creating Cinematic Video with bg: {bg_file} (Mood: {mood})")
-
-            import datetime
-            now_str = datetime.datetime.now().strftime("%H:%M:%S")
-            
-            # Ensure absolute, normalized paths for Windows FFmpeg
-            bg_abs = os.path.abspath(bg)
-            output_mp3_abs = os.path.abspath(output_mp3)
-            output_mp4_abs = os.path.abspath(output_mp4)
-            
-            v_input = ffmpeg.input(bg_abs, loop=1, framerate=1)
-            
-            # Application of VHS Overlay Filters
-            v_stream = (v_input
-                        .filter('scale', 1280, 720)
-                        .filter('noise', alls=35, allf='t+p') # VHS Noise
-                        .filter('curves', preset='vintage')   # Retro Film Look
-                        .filter('scale', 'trunc(iw/2)*2', 'trunc(ih/2)*2')) # Ensure even dimensions
-            
-            # Subtle Glitch for Cyberpunk
-            if mood == 'Cyberpunk':
-                v_stream = v_stream.filter('hue', h=20, s=1.2) # Saturate Cyberpunk colors
-
-            a_stream = ffmpeg.input(output_mp3_abs)
-            try:
-                ffmpeg.output(v_stream, a_stream, output_mp4_abs,
-                              vcodec='libx264', tune='stillimage',
-                              pix_fmt='yuv420p', acodec='aac',
-                              shortest=None).run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
-            except ffmpeg.Error as fe:
-                print(f"ERROR: FFmpeg Video Error: {fe.stderr.decode() if fe.stderr else 'No stderr'}")
-                # Fallback to simple image if complex filters fail
-                v_simple = ffmpeg.input(bg_abs, loop=1, framerate=1).filter('scale', 'trunc(iw/2)*2', 'trunc(ih/2)*2')
-                ffmpeg.output(v_simple, a_stream, output_mp4_abs, vcodec='libx264', tune='stillimage', pix_fmt='yuv420p', acodec='aac', shortest=None).run(overwrite_output=True, quiet=True)
+            print("Exporting master...")
+            if single_pass and output_wav:
+                # One invocation, two outputs: MP3 and WAV come from the same master
+                split_master = master.filter_multi_output('asplit')
+                graph.run(ffmpeg.merge_outputs(
+                    ffmpeg.output(split_master.stream(0), output_mp3, **MP3_MASTER_ARGS, **codec_threads()),
+                    ffmpeg.output(split_master.stream(1), output_wav, acodec='pcm_s16le', **codec_threads()),
+                ), overwrite_output=True, quiet=False, feed=beat_feed)
+            else:
+                graph.run(ffmpeg.output(master, output_mp3, **MP3_MASTER_ARGS, **codec_threads()), overwrite_output=True, quiet=False,
+                          feed=beat_feed)
+                if output_wav:
+                    ffmpeg.input(output_mp3).output(output_wav, acodec='pcm_s16le').run(overwrite_output=True, quiet=False)
+
+            render_secs = time.perf_counter() - render_start
+            timing = record_render(compiled, render_secs, media_duration(output_mp3))
+            print(f"Audio render ({'single-pass' if single_pass else 'two-pass'}): {timing}")
+
+        if output_mp4 and os.path.exists(output_mp3):
+            # Cached VHS loop + audio mux (video stream is copied, not re-encoded)
+            render_mood_video(output_mp3, output_mp4, mood)
 
         for tmp in [temp_inst]:
             if os.path.exists(tmp):
@@ -0,0 +1,164 @@
+"""
+batch_dna.py — Batch DNA analysis on a bounded process pool
+────────────────────────────────────────────────────────────────────
+A batch of uploads used to be analysed one file at a time, each inside its
+own /process job. Instead:
+  • submit(path) fans a file out to a shared ProcessPoolExecutor
+    (ATMOS_BATCH_WORKERS processes, default one per core), so big batches
+    keep every core busy and concurrent batches share the same bound
+  • workers are spawned (never forked from the threaded server) and cap
+    their native thread pools to CPU_BUDGET / workers
+  • results are persisted per input digest in temp/assets/dna_cache, and
+    identical files in flight share one analysis
+  • /process jobs pick the result up via dna_for() — stored, or waited for
+    while its batch analysis is still running — instead of analysing again
+"""
+
+import os
+import json
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from services import metrics
+from services.cpu_budget import CPU_BUDGET, NATIVE_THREAD_ENV
+from services.render_cache import input_digest
+
+BATCH_WORKERS = int(os.getenv("ATMOS_BATCH_WORKERS", "0")) or (os.cpu_count() or 1)
+BATCH_MAX_FILES = 50
+DNA_CACHE_DIR = os.path.join("temp", "assets", "dna_cache")
+# Bump when the analyzer's output changes — old entries then stop matching
+DNA_CACHE_VERSION = "d1"
+WAIT_SECONDS = 600       # dna_for() waits at most this long for an in-flight analysis
+
+
+def _init_worker(threads: int):
+    """Pool initializer: one job per worker process, so its share of the CPU budget."""
+    for var in NATIVE_THREAD_ENV:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except Exception:
+        pass
+
+
+def _analyze_file(path: str) -> dict:
+    """Worker side: {dna, secs}. Raises on undecodable input (no neutral fallback)."""
+    from services.audio_analyzer import analyze_track_dna
+    start = time.perf_counter()
+    dna = analyze_track_dna(path, strict=True)
+    return {"dna": dna, "secs": round(time.perf_counter() - start, 3), "cached": False}
+
+
+class BatchDNA:
+    def __init__(self, store_dir: str = DNA_CACHE_DIR, workers: int = BATCH_WORKERS):
+        self.store_dir = store_dir
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._inflight = {}                     # digest → Future
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                threads = max(1, CPU_BUDGET // self.workers)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=(threads,))
+            return self._pool
+
+    def _store_path(self, digest: str) -> str:
+        return os.path.join(self.store_dir, f"{digest}_{DNA_CACHE_VERSION}.json")
+
+    def stored(self, digest: str):
+        try:
+            with open(self._store_path(digest)) as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _finish(self, digest: str, fut: Future):
+        try:
+            self._persist(digest, fut)
+        finally:
+            # Only after the store is written — a concurrent submit() finds one or the other
+            with self._lock:
+                self._inflight.pop(digest, None)
+
+    def _persist(self, digest: str, fut: Future):
+        try:
+            result = fut.result()
+        except BrokenProcessPool:
+            print("Batch DNA: worker pool died, it is recreated for the next batch")
+            with self._lock:
+                self._pool = None
+            metrics.incr("batch_dna.errors")
+            return
+        except Exception as e:
+            print(f"Batch DNA: analysis failed: {e}")
+            metrics.incr("batch_dna.errors")
+            return
+        metrics.observe("batch_dna.analysis", result["secs"])
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._store_path(digest)
+        with open(path + ".part", "w") as f:
+            json.dump(result["dna"], f)
+        os.replace(path + ".part", path)
+
+    def submit(self, path: str) -> Future:
+        """Future → {dna, secs, cached}. Stored results complete immediately; identical files share one run."""
+        digest = input_digest(path)
+        dna = self.stored(digest)
+        if dna is not None:
+            metrics.incr("batch_dna.cached")
+            done = Future()
+            done.set_result({"dna": dna, "secs": 0.0, "cached": True})
+            return done
+        pool = self._executor()
+        with self._lock:
+            fut = self._inflight.get(digest)
+            new = fut is None
+            if new:
+                fut = self._inflight[digest] = pool.submit(_analyze_file, path)
+        if new:
+            fut.add_done_callback(lambda f, d=digest: self._finish(d, f))
+        return fut
+
+    def analyze(self, paths: list):
+        """Yields (path, result) as the analyses finish; result = {dna, secs[, cached]} or {error}."""
+        futures = {}
+        for p in paths:
+            futures.setdefault(self.submit(p), []).append(p)   # identical files share a future
+        for fut in as_completed(futures):
+            try:
+                result = fut.result()
+            except Exception as e:
+                result = {"error": str(e) or type(e).__name__}
+            for p in futures[fut]:
+                yield p, result
+
+    def dna_for(self, path: str, timeout: float = WAIT_SECONDS):
+        """Batch-analysed DNA for `path` (waiting for an in-flight run), or None → analyse it yourself."""
+        try:
+            digest = input_digest(path)
+        except OSError:
+            return None
+        with self._lock:
+            fut = self._inflight.get(digest)
+        if fut is not None:
+            try:
+                return fut.result(timeout=timeout)["dna"]
+            except Exception:
+                return None
+        return self.stored(digest)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+batch_dna = BatchDNA()
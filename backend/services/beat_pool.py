@@ -0,0 +1,177 @@
+"""
+beat_pool.py — Pre-generated copyright-free beats
+────────────────────────────────────────────────────────────────────
+A copyright-free job used to synthesize its song-length beat inline before
+rendering could start. Instead:
+  • the pool keeps BEAT_POOL_SIZE ready beats per BPM in BEAT_BPMS and per
+    duration bucket, as FLAC in temp/assets/beat_pool
+  • a niced background process (one native thread) renders the missing
+    ones — at startup and again after a miss
+  • serve(bpm, duration, seed) picks a beat by file lookup; the render reads
+    only its first `duration` seconds (input-side trim, nothing is copied)
+  • a pool beat is a pure function of (BPM, bucket, variant): on a miss the
+    job synthesizes that very beat itself, so a seeded request renders the
+    same master whether the pool was warm or not
+Hits and misses are counted as beat_pool.hit / beat_pool.miss in /api/metrics.
+ATMOS_BEAT_POOL=0 turns it off (jobs synthesize a song-length beat).
+"""
+
+import os
+import random
+import threading
+import multiprocessing
+import time
+
+from services import metrics
+from services.cpu_budget import NATIVE_THREAD_ENV
+
+BEAT_POOL_ENABLED = os.getenv("ATMOS_BEAT_POOL", "1") == "1"
+BEAT_POOL_SIZE = max(1, int(os.getenv("ATMOS_BEAT_POOL_SIZE", "1")))     # ready beats per (BPM, bucket)
+BEAT_POOL_DIR = os.path.join("temp", "assets", "beat_pool")
+BEAT_BPMS = (72, 75, 78, 80, 82, 85)
+# Beats outlast the song by 5 s and songs are capped at 10 min (services/audio_processor.py)
+DURATION_BUCKETS = (125.0, 245.0, 365.0, 605.0)
+# Bump when the synthesis changes — beats of other versions are removed by the next refill
+BEAT_POOL_VERSION = "p2"
+
+_refill_proc = None
+_refill_lock = threading.Lock()
+
+
+def bucket_for(duration: float):
+    """Shortest bucket that covers `duration` seconds, or None."""
+    return next((b for b in DURATION_BUCKETS if b >= duration), None)
+
+
+def beat_path(bpm: int, bucket: float, variant: int, pool_dir: str = None) -> str:
+    return os.path.join(pool_dir or BEAT_POOL_DIR, f"{BEAT_POOL_VERSION}_{bpm}bpm_{int(bucket)}s_{variant}.flac")
+
+
+def variant_bpm(bpm: int, variant: int) -> float:
+    from services.lofi_beat_generator import vary_bpm
+    return vary_bpm(bpm, seed=bpm * 1000 + variant)
+
+
+def fill(bpm: int, bucket: float, variant: int, pool_dir: str = None) -> str:
+    """Renders one pool beat (no-op when it exists) and returns its path."""
+    path = beat_path(bpm, bucket, variant, pool_dir)
+    if os.path.exists(path):
+        return path
+    import soundfile as sf
+    from services.lofi_beat_generator import generate_lofi_beat, SR
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    start = time.perf_counter()
+    audio = generate_lofi_beat(bucket, variant_bpm(bpm, variant))
+    tmp_path = f"{path}.{os.getpid()}.part.flac"
+    sf.write(tmp_path, audio, SR, subtype='PCM_16')
+    os.replace(tmp_path, path)
+    print(f"Beat pool: {os.path.basename(path)} ready ({time.perf_counter() - start:.1f}s)")
+    return path
+
+
+class PooledBeat:
+    """The first `duration` seconds of pool beat (bpm, bucket, variant) — ready on disk or not."""
+
+    def __init__(self, bpm: int, bucket: float, variant: int, duration: float, pool_dir: str = None):
+        self.bpm, self.bucket, self.variant, self.duration = bpm, bucket, variant, duration
+        self.pool_dir = pool_dir
+        self.path = beat_path(bpm, bucket, variant, pool_dir)
+
+    def ready(self) -> bool:
+        return os.path.exists(self.path)
+
+    def ffmpeg_input(self):
+        """ffmpeg input node reading the pooled file, trimmed to `duration` (ready beats only)."""
+        import ffmpeg
+        return ffmpeg.input(self.path, t=self.duration)
+
+    def blocks(self):
+        """The same beat synthesized block by block (services/lofi_beat_generator.stream_lofi_beat)."""
+        from services.lofi_beat_generator import stream_lofi_beat, SR
+        left = int(self.duration * SR)
+        for block in stream_lofi_beat(self.bucket, variant_bpm(self.bpm, self.variant)):
+            if left <= 0:
+                break
+            yield block[:left]
+            left -= len(block)
+
+    def write(self, output_path: str) -> str:
+        """The beat as a WAV of `duration` seconds, for the engines that read a file. Fills the pool entry."""
+        import ffmpeg
+        fill(self.bpm, self.bucket, self.variant, self.pool_dir)
+        (ffmpeg.input(self.path, t=self.duration)
+               .output(output_path, acodec='pcm_s16le')
+               .run(overwrite_output=True, capture_stdout=True, capture_stderr=True))
+        return output_path
+
+
+def serve(bpm: int, duration: float, seed: int = None):
+    """
+    PooledBeat for a copyright-free job, or None (pool off / BPM or duration not pooled).
+    Seeded jobs always get variant seed % BEAT_POOL_SIZE; others any ready one.
+    """
+    bucket = bucket_for(duration)
+    if not BEAT_POOL_ENABLED or bucket is None or bpm not in BEAT_BPMS:
+        return None
+    if seed is not None:
+        variant = seed % BEAT_POOL_SIZE
+    else:
+        ready = [v for v in range(BEAT_POOL_SIZE) if os.path.exists(beat_path(bpm, bucket, v))]
+        variant = random.choice(ready) if ready else random.randrange(BEAT_POOL_SIZE)
+    beat = PooledBeat(bpm, bucket, variant, duration)
+    hit = beat.ready()
+    metrics.incr("beat_pool.hit" if hit else "beat_pool.miss")
+    print(f"Beat pool: {'hit' if hit else 'miss'} — {bpm} BPM, {bucket:.0f}s bucket, variant {variant}")
+    if not hit:
+        start_refill()
+    return beat
+
+
+def missing_beats(pool_dir: str = None) -> list:
+    return [(bpm, bucket, v) for bucket in DURATION_BUCKETS for bpm in BEAT_BPMS for v in range(BEAT_POOL_SIZE)
+            if not os.path.exists(beat_path(bpm, bucket, v, pool_dir))]
+
+
+def _remove_stale(pool_dir: str, keep: set):
+    for name in os.listdir(pool_dir) if os.path.isdir(pool_dir) else ():
+        if name.endswith(".flac") and ".part" not in name and name not in keep:
+            try: os.remove(os.path.join(pool_dir, name))
+            except OSError: pass
+
+
+def _refill(pool_dir: str, beats: list, keep: set):
+    """Refill process: lowest CPU priority, one native thread, one beat at a time."""
+    try:
+        os.nice(19)
+    except (AttributeError, OSError):
+        pass
+    for var in NATIVE_THREAD_ENV:
+        os.environ[var] = "1"
+    _remove_stale(pool_dir, keep)
+    for bpm, bucket, variant in beats:
+        try:
+            fill(bpm, bucket, variant, pool_dir)
+        except Exception as e:
+            print(f"Beat pool: could not render {bpm} BPM / {bucket:.0f}s #{variant}: {e}")
+
+
+def start_refill():
+    """Starts the refill process when beats are missing and none is running. Returns it (or None)."""
+    global _refill_proc
+    if not BEAT_POOL_ENABLED:
+        return None
+    with _refill_lock:
+        if _refill_proc is not None and _refill_proc.is_alive():
+            return _refill_proc
+        beats = missing_beats()
+        if not beats:
+            return None
+        keep = {os.path.basename(beat_path(bpm, bucket, v)) for bucket in DURATION_BUCKETS
+                for bpm in BEAT_BPMS for v in range(BEAT_POOL_SIZE)}
+        # Spawned, never forked from the threaded server
+        _refill_proc = multiprocessing.get_context("spawn").Process(
+            target=_refill, args=(BEAT_POOL_DIR, beats, keep), name="beat-pool-refill", daemon=True)
+        _refill_proc.start()
+        print(f"Beat pool: refilling {len(beats)} beat(s) in the background")
+        return _refill_proc
@@ -0,0 +1,85 @@
+"""
+cpu_budget.py — One CPU budget shared by every concurrent job
+────────────────────────────────────────────────────────────────────
+Left alone, every ffmpeg process, segment pool and BLAS/OpenMP pool sizes
+itself to the whole machine, so N concurrent jobs run ~N × cores threads.
+Instead:
+  • ATMOS_CPU_BUDGET threads in total (default: one per core)
+  • a running job's allotment = budget / running jobs, re-read at every ffmpeg invocation
+  • ffmpeg gets it as -filter_threads / -filter_complex_threads (global) and
+    as -threads on every encoding output (libmp3lame / libx264 / aac would
+    otherwise size their own pools); a segmented render splits it across
+    its segment workers (one thread each)
+  • native pools (OpenBLAS / MKL / OpenMP / numba) are capped process-wide at
+    budget / ATMOS_RENDER_SLOTS — set before NumPy loads, inherited by worker processes
+ATMOS_THREAD_BUDGET=0 leaves every tool on its own defaults.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+from services.render_queue import RENDER_SLOTS
+
+BUDGET_ENABLED = os.getenv("ATMOS_THREAD_BUDGET", "1") == "1"
+CPU_BUDGET = int(os.getenv("ATMOS_CPU_BUDGET", "0")) or (os.cpu_count() or 1)
+
+NATIVE_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                     "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMBA_NUM_THREADS")
+
+_active = 0
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def job():
+    """Marks one render job as running for the duration of the block."""
+    global _active
+    with _active_lock:
+        _active += 1
+    try:
+        yield
+    finally:
+        with _active_lock:
+            _active -= 1
+
+
+def job_threads() -> int:
+    """Threads one job may use right now (the whole budget outside a job)."""
+    if not BUDGET_ENABLED:
+        return os.cpu_count() or 1
+    with _active_lock:
+        return max(1, CPU_BUDGET // max(1, _active))
+
+
+def ffmpeg_thread_args(threads: int = None) -> tuple:
+    if not BUDGET_ENABLED:
+        return ()
+    n = str(threads or job_threads())
+    return ('-filter_threads', n, '-filter_complex_threads', n)
+
+
+def codec_threads(threads: int = None) -> dict:
+    """ffmpeg.output() kwargs capping the encoder's threads (-threads is a per-output option)."""
+    if not BUDGET_ENABLED:
+        return {}
+    return {'threads': threads or job_threads()}
+
+
+def native_threads() -> int:
+    return max(1, CPU_BUDGET // max(1, RENDER_SLOTS))
+
+
+def cap_native_threads():
+    """Caps BLAS / OpenMP / numba pools. Call before NumPy is imported (main.py does)."""
+    if not BUDGET_ENABLED:
+        return
+    n = str(native_threads())
+    for var in NATIVE_THREAD_ENV:
+        os.environ.setdefault(var, n)
+    try:
+        # Pools that were already initialised (NumPy imported first) are capped at runtime
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=int(n))
+    except Exception:
+        pass
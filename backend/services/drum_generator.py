@@ -0,0 +1,111 @@
+"""
+drum_generator.py — Vectorized boom-bap drum loops, matched to the track BPM
+────────────────────────────────────────────────────────────────────
+Same kick/snare voices as the original per-sample generator, but:
+  • each one-shot (kick, snare) is rendered ONCE as a NumPy array
+  • hits are sequenced on a sample-exact 16-step grid by overlap-add
+  • one bar per loop → seamless stream_loop at any tempo
+  • loops are cached per quantized BPM in temp/assets/drum_cache
+"""
+
+import os
+import threading
+import numpy as np
+
+from services.lofi_chain import SR
+
+DRUM_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'temp', 'assets', 'drum_cache')
+
+# Boom-bap pattern on a 16-step bar
+KICK_STEPS  = (0, 8, 10)     # syncopated kick
+SNARE_STEPS = (4, 12)        # backbeat
+
+BPM_MIN, BPM_MAX = 60, 120   # lofi pocket — DNA tempos are folded into [60, 120)
+BPM_STEP = 1                 # cache granularity
+SNARE_SEED = 75
+
+# Bump when the voices or the pattern change — part of the cached file name
+DRUM_VERSION = "bb1"
+
+_loop_locks: dict = {}
+_loop_locks_guard = threading.Lock()
+
+
+def quantize_bpm(bpm: float) -> int:
+    """Folds half/double-time detections into the lofi range and snaps to BPM_STEP."""
+    bpm = float(bpm) if bpm and bpm > 0 else 75.0
+    while bpm >= BPM_MAX:
+        bpm /= 2
+    while bpm < BPM_MIN:
+        bpm *= 2
+    q = int(round(bpm / BPM_STEP) * BPM_STEP)
+    return min(max(q, BPM_MIN), BPM_MAX - BPM_STEP)
+
+
+def kick_one_shot(length: int, sr: int = SR) -> np.ndarray:
+    """BOOM-BAP KICK — deep, punchy, vintage (pitch-swept sine, soft saturation)."""
+    t = np.arange(length) / sr
+    env = np.maximum(0.0, 1.0 - t * 12.0)           # slightly slower decay for "boom"
+    freq = 80.0 * env + 40.0
+    return np.tanh(np.sin(2 * np.pi * freq * t) * env * 1.5) * 0.9
+
+
+def snare_one_shot(length: int, sr: int = SR, seed: int = SNARE_SEED) -> np.ndarray:
+    """BOOM-BAP SNARE — crunchy, dusty (1-pole lowpassed noise + 200 Hz body)."""
+    from scipy.signal import lfilter
+
+    t = np.arange(length) / sr
+    env = np.maximum(0.0, 1.0 - t * 8.0)
+    alpha = 0.12   # REAL 1-POLE LOWPASS — removes metallic artifacts
+    noise = lfilter([alpha], [1.0, alpha - 1.0], np.random.default_rng(seed).uniform(-1, 1, length))
+    body = np.sin(2 * np.pi * 200 * t) * env
+    return (noise * 0.35 + body * 0.25) * 0.8
+
+
+def render_drum_loop(bpm: float, bars: int = 1, sr: int = SR) -> np.ndarray:
+    """One or more bars of the boom-bap pattern as mono float32 (loop-exact length)."""
+    bar = int(round(4 * 60.0 / bpm * sr))
+    step_len = bar // 16
+    kick, snare = kick_one_shot(step_len, sr), snare_one_shot(step_len, sr)
+
+    out = np.zeros(bar * bars)
+    for b in range(bars):
+        for steps, hit in ((KICK_STEPS, kick), (SNARE_STEPS, snare)):
+            for step in steps:
+                start = b * bar + (step * bar) // 16
+                out[start:start + len(hit)] += hit[:len(out) - start]
+    return np.tanh(out).astype(np.float32)   # soft tape saturation
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _loop_locks_guard:
+        return _loop_locks.setdefault(key, threading.Lock())
+
+
+def get_drum_loop(bpm: float) -> str:
+    """Returns the cached one-bar loop for this BPM (quantized), rendering it on first use."""
+    import soundfile as sf
+
+    q = quantize_bpm(bpm)
+    path = os.path.abspath(os.path.join(DRUM_CACHE_DIR, f"boombap_{q}bpm_{DRUM_VERSION}.wav"))
+    if os.path.exists(path):
+        return path
+
+    with _lock_for(path):
+        if os.path.exists(path):
+            return path
+        os.makedirs(DRUM_CACHE_DIR, exist_ok=True)
+        tmp_path = path + ".part.wav"
+        sf.write(tmp_path, render_drum_loop(q), SR, subtype='PCM_16')
+        os.replace(tmp_path, path)
+    return path
+
+
+def warm_drum_loops():
+    """Renders every cached BPM up front so generation never lands on a job."""
+    for bpm in range(BPM_MIN, BPM_MAX, BPM_STEP):
+        try:
+            get_drum_loop(bpm)
+        except Exception as e:
+            print(f"Drum warm-up failed at {bpm} BPM: {e}")
+            return
@@ -0,0 +1,389 @@
+"""
+dsp_engine.py — In-process NumPy/SciPy render engine
+────────────────────────────────────────────────────────────────────
+Runs the exact filter specs from services/lofi_chain.py on float32
+arrays instead of spawning ffmpeg for every pass:
+  • equalizer / shelves / lowpass / highpass → RBJ biquads, one sosfilt cascade
+  • acompressor / sidechaincompress / alimiter → block-based gain computers
+  • vibrato, aecho, extrastereo, speechnorm, pan, volume, amix
+  • asetrate + aresample → polyphase resampling (resample_poly)
+Decoded buffers are reused (fallback mode decodes the song once) and
+ffmpeg is only spawned to decode the inputs and encode the final master;
+inputs already in the job's PCM cache (services/pcm_cache.py) are not decoded at all.
+"""
+
+import math
+import numpy as np
+import ffmpeg
+from scipy.signal import sosfilt, lfilter, resample_poly
+from scipy.ndimage import minimum_filter1d
+
+from services import lofi_chain
+from services.lofi_chain import SR
+from services.live_stream import MP3_MASTER_ARGS
+from services.cpu_budget import codec_threads
+from services.pcm_cache import source, note_decode, CANONICAL_SR
+
+BLOCK = 64   # samples per gain-computer step (compressor / limiter / speechnorm)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# I/O
+# ─────────────────────────────────────────────────────────────────────────────
+def decode_audio(path: str, channels: int = 2, sr: int = SR) -> np.ndarray:
+    """Decodes any ffmpeg-readable file to a (channels, n) float32 array."""
+    out, _ = (ffmpeg.input(path)
+                    .output('pipe:', format='f32le', acodec='pcm_f32le', ac=channels, ar=sr)
+                    .run(capture_stdout=True, capture_stderr=True))
+    return np.frombuffer(out, np.float32).reshape(-1, channels).T.copy()
+
+
+def _job_input(path: str, pcm, stage: str) -> np.ndarray:
+    """(2, n) float32 song input — a view of the job's decoded PCM when cached, else decoded here."""
+    audio = source(pcm, path)
+    if audio and SR == CANONICAL_SR:
+        return audio.view().T
+    note_decode(pcm, stage)
+    return decode_audio(path)
+
+
+def encode_outputs(x: np.ndarray, output_mp3: str, output_wav: str = None):
+    """Encodes the master to MP3 (and WAV) with one ffmpeg invocation fed from stdin."""
+    pcm = np.ascontiguousarray(np.clip(x, -1.0, 1.0).T, dtype=np.float32).tobytes()
+    src = ffmpeg.input('pipe:', format='f32le', ar=SR, ac=x.shape[0])
+    outs = [ffmpeg.output(src, output_mp3, **MP3_MASTER_ARGS, **codec_threads())]
+    if output_wav:
+        outs.append(ffmpeg.output(src, output_wav, acodec='pcm_s16le', **codec_threads()))
+    ffmpeg.merge_outputs(*outs).run(input=pcm, overwrite_output=True, quiet=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# BIQUADS (RBJ cookbook — same formulas as ffmpeg's af_biquads)
+# ─────────────────────────────────────────────────────────────────────────────
+BIQUAD_DEFAULTS = {
+    'equalizer': ('q', 1.0),
+    'lowshelf':  ('q', 0.5),
+    'highshelf': ('q', 0.5),
+    'lowpass':   ('q', 0.707),
+    'highpass':  ('q', 0.707),
+}
+
+
+def _alpha(w0: float, f: float, width_type: str, w: float) -> float:
+    if width_type == 'h':
+        return math.sin(w0) / (2 * f / w)
+    if width_type == 'k':
+        return math.sin(w0) / (2 * f / (w * 1000))
+    if width_type == 'o':
+        return math.sin(w0) * math.sinh(math.log(2) / 2 * w * w0 / math.sin(w0))
+    return math.sin(w0) / (2 * w)   # 'q'
+
+
+def biquad_sos(kind: str, f: float, gain: float = 0.0, width_type: str = None,
+               w: float = None, sr: int = SR) -> np.ndarray:
+    """Returns one normalized SOS row [b0, b1, b2, 1, a1, a2] for an ffmpeg biquad filter."""
+    d_type, d_w = BIQUAD_DEFAULTS[kind]
+    width_type = width_type or d_type
+    w = d_w if w is None else w
+
+    w0 = 2 * math.pi * f / sr
+    cw = math.cos(w0)
+    alpha = _alpha(w0, f, width_type, w)
+    A = 10 ** (gain / 40)
+
+    if kind == 'equalizer':
+        b = [1 + alpha * A, -2 * cw, 1 - alpha * A]
+        a = [1 + alpha / A, -2 * cw, 1 - alpha / A]
+    elif kind == 'lowshelf':
+        beta = 2 * math.sqrt(A) * alpha
+        b = [A * ((A + 1) - (A - 1) * cw + beta), 2 * A * ((A - 1) - (A + 1) * cw), A * ((A + 1) - (A - 1) * cw - beta)]
+        a = [(A + 1) + (A - 1) * cw + beta, -2 * ((A - 1) + (A + 1) * cw), (A + 1) + (A - 1) * cw - beta]
+    elif kind == 'highshelf':
+        beta = 2 * math.sqrt(A) * alpha
+        b = [A * ((A + 1) + (A - 1) * cw + beta), -2 * A * ((A - 1) + (A + 1) * cw), A * ((A + 1) + (A - 1) * cw - beta)]
+        a = [(A + 1) - (A - 1) * cw + beta, 2 * ((A - 1) - (A + 1) * cw), (A + 1) - (A - 1) * cw - beta]
+    elif kind == 'lowpass':
+        b = [(1 - cw) / 2, 1 - cw, (1 - cw) / 2]
+        a = [1 + alpha, -2 * cw, 1 - alpha]
+    elif kind == 'highpass':
+        b = [(1 + cw) / 2, -(1 + cw), (1 + cw) / 2]
+        a = [1 + alpha, -2 * cw, 1 - alpha]
+    else:
+        raise ValueError(f"Unknown biquad: {kind}")
+
+    return np.array([b[0] / a[0], b[1] / a[0], b[2] / a[0], 1.0, a[1] / a[0], a[2] / a[0]])
+
+
+def biquad_from_spec(name: str, kwargs: dict, sr: int = SR) -> np.ndarray:
+    gain = kwargs.get('g', kwargs.get('gain', 0.0))
+    return biquad_sos(name, float(kwargs['f']), float(gain), kwargs.get('width_type'), kwargs.get('w'), sr)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# DYNAMICS (block-based gain computers)
+# ─────────────────────────────────────────────────────────────────────────────
+def _block_levels(detector: np.ndarray, reduce: str) -> np.ndarray:
+    n = detector.shape[-1]
+    pad = (-n) % BLOCK
+    blocks = np.pad(detector, (0, pad), mode='edge').reshape(-1, BLOCK)
+    if reduce == "max":
+        return blocks.max(axis=1)
+    if reduce == "min":
+        return blocks.min(axis=1)
+    return blocks.mean(axis=1)
+
+
+def _block_to_samples(block_vals: np.ndarray, n: int) -> np.ndarray:
+    centers = np.arange(len(block_vals)) * BLOCK + BLOCK / 2
+    return np.interp(np.arange(n), centers, block_vals).astype(np.float32)
+
+
+def _compressor_gain(detector: np.ndarray, threshold: float, ratio: float,
+                     attack: float, release: float, sr: int = SR) -> np.ndarray:
+    """
+    ffmpeg acompressor semantics (rms detection, linked channels):
+    per-sample one-pole smoothing with coeff = 4000 / (ms * sr), run per BLOCK.
+    """
+    n = detector.shape[-1]
+    levels = _block_levels(detector * detector, "mean").tolist()
+    att = 1.0 - (1.0 - min(1.0, 4000.0 / (attack * sr))) ** BLOCK
+    rel = 1.0 - (1.0 - min(1.0, 4000.0 / (release * sr))) ** BLOCK
+
+    slide = 0.0
+    env = [0.0] * len(levels)
+    for i, lvl in enumerate(levels):
+        slide += (lvl - slide) * (att if lvl > slide else rel)
+        env[i] = slide
+
+    level = np.sqrt(np.maximum(np.asarray(env), 1e-20))
+    thres_log = math.log(threshold)
+    lvl_log = np.log(level)
+    gain = np.where(level > threshold,
+                    np.exp((lvl_log - thres_log) / ratio + thres_log - lvl_log), 1.0)
+    return _block_to_samples(gain, n)
+
+
+def acompressor(x: np.ndarray, threshold=0.125, ratio=2.0, attack=20, release=250, makeup=1.0, **_):
+    detector = np.mean(np.abs(x), axis=0)
+    return x * _compressor_gain(detector, threshold, ratio, attack, release) * makeup
+
+
+def sidechaincompress(main: np.ndarray, side: np.ndarray, threshold=0.125, ratio=2.0,
+                      attack=20, release=250, makeup=1.0, **_):
+    n = main.shape[-1]
+    detector = np.mean(np.abs(side), axis=0)[:n]
+    if detector.shape[-1] < n:
+        main = main[..., :detector.shape[-1]]
+        n = detector.shape[-1]
+    return main * _compressor_gain(detector, threshold, ratio, attack, release) * makeup
+
+
+def alimiter(x: np.ndarray, limit=1.0, attack=5, release=50, level=True, **_):
+    """Lookahead peak limiter: instant attack over the lookahead window, exponential release."""
+    n = x.shape[-1]
+    peak = np.max(np.abs(x), axis=0)
+    need = np.minimum(1.0, limit / np.maximum(peak, 1e-9))
+    look = max(1, int(attack * SR / 1000))
+    need = minimum_filter1d(need, size=2 * look + 1, mode='nearest')
+
+    blocks = _block_levels(need, "min")
+    rel = 1.0 - math.exp(-BLOCK / (release * SR / 1000))
+    g = 1.0
+    gains = []
+    for b in blocks.tolist():
+        g = b if b < g else g + (1.0 - g) * rel
+        g = min(g, 1.0)
+        gains.append(g)
+    gain = np.minimum(need, _block_to_samples(np.asarray(gains), n))
+
+    out = x * gain
+    if level:
+        out = out / limit   # alimiter auto-level (default on)
+    return out.astype(np.float32)
+
+
+def speechnorm(x: np.ndarray, p=0.95, e=2.0, c=2.0, r=0.001, f=0.001, l=0, **_):
+    """
+    Speech normalizer: gain chases p / local_peak (≤ e expansion, ≤ c compression),
+    rising by at most r and falling by at most f per half-cycle.
+    """
+    n = x.shape[-1]
+    mono = np.max(np.abs(x), axis=0) if l else np.abs(x).mean(axis=0)
+    peaks = _block_levels(mono, "max")
+    signs = np.signbit(np.pad(x[0], (0, (-n) % BLOCK)).reshape(-1, BLOCK)).astype(np.int8)
+    half_cycles = np.maximum(1, np.count_nonzero(np.diff(signs, axis=1), axis=1))
+
+    targets = np.clip(p / np.maximum(peaks, 1e-6), 1.0 / c, e).tolist()
+    g = 1.0
+    gains = []
+    for tgt, hc in zip(targets, half_cycles.tolist()):
+        g = min(tgt, g + r * hc) if tgt > g else max(tgt, g - f * hc)
+        gains.append(g)
+    return x * _block_to_samples(np.asarray(gains), n)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MODULATION / SPATIAL / LEVEL
+# ─────────────────────────────────────────────────────────────────────────────
+def vibrato(x: np.ndarray, f=5.0, d=0.5, sr: int = SR, **_):
+    """ffmpeg vibrato: sine-modulated delay of up to 5 ms × depth, linear interpolation."""
+    n = x.shape[-1]
+    buf = max(1, round(sr * 0.005))
+    t = np.arange(n)
+    lfo = 0.5 + 0.5 * np.sin(2 * np.pi * f * t / sr + 3 * np.pi / 2)
+    pos = np.clip(t - d * (buf - 1) * lfo, 0, n - 1)
+    return np.stack([np.interp(pos, t, ch) for ch in x]).astype(np.float32)
+
+
+def aecho(x: np.ndarray, in_gain=0.6, out_gain=0.3, delays="1000", decays="0.5", sr: int = SR, **_):
+    """Feed-forward echo taps on the input (like ffmpeg's aecho)."""
+    n = x.shape[-1]
+    out = x * in_gain
+    for dl, dc in zip(str(delays).split('|'), str(decays).split('|')):
+        k = int(float(dl) * sr / 1000)
+        if 0 < k < n:
+            out[..., k:] += x[..., :n - k] * float(dc)
+    return out * out_gain
+
+
+def extrastereo(x: np.ndarray, m=2.5, c=True, **_):
+    if x.shape[0] < 2:
+        return x
+    avg = x.mean(axis=0, keepdims=True)
+    out = avg + m * (x - avg)
+    return np.clip(out, -1.0, 1.0) if c else out
+
+
+def to_stereo(x: np.ndarray) -> np.ndarray:
+    return np.repeat(x, 2, axis=0) if x.shape[0] == 1 else x
+
+
+def amix(inputs: list) -> np.ndarray:
+    """amix duration=first normalize=0 — plain sum, trimmed/padded to the first input."""
+    n = inputs[0].shape[-1]
+    out = to_stereo(inputs[0]).astype(np.float32).copy()
+    for y in inputs[1:]:
+        y = to_stereo(y)[..., :n]
+        out[..., :y.shape[-1]] += y
+    return out
+
+
+def noise_source(color: str, seed: int, n: int) -> np.ndarray:
+    """Seeded anoisesrc equivalent (mono, amplitude 1)."""
+    white = np.random.default_rng(seed).uniform(-1.0, 1.0, n)
+    if color == 'brown':
+        noise = lfilter([0.02 / 1.02], [1.0, -1.0 / 1.02], white) * 3.5
+    elif color == 'pink':
+        # Paul Kellet's pink filter
+        noise = lfilter([0.049922035, -0.095993537, 0.050612699, -0.004408786],
+                        [1.0, -2.494956002, 2.017265875, -0.522189400], white) * 3.0
+    else:
+        noise = white
+    return noise.astype(np.float32)[None, :]
+
+
+def loop_to_length(loop: np.ndarray, n: int) -> np.ndarray:
+    """stream_loop equivalent: tiles a (channels, m) loop and cuts it to n samples."""
+    reps = int(math.ceil(n / max(loop.shape[-1], 1)))
+    return np.tile(loop, (1, reps))[..., :n]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CHAIN RUNNER
+# ─────────────────────────────────────────────────────────────────────────────
+def apply_chain(x: np.ndarray, chain: list, sr: int = SR) -> np.ndarray:
+    """
+    Runs a lofi_chain spec list. Consecutive biquads are batched into one sosfilt
+    cascade. asetrate only relabels the rate; the next aresample resamples from it.
+    """
+    cur_sr = sr
+    sos_run = []
+
+    def flush(y):
+        if sos_run:
+            y = sosfilt(np.vstack(sos_run), y, axis=-1).astype(np.float32)
+            sos_run.clear()
+        return y
+
+    for name, args, kwargs in chain:
+        if name in BIQUAD_DEFAULTS:
+            sos_run.append(biquad_from_spec(name, kwargs, cur_sr))
+            continue
+        x = flush(x)
+        if name == 'volume':
+            x = x * float(kwargs.get('volume', args[0] if args else 1.0))
+        elif name == 'asetrate':
+            cur_sr = int(args[0] if args else kwargs['r'])
+        elif name == 'aresample':
+            target = int(args[0] if args else kwargs.get('osr', SR))
+            if target != cur_sr:
+                g = math.gcd(target, cur_sr)
+                x = resample_poly(x, target // g, cur_sr // g, axis=-1).astype(np.float32)
+                cur_sr = target
+        elif name == 'pan':
+            x = x.mean(axis=0, keepdims=True)
+        elif name == 'vibrato':
+            x = vibrato(x, sr=cur_sr, **kwargs)
+        elif name == 'aecho':
+            x = aecho(x, sr=cur_sr, **kwargs)
+        elif name in _SIMPLE:
+            x = _SIMPLE[name](x, **kwargs)
+        else:
+            raise ValueError(f"dsp_engine: unsupported filter '{name}'")
+    return flush(x).astype(np.float32)
+
+
+_SIMPLE = {
+    'acompressor': acompressor,
+    'alimiter': alimiter,
+    'speechnorm': speechnorm,
+    'extrastereo': extrastereo,
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# FULL RENDER (mirrors process_audio's ffmpeg graph)
+# ─────────────────────────────────────────────────────────────────────────────
+def render_lofi(input_instrumental: str, input_vocals: str, output_wav: str, output_mp3: str, *,
+                bass_gain: float, lp_freq: float, track_vol: float, amb_vol: float,
+                vocal_vol: float, rate: float, mood: str, is_fallback: bool,
+                drum_path: str = None, amb_bed: str = None, pcm=None) -> np.ndarray:
+    inst = _job_input(input_instrumental, pcm, "render_instrumental")
+
+    # PASS 1: LOFI INSTRUMENTAL
+    music = apply_chain(inst, lofi_chain.instrumental_chain(bass_gain, lp_freq, track_vol))
+
+    if amb_bed:
+        amb_src = loop_to_length(decode_audio(amb_bed, channels=1), music.shape[-1])
+    else:
+        amb = lofi_chain.ambience_for_mood(mood)
+        amb_src = apply_chain(noise_source(amb['color'], amb['seed'], music.shape[-1]), amb['chain'])
+    amb_ducked = sidechaincompress(amb_src, music, **lofi_chain.AMB_SIDECHAIN)
+    amb_final = apply_chain(amb_ducked, lofi_chain.ambience_level_chain(amb_vol))
+
+    layers = [music, amb_final]
+    if drum_path:
+        drums = loop_to_length(decode_audio(drum_path, channels=1), music.shape[-1])
+        layers.append(apply_chain(drums, lofi_chain.drums_chain()))
+
+    inst_mix = amix(layers) * lofi_chain.INST_MIX_GAIN
+
+    # PASS 2: DREAMY VOCAL OVERLAY
+    if input_vocals and not is_fallback:
+        vox = apply_chain(_job_input(input_vocals, pcm, "render_vocals"), lofi_chain.vocal_chain(vocal_vol))
+        inst_wide = apply_chain(inst_mix, lofi_chain.instrumental_wide_chain())
+        inst_ducked = sidechaincompress(inst_wide, vox, **lofi_chain.VOX_SIDECHAIN)
+        master = amix([inst_ducked, vox]) * lofi_chain.VOX_MIX_GAIN
+    elif input_vocals and is_fallback:
+        # Same file as the instrumental — reuse the decoded buffer
+        vox = apply_chain(inst, lofi_chain.fallback_vocal_chain(vocal_vol))
+        master = amix([inst_mix, vox]) * lofi_chain.FALLBACK_MIX_GAIN
+    else:
+        master = inst_mix
+
+    # MASTERING
+    master = apply_chain(master, lofi_chain.mastering_chain(rate))
+
+    print("Exporting master (numpy engine)...")
+    encode_outputs(master, output_mp3, output_wav)
+    return master
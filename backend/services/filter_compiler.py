@@ -0,0 +1,193 @@
+"""
+filter_compiler.py — Filtergraph compiler for the lofi chain
+────────────────────────────────────────────────────────────────────
+Turns the raw lofi_chain specs into an optimized filter spec:
+  • linear EQ stages (equalizer / shelves / lowpass / highpass) become
+    plain `biquad` stages with their coefficients precomputed for the known
+    rate, and a `volume` right after an EQ run is folded into the last
+    biquad's numerator
+  • redundant `aresample` stages are dropped when the rate is already known
+    (and the tmp_inst_*.wav re-read in two-pass mode skips its resample)
+  • the whole compiled graph is memoized per (preset sliders, DNA bucket, mood)
+  • each job logs its filter-count reduction and render time vs raw graphs
+EQ runs used to be fused into one serial-biquad `aiir` stage. ffmpeg 7.0
+intermittently rendered graphs with several of those as full-scale noise
+(test_compiled_graph.py repeats renders to catch it), so they are not.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from services import lofi_chain
+from services.lofi_chain import F, SR
+from services.dsp_engine import BIQUAD_DEFAULTS, biquad_from_spec
+from services.cpu_budget import ffmpeg_thread_args
+
+FUSABLE = set(BIQUAD_DEFAULTS)
+
+
+def compiled_biquad(name: str, kwargs: dict, gain: float = 1.0, sr: int = SR):
+    """One EQ spec as a `biquad` stage with precomputed coefficients, `gain` folded into b0..b2."""
+    b0, b1, b2, _, a1, a2 = biquad_from_spec(name, kwargs, sr)
+    return F('biquad', b0=f"{b0 * gain:.17g}", b1=f"{b1 * gain:.17g}", b2=f"{b2 * gain:.17g}",
+             a0=1, a1=f"{a1:.17g}", a2=f"{a2:.17g}")
+
+
+def compile_chain(chain: list, input_rate: int = None) -> list:
+    """
+    Optimizes one linear filter chain. input_rate is the known rate of the stream
+    feeding it (None = unknown, e.g. a user upload).
+    """
+    out = []
+    cur_sr = input_rate
+    run = []
+
+    def flush(trailing_gain: float = 1.0):
+        for i, (name, _, kwargs) in enumerate(run):
+            out.append(compiled_biquad(name, kwargs, trailing_gain if i == len(run) - 1 else 1.0, cur_sr or SR))
+        run.clear()
+
+    for name, args, kwargs in chain:
+        if name in FUSABLE:
+            run.append((name, args, kwargs))
+            continue
+        if name == 'volume' and run:
+            # Linear gain right after an EQ run → fold into its last biquad
+            flush(float(kwargs.get('volume', args[0] if args else 1.0)))
+            continue
+        flush()
+        if name == 'aresample':
+            target = int(args[0] if args else kwargs.get('osr', SR))
+            if cur_sr == target:
+                continue   # already at the target rate
+            cur_sr = target
+        elif name == 'asetrate':
+            cur_sr = int(args[0] if args else kwargs['r'])
+        out.append((name, args, kwargs))
+    flush()
+    return out
+
+
+class CompiledGraph:
+    """All chains of one render, compiled, plus the per-job filter-count report."""
+
+    def __init__(self, chains: dict, raw_counts: dict):
+        self.chains = chains
+        self.raw_counts = raw_counts
+        self.counts = {name: len(chain) for name, chain in chains.items()}
+
+    def run(self, output, threads: int = None, feed=None, **kwargs):
+        """
+        Runs an ffmpeg-python output node built from this graph with the job's
+        thread allotment (services/cpu_budget.py) — or `threads`, if given.
+        `feed` (float32 arrays) is written to the stdin of a graph with a
+        'pipe:' input while ffmpeg renders.
+        """
+        args = ffmpeg_thread_args(threads)
+        if args:
+            output = output.global_args(*args)
+        if feed is not None:
+            return _run_fed(output, feed, **kwargs)
+        return output.run(**kwargs)
+
+    def __getitem__(self, name: str) -> list:
+        return self.chains[name]
+
+    @property
+    def filters_before(self) -> int:
+        return sum(self.raw_counts.values())
+
+    @property
+    def filters_after(self) -> int:
+        return sum(self.counts.values())
+
+    def report(self) -> str:
+        parts = ", ".join(f"{n} {self.raw_counts[n]}→{self.counts[n]}" for n in self.chains)
+        return f"{self.filters_before} → {self.filters_after} filters ({parts})"
+
+
+def _run_fed(output, feed, capture_stdout: bool = False, capture_stderr: bool = False,
+             quiet: bool = False, overwrite_output: bool = False) -> tuple:
+    """output.run() with `feed` streamed into ffmpeg's stdin. → (stdout, stderr); raises ffmpeg.Error."""
+    import ffmpeg
+    proc = output.run_async(pipe_stdin=True, pipe_stdout=capture_stdout, pipe_stderr=capture_stderr,
+                            quiet=quiet, overwrite_output=overwrite_output)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # Drain ffmpeg's output pipes while feeding it — otherwise both sides can block
+        readers = [pool.submit(pipe.read) if pipe else None for pipe in (proc.stdout, proc.stderr)]
+        try:
+            for block in feed:
+                proc.stdin.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+        except BrokenPipeError:
+            pass        # ffmpeg exited early — its return code says why
+        finally:
+            try: proc.stdin.close()
+            except BrokenPipeError: pass
+        out, err = (r.result() if r else None for r in readers)
+    if proc.wait() != 0:
+        raise ffmpeg.Error('ffmpeg', out, err)
+    return out, err
+
+
+def _raw_chains(bass_gain, lp_freq, track_vol, amb_vol, vocal_vol, rate, mood) -> dict:
+    return {
+        "instrumental": lofi_chain.instrumental_chain(bass_gain, lp_freq, track_vol),
+        "ambience":     lofi_chain.ambience_for_mood(mood)["chain"],
+        "ambience_level": lofi_chain.ambience_level_chain(amb_vol),
+        "drums":        lofi_chain.drums_chain(),
+        "vocals":       lofi_chain.vocal_chain(vocal_vol),
+        "instrumental_wide": lofi_chain.instrumental_wide_chain(),
+        "fallback_vocals": lofi_chain.fallback_vocal_chain(vocal_vol),
+        "mastering":    lofi_chain.mastering_chain(rate),
+    }
+
+
+# Chains fed by our own 44.1k graph output. Source-side aresamples (uploads, drum loop,
+# anoisesrc) are kept: ffmpeg negotiates the source's sample format through them
+KNOWN_RATES = {"ambience_level": SR, "instrumental_wide": SR, "mastering": SR}
+
+
+@lru_cache(maxsize=256)
+def compile_graph(bass_gain: float, lp_freq: float, track_vol: float, amb_vol: float,
+                  vocal_vol: float, rate: float, mood: str) -> CompiledGraph:
+    """
+    Memoized per (preset sliders, DNA bucket = bass_gain/lp_freq, mood).
+    Returns the raw chains unchanged in structure, just optimized.
+    """
+    raw = _raw_chains(bass_gain, lp_freq, track_vol, amb_vol, vocal_vol, rate, mood)
+    chains = {name: compile_chain(chain, KNOWN_RATES.get(name)) for name, chain in raw.items()}
+    return CompiledGraph(chains, {name: len(chain) for name, chain in raw.items()})
+
+
+def uncompiled_graph(bass_gain: float, lp_freq: float, track_vol: float, amb_vol: float,
+                     vocal_vol: float, rate: float, mood: str) -> CompiledGraph:
+    raw = _raw_chains(bass_gain, lp_freq, track_vol, amb_vol, vocal_vol, rate, mood)
+    return CompiledGraph(raw, {name: len(chain) for name, chain in raw.items()})
+
+
+# Render cost per mode: compiled → [jobs, total render secs, total audio secs]
+_render_stats = {True: [0, 0.0, 0.0], False: [0, 0.0, 0.0]}
+_stats_lock = threading.Lock()
+
+
+def record_render(compiled: bool, render_secs: float, audio_secs: float) -> str:
+    """Adds one job to the per-mode totals and returns the render-time line for the log."""
+    with _stats_lock:
+        if audio_secs > 0:
+            stats = _render_stats[compiled]
+            stats[0] += 1
+            stats[1] += render_secs
+            stats[2] += audio_secs
+        mine, other = _render_stats[compiled], _render_stats[not compiled]
+        line = f"{render_secs:.2f}s"
+        if audio_secs > 0:
+            line += f" ({render_secs / audio_secs * 60:.2f}s per audio minute)"
+        if mine[0] and other[0]:
+            comp, raw = (mine, other) if compiled else (other, mine)
+            comp_rt, raw_rt = comp[1] / comp[2], raw[1] / raw[2]
+            line += (f" | compiled {comp_rt * 60:.2f}s/min ({comp[0]} jobs) vs raw {raw_rt * 60:.2f}s/min "
+                     f"({raw[0]} jobs) → {(1 - comp_rt / raw_rt) * 100:+.1f}% saved")
+        return line
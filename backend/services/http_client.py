@@ -0,0 +1,81 @@
+"""
+http_client.py — One pooled, keep-alive HTTP session for every external API
+────────────────────────────────────────────────────────────────────
+A bare requests.get / post opens (and drops) a new connection per call:
+DNS + TCP + TLS again for every lyrics lookup, OpenRouter post and each of
+the up to 36 StemSplit status polls of a job. Instead:
+  • one process-wide requests.Session, built on first use
+  • its adapter keeps a urllib3 connection pool per host (HTTP_POOL_HOSTS
+    hosts, HTTP_POOL_SIZE kept-alive connections each; more concurrent
+    requests still go through, the extra connections are just not kept)
+  • idempotent requests (GET / HEAD / …) are retried HTTP_RETRIES times on
+    connection errors and 429 / 5xx answers, with exponential backoff
+    (HTTP_BACKOFF · 2^n seconds, Retry-After honoured); POSTs never are
+  • pool_stats() — connections opened vs requests sent, per host — is
+    merged into /api/metrics
+Env: ATMOS_HTTP_POOL_SIZE, ATMOS_HTTP_POOL_HOSTS, ATMOS_HTTP_RETRIES, ATMOS_HTTP_BACKOFF.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_SIZE  = int(os.getenv("ATMOS_HTTP_POOL_SIZE", "10"))
+HTTP_POOL_HOSTS = int(os.getenv("ATMOS_HTTP_POOL_HOSTS", "16"))
+HTTP_RETRIES    = int(os.getenv("ATMOS_HTTP_RETRIES", "2"))
+HTTP_BACKOFF    = float(os.getenv("ATMOS_HTTP_BACKOFF", "0.5"))
+RETRY_STATUSES  = (429, 500, 502, 503, 504)
+
+_session = None
+_lock = threading.Lock()
+
+
+def make_session(pool_size: int = HTTP_POOL_SIZE, pool_hosts: int = HTTP_POOL_HOSTS,
+                 retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF) -> requests.Session:
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                  raise_on_status=False, respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def session() -> requests.Session:
+    """The shared session (thread-safe for requests; nobody mutates its cookies or headers)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return session().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return session().post(url, **kwargs)
+
+
+def pool_stats(s: requests.Session = None) -> dict:
+    """{"http.<host>.connections": opened, "http.<host>.requests": sent} for the live pools."""
+    s = s or _session
+    if s is None:
+        return {}
+    stats = {}
+    for adapter in {id(a): a for a in s.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port not in (None, 80, 443) else pool.host
+            stats[f"http.{host}.connections"] = stats.get(f"http.{host}.connections", 0) + pool.num_connections
+            stats[f"http.{host}.requests"] = stats.get(f"http.{host}.requests", 0) + pool.num_requests
+    return dict(sorted(stats.items()))
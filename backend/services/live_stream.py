@@ -0,0 +1,47 @@
+"""
+live_stream.py — Progressive MP3 playback while a job is still rendering
+────────────────────────────────────────────────────────────────────
+The mastering pass writes the MP3 master front to back, so the file on
+disk is a playable, growing MP3 stream long before the job completes:
+  • MP3 masters are muxed with flush_packets → every frame reaches the file as soon as it is encoded
+  • /api/stream/{task_id} tails that file over a chunked HTTP response
+  • the response ends once the job leaves the rendering states
+After completion the endpoint simply serves the finished (seekable) file.
+"""
+
+import os
+import time
+import asyncio
+from typing import AsyncIterator, Callable
+
+# Output options for every MP3 master (ffmpeg graph, segmented encoder, numpy engine)
+MP3_MASTER_ARGS = dict(audio_bitrate='320k', flush_packets=1)
+
+CHUNK_BYTES   = 64 * 1024
+POLL_SECONDS  = 0.25     # how often a caught-up reader checks for new frames
+START_TIMEOUT = 600      # give up if the master never appears (stems / DNA still running)
+
+
+async def follow_file(path: str, is_live: Callable[[], bool]) -> AsyncIterator[bytes]:
+    """
+    Yields the bytes of `path` as they are written.
+    is_live() → True while the writer may still append; once it returns False
+    the remaining bytes are sent and the stream ends.
+    """
+    deadline = time.monotonic() + START_TIMEOUT
+    while not os.path.exists(path):
+        if not is_live() or time.monotonic() > deadline:
+            return
+        await asyncio.sleep(POLL_SECONDS)
+
+    with open(path, "rb") as f:
+        while True:
+            # Check BEFORE reading: a False here means the file was final when we read it
+            live = is_live()
+            chunk = f.read(CHUNK_BYTES)
+            if chunk:
+                yield chunk
+                continue
+            if not live:
+                return
+            await asyncio.sleep(POLL_SECONDS)
@@ -3,15 +3,22 @@ lofi_beat_generator.py — High Quality Lofi Synthesizer
 ────────────────────────────────────────────────────────────────────
 Uses scipy + numpy for professional-quality lofi backing tracks:
   • Additive synthesis (harmonic sines — NOT FM, no bell sound)
-  • Butterworth lowpass filter per note (warm, smooth)
+  • Butterworth lowpass filter per note (warm, smooth) — filter designs
+    and rendered note templates are cached, a beat is overlap-added from
+    them chord by chord
   • Real Am7→G→Fmaj7→Em7 chord progression
   • Humanized timing ±20ms
   • Swing rhythm on off-beats
   • Bass on beats 1 & 3
   • All 100% original — zero Content ID match
+  • Fixed master gain from the note templates' worst case (no peak scan),
+    so stream_lofi_instrumental() yields the beat in ~2-bar float32 blocks
+    from the first chord on (flat memory, no WAV) — process_audio pipes it
+    straight into ffmpeg
 """
 
 import os, io, random, wave
+from functools import lru_cache
 import numpy as np
 from scipy.signal import butter, sosfilt
 
@@ -37,9 +44,19 @@ CHORDS = [
 ]
 
 # ── Butterworth lowpass (warm, no ringing) ────────────────────────────────────
+@lru_cache(maxsize=None)
+def lowpass_sos(cutoff: float, order: int = 2) -> np.ndarray:
+    """Designed once per (cutoff, order) — every note of a voice shares it."""
+    return butter(order, cutoff / (SR / 2), btype='low', output='sos')
+
 def lp(data: np.ndarray, cutoff: float, order: int = 2) -> np.ndarray:
-    sos = butter(order, cutoff / (SR / 2), btype='low', output='sos')
-    return sosfilt(sos, data).astype(np.float32)
+    return sosfilt(lowpass_sos(cutoff, order), data).astype(np.float32)
+
+# ── ADSR ──────────────────────────────────────────────────────────────────────
+ATK = max(1, int(0.012 * SR))
+DEC = max(1, int(0.08  * SR))
+SUS = 0.60
+REL = max(1, int(0.18  * SR))
 
 # ── Additive note (NOT FM — no bell!) ─────────────────────────────────────────
 def make_note(freq: float, dur: float, harmonics: list[tuple], vel: float = 0.6,
@@ -55,18 +72,12 @@ def make_note(freq: float, dur: float, harmonics: list[tuple], vel: float = 0.6,
     for h, amp in harmonics:
         wave_out += amp * np.sin(2 * np.pi * freq * h * t)
 
-    # ADSR
-    atk = max(1, int(0.012 * SR))
-    dec = max(1, int(0.08  * SR))
-    sus = 0.60
-    rel = max(1, int(0.18  * SR))
-
-    env = np.full(n, sus, dtype=np.float32)
-    env[:atk] = np.linspace(0, 1, atk)
-    d_end = min(atk + dec, n)
-    env[atk:d_end] = np.linspace(1, sus, d_end - atk)
-    if rel < n:
-        env[-rel:] = np.linspace(sus, 0, rel)
+    env = np.full(n, SUS, dtype=np.float32)
+    env[:ATK] = np.linspace(0, 1, ATK)[:n]     # a note cut at the track end can be shorter than the attack
+    d_end = min(ATK + DEC, n)
+    env[ATK:d_end] = np.linspace(1, SUS, max(0, d_end - ATK))
+    if REL < n:
+        env[-REL:] = np.linspace(SUS, 0, REL)
 
     note = wave_out * env * vel
 
@@ -74,16 +85,71 @@ def make_note(freq: float, dur: float, harmonics: list[tuple], vel: float = 0.6,
     note = lp(note, cutoff)
     return note
 
+# ── Note templates ────────────────────────────────────────────────────────────
+# A note is linear in its velocity, and until its release starts it does not
+# depend on its length. So each (freq, harmonics, cutoff) is synthesized and
+# filtered ONCE, held (no release) for a length rounded up to TEMPLATE_QUANTUM;
+# a note of n samples is that template's first n - REL samples plus its own
+# release tail, filtered on from the biquad state the template had there.
+TEMPLATE_QUANTUM = int(0.25 * SR)
+
+def _harmonic_wave(freq: float, harmonics: tuple, start: int, n: int) -> np.ndarray:
+    t = np.arange(start, start + n, dtype=np.float64) / SR
+    w = np.zeros(n, dtype=np.float64)
+    for h, amp in harmonics:
+        w += amp * np.sin(2 * np.pi * freq * h * t)
+    return w
+
+@lru_cache(maxsize=32)
+def note_template(freq: float, n: int, harmonics: tuple, cutoff: float) -> np.ndarray:
+    """Held note (attack, decay, sustain — no release) at vel=1, lowpassed. Read-only."""
+    env = np.full(n, SUS)
+    env[:ATK] = np.linspace(0, 1, ATK)
+    env[ATK:ATK + DEC] = np.linspace(1, SUS, DEC)
+    y = lp(_harmonic_wave(freq, harmonics, 0, n) * env, cutoff)
+    y.flags.writeable = False
+    return y
+
+def render_note(freq: float, dur: float, harmonics: list[tuple], vel: float = 0.6,
+                cutoff: float = 2800.0) -> np.ndarray:
+    """make_note() from a cached template (same audio); short notes are synthesized directly."""
+    n = int(dur * SR)
+    k = n - REL                             # first sample of the release
+    sos = lowpass_sos(cutoff)
+    if k - 2 < ATK + DEC or len(sos) != 1:
+        return make_note(freq, dur, harmonics, vel, cutoff)
+    harmonics = tuple(harmonics)
+    held = note_template(freq, -(-n // TEMPLATE_QUANTUM) * TEMPLATE_QUANTUM, harmonics, cutoff)
+
+    # Biquad (transposed direct form II) state after sample k-1, from the held note's in/out
+    w = _harmonic_wave(freq, harmonics, k - 2, REL + 2)
+    x1, x2 = w[1] * SUS, w[0] * SUS
+    y1, y2 = float(held[k - 1]), float(held[k - 2])
+    b0, b1, b2, _, a1, a2 = sos[0]
+    zi = [[b1 * x1 - a1 * y1 + b2 * x2 - a2 * y2, b2 * x1 - a2 * y1]]
+    tail, _ = sosfilt(sos, w[2:] * np.linspace(SUS, 0, REL), zi=zi)
+
+    note = np.empty(n, dtype=np.float32)
+    np.multiply(held[:k], vel, out=note[:k])
+    note[k:] = tail * vel
+    return note
+
 # EP harmonics: fundamental + gentle 2nd/3rd (like Fender Rhodes)
 EP = [(1, 1.0), (2, 0.28), (3, 0.08), (4, 0.03)]
 # Bass harmonics: fundamental + slight 2nd
 BASS = [(1, 1.0), (2, 0.22)]
 
-# ── Full beat generator ───────────────────────────────────────────────────────
-def generate_lofi_beat(duration: float, bpm: float) -> np.ndarray:
-    n_samples = int(duration * SR)
-    out = np.zeros(n_samples, dtype=np.float32)
+# Velocity = base ± jitter, times the voice's level in the mix
+PAD_VEL,  PAD_JITTER,  PAD_LEVEL  = 0.38, 0.06, 0.28
+BASS_VEL, BASS_JITTER, BASS_LEVEL = 0.58, 0.07, 0.52
 
+# ── Full beat generator ───────────────────────────────────────────────────────
+def beat_sections(n_samples: int, bpm: float):
+    """
+    Yields (start, chunk) per chord (2 bars): the chord pad and bass hits
+    overlap-added into one float32 chunk beginning at sample `start`. A chunk
+    spills past its 2 bars (offsets, note tails), so neighbours overlap.
+    """
     spb   = (60.0 / bpm) * SR          # samples per beat
     sp_bar = spb * 4                    # samples per bar
 
@@ -100,19 +166,18 @@ def generate_lofi_beat(duration: float, bpm: float) -> np.ndarray:
         chord_name, semitones = CHORDS[chord_idx % len(CHORDS)]
         freqs = [hz(st) for st in semitones]
         chord_dur = 2 * sp_bar / SR    # 2 bars per chord
+        hits = []                      # (start sample, note)
 
         # ── Chord pad (soft, warm EP) ────────────────────────────────
         for freq in freqs:
             note_dur = min(chord_dur, (n_samples - bar_start) / SR)
             if note_dur <= 0: break
-            vel   = 0.38 + rng.uniform(-0.06, 0.06)
-            note  = make_note(freq, note_dur, EP, vel, cutoff=2400)
+            vel   = PAD_VEL + rng.uniform(-PAD_JITTER, PAD_JITTER)
+            # Stereo panning baked into mono via volume variation (× PAD_LEVEL)
+            note  = render_note(freq, note_dur, EP, vel * PAD_LEVEL, cutoff=2400)
             # Human timing offset ±20ms
             off   = int(rng.uniform(-0.020, 0.020) * SR)
-            start = max(0, bar_start + off)
-            end   = min(start + len(note), n_samples)
-            # Stereo panning baked into mono via volume variation
-            out[start:end] += note[:end - start] * 0.28
+            hits.append((max(0, bar_start + off), note))
 
         # ── Bass: root on beat 1 + beat 3, swing slightly ────────────
         bass_hz = freqs[0] / 2.0       # one octave lower
@@ -121,35 +186,107 @@ def generate_lofi_beat(duration: float, bpm: float) -> np.ndarray:
                 bb = int(bar_start + b_offset * spb * 4 + beat * spb)
                 if bb >= n_samples: break
                 bass_dur = min(0.48 + rng.uniform(-0.04, 0.04), (n_samples - bb) / SR)
-                vel      = 0.58 + rng.uniform(-0.07, 0.07)
-                note     = make_note(bass_hz, bass_dur, BASS, vel, cutoff=650)
+                vel      = BASS_VEL + rng.uniform(-BASS_JITTER, BASS_JITTER)
+                note     = render_note(bass_hz, bass_dur, BASS, vel * BASS_LEVEL, cutoff=650)
                 # Slight swing push on beat 3
                 swing = int(0.018 * SR) if beat == 2 else 0
                 off   = int(rng.uniform(-0.012, 0.015) * SR) + swing
-                start = max(0, bb + off)
-                end   = min(start + len(note), n_samples)
-                out[start:end] += note[:end - start] * 0.52
+                hits.append((max(0, bb + off), note))
 
         bar       += 2
         chord_idx += 1
 
-    # ── Master chain: warm lowpass → soft clip → normalize ───────────────────
+        hits = [(s, note[:n_samples - s]) for s, note in hits if s < n_samples]
+        if not hits:
+            continue
+        lo = min(s for s, _ in hits)
+        chunk = np.zeros(max(s + len(note) for s, note in hits) - lo, dtype=np.float32)
+        for s, note in hits:
+            chunk[s - lo:s - lo + len(note)] += note
+        yield lo, chunk
+
+# ── Master gain ───────────────────────────────────────────────────────────────
+MASTER_PEAK = 0.72
+MASTER_LP_OVERSHOOT = 1.05             # 2nd-order Butterworth step response overshoots ~4 %
+
+@lru_cache(maxsize=None)
+def master_gain() -> float:
+    """
+    Fixed gain that takes the soft-clipped master to at most MASTER_PEAK,
+    without scanning the beat for its peak. Bound on the pre-master mix: the
+    loudest chord's pad and bass at their top velocities, on top of the
+    previous chord's pad releasing from its sustain level.
+    """
+    def peak(freq, harmonics, cutoff):
+        held = note_template.__wrapped__(freq, 4 * TEMPLATE_QUANTUM, tuple(harmonics), cutoff)
+        return float(np.max(np.abs(held)))
+
+    pads = [sum(peak(hz(st), EP, 2400) for st in semitones) for _, semitones in CHORDS]
+    bass = max(peak(hz(semitones[0]) / 2.0, BASS, 650) for _, semitones in CHORDS)
+    pad_top = (PAD_VEL + PAD_JITTER) * PAD_LEVEL
+    bound = (max(pads) * pad_top * (1 + SUS)
+             + bass * (BASS_VEL + BASS_JITTER) * BASS_LEVEL) * MASTER_LP_OVERSHOOT
+    return MASTER_PEAK / (np.tanh(bound * 2.2) / 2.2)
+
+def generate_lofi_beat(duration: float, bpm: float) -> np.ndarray:
+    n_samples = int(duration * SR)
+    out = np.zeros(n_samples, dtype=np.float32)
+
+    for start, chunk in beat_sections(n_samples, bpm):
+        out[start:start + len(chunk)] += chunk
+
+    # ── Master chain: warm lowpass → soft clip → fixed gain ──────────────────
     out = lp(out, 9000)                  # master warm ceiling
     out = np.tanh(out * 2.2) / 2.2      # tape saturation
+    return out * np.float32(master_gain())
 
-    peak = np.max(np.abs(out))
-    if peak > 0:
-        out = out / peak * 0.72
+# ── Streaming ─────────────────────────────────────────────────────────────────
+def _mix_blocks(n_samples: int, bpm: float):
+    """
+    The pre-master mix in consecutive blocks, one per chord: a block is final
+    once the next chord's section starts (chords only ever start later).
+    """
+    pending = np.zeros(0, dtype=np.float32)   # mix from sample `pos` on, still open
+    pos = 0
+    for start, chunk in beat_sections(n_samples, bpm):
+        if start > pos:
+            block = pending[:start - pos]
+            yield np.pad(block, (0, start - pos - len(block)))
+            pending, pos = pending[start - pos:], start
+        end = start - pos + len(chunk)
+        if end > len(pending):
+            pending = np.concatenate([pending, np.zeros(end - len(pending), dtype=np.float32)])
+        pending[start - pos:end] += chunk
+    yield np.pad(pending, (0, n_samples - pos - len(pending)))
 
-    return out
+def _mastered(blocks):
+    """Master lowpass (filter state carried across blocks) → soft clip, block by block."""
+    sos = lowpass_sos(9000)
+    zi = np.zeros((len(sos), 2))
+    for block in blocks:
+        y, zi = sosfilt(sos, block, zi=zi)
+        yield np.tanh(y.astype(np.float32) * 2.2) / 2.2
+
+def stream_lofi_beat(duration: float, bpm: float):
+    """
+    generate_lofi_beat() block by block (same samples), in bounded memory:
+    float32 blocks of ~2 bars, the first one as soon as its chord is mixed.
+    """
+    gain = np.float32(master_gain())
+    for block in _mastered(_mix_blocks(int(duration * SR), bpm)):
+        if len(block):
+            yield block * gain
 
 # ── Entry point ───────────────────────────────────────────────────────────────
-def generate_lofi_instrumental(output_path: str, duration: float = 120.0, bpm: float = 75.0) -> str:
+def vary_bpm(bpm: float, seed: int = None) -> float:
+    rng = random.Random(seed) if seed is not None else random   # seed → deterministic render
+    return bpm + rng.uniform(-3, 3)   # slight BPM variation per song
+
+def generate_lofi_instrumental(output_path: str, duration: float = 120.0, bpm: float = 75.0, seed: int = None) -> str:
     print(f"🎹 Generating lofi instrumental ({duration:.0f}s @ {bpm:.0f} BPM)...")
     os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else ".", exist_ok=True)
 
-    bpm_varied = bpm + random.uniform(-3, 3)   # slight BPM variation per song
-    audio = generate_lofi_beat(duration, bpm_varied)
+    audio = generate_lofi_beat(duration, vary_bpm(bpm, seed))
 
     if HAS_SF:
         sf.write(output_path, audio, SR, subtype='PCM_16')
@@ -163,6 +300,11 @@ def generate_lofi_instrumental(output_path: str, duration: float = 120.0, bpm: f
     print(f"✅ Lofi beat saved: {output_path} ({size_kb} KB)")
     return output_path
 
+def stream_lofi_instrumental(duration: float = 120.0, bpm: float = 75.0, seed: int = None):
+    """generate_lofi_instrumental() without the file: mono float32 blocks at SR, e.g. for ffmpeg's stdin."""
+    print(f"🎹 Streaming lofi instrumental ({duration:.0f}s @ {bpm:.0f} BPM)...")
+    return stream_lofi_beat(duration, vary_bpm(bpm, seed))
+
 if __name__ == "__main__":
     import sys
     dur = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
@@ -0,0 +1,150 @@
+"""
+lofi_chain.py — The AtmosLofi filter chain, as data
+────────────────────────────────────────────────────────────────────
+Every stage of the lofi render is described once here as a list of
+ffmpeg-style filter specs: (filter_name, args, kwargs).
+Both render engines consume the same specs:
+  • ffmpeg engine  → apply_ffmpeg_chain() turns them into .filter() calls
+  • numpy engine   → services/dsp_engine.py runs them on float32 arrays
+"""
+
+SR = 44100
+
+
+def F(name: str, *args, **kwargs) -> tuple:
+    """One filter stage: F('equalizer', f=200, width_type='h', w=150, g=3)."""
+    return (name, args, kwargs)
+
+
+def apply_ffmpeg_chain(stream, chain: list):
+    for name, args, kwargs in chain:
+        stream = stream.filter(name, *args, **kwargs)
+    return stream
+
+
+# ── PASS 1: LOFI INSTRUMENTAL ────────────────────────────────────────────────
+def instrumental_chain(bass_gain: float, lp_freq: float, track_vol: float) -> list:
+    return [
+        F('aresample', SR),
+        F('vibrato', f=2.0, d=0.03),                                 # ← Refined: Lower depth to prevent glitches
+        F('equalizer', f=200,  width_type='h', w=150,  g=3),         # bass body
+        F('equalizer', f=400,  width_type='h', w=250,  g=4),         # warm mud range
+        F('equalizer', f=3500, width_type='h', w=1000, g=-2),        # cut nasal freq
+        F('lowshelf',  f=120, gain=bass_gain),                       # ← v15: Honest Bass
+        F('highshelf', f=5000, gain=-12),
+        F('lowpass', f=lp_freq),                                     # ← AI Muffle
+        F('lowpass', f=5500),                                        # ← Aggressive Cymbal Cut
+        F('equalizer', f=8000, width_type='h', w=1000, g=-20),       # Absolute Ride Supression
+        F('equalizer', f=2500, width_type='h', w=1000, g=-4),
+        F('volume', volume=min(track_vol * 0.4, 2.0)),
+    ]
+
+
+# ── AI-SUGGESTED AMBIENCE ────────────────────────────────────────────────────
+# Customizing noise based on mood for a truly "AI processed" feel
+def ambience_for_mood(mood: str) -> dict:
+    """Returns {color, seed, chain} for the mood's anoisesrc ambience."""
+    if mood in ["Sad", "Heartbreak"]:
+        # Deep, dark vinyl crackle
+        return {"color": "brown", "seed": 77, "chain": [
+            F('aresample', SR),
+            F('lowpass', f=800),
+            F('volume', volume=0.6),
+        ]}
+    if mood in ["Rainy Cafe", "Calm"]:
+        # "Rain" simulation with pink noise
+        return {"color": "pink", "seed": 11, "chain": [
+            F('aresample', SR),
+            F('highpass', f=1000),
+            F('lowpass', f=3000),
+            F('volume', volume=0.4),
+        ]}
+    # Standard lofi crackle
+    return {"color": "pink", "seed": 22, "chain": [
+        F('aresample', SR),
+        F('highpass', f=1500),
+        F('lowpass', f=4000),
+        F('volume', volume=0.5),
+    ]}
+
+
+# Make ambience "breathe" with the music (Mind-relieving effect)
+AMB_SIDECHAIN = dict(threshold=0.15, ratio=3.0, attack=20, release=300)
+
+
+def ambience_level_chain(amb_vol: float) -> list:
+    return [F('volume', volume=max(amb_vol * 1.5, 0.02))]
+
+
+def drums_chain() -> list:
+    return [
+        F('aresample', SR),
+        F('highshelf', f=6000, gain=-6),
+        F('volume', volume=0.5),
+    ]
+
+
+INST_MIX_GAIN = 1.2
+
+
+# ── PASS 2: DREAMY VOCAL OVERLAY ─────────────────────────────────────────────
+def vocal_chain(vocal_vol: float) -> list:
+    """VOCAL CHAIN (REAL SEPARATION)."""
+    return [
+        F('aresample', SR),
+        F('highpass', f=100),
+        F('equalizer', f=250,  width_type='h', w=200, g=-2),
+        F('equalizer', f=900,  width_type='h', w=400, g=4),
+        F('equalizer', f=1500, width_type='h', w=500, g=5),
+        F('equalizer', f=3000, width_type='h', w=800, g=3),
+        F('equalizer', f=5000, width_type='h', w=600, g=-1),
+        F('highshelf', f=10000, gain=-4),
+        F('pan', 'mono'),
+        F('volume', volume=max(vocal_vol * 15.0, 4.0)),
+        F('equalizer', f=2500, width_type='h', w=800, g=12),
+        F('acompressor', threshold=0.08, ratio=6.0, attack=5, release=150, makeup=5.0),
+        F('aecho', in_gain=0.7,  out_gain=0.35, delays=55,  decays=0.38),
+        F('aecho', in_gain=0.55, out_gain=0.22, delays=175, decays=0.28),
+        # ─ v12: Speech Normalization for 100% Clarity ─
+        F('speechnorm', e=10, r=0.0001, l=1),
+        F('alimiter', limit=0.92, attack=5, release=50),
+    ]
+
+
+def instrumental_wide_chain() -> list:
+    return [
+        F('extrastereo', m=1.4),
+        F('equalizer', f=600, width_type='h', w=200, g=-4),
+        F('equalizer', f=1500, width_type='h', w=500, g=-6),
+    ]
+
+
+VOX_SIDECHAIN = dict(threshold=0.08, ratio=4.5, attack=10, release=350, makeup=1.0)
+VOX_MIX_GAIN = 1.1   # ← v12: Maximized Mix
+
+
+def fallback_vocal_chain(vocal_vol: float) -> list:
+    return [
+        F('aresample', SR),
+        F('highpass', f=150),
+        F('volume', volume=max(vocal_vol * 8.0, 4.0)),
+        F('aecho', in_gain=0.8, out_gain=0.2, delays=60, decays=0.2),
+    ]
+
+
+FALLBACK_MIX_GAIN = 0.9   # ← v12: Maximized Fallback
+
+
+# ── MASTERING: Slowed + Reverb + Warm EQ ─────────────────────────────────────
+def mastering_chain(rate: float) -> list:
+    f_sr = int(SR * rate)
+    return [
+        F('asetrate', f_sr),
+        F('aresample', SR),
+        F('lowshelf',  f=100, gain=3),
+        F('equalizer', f=300, width_type='h', w=200, g=2),
+        F('highshelf', f=8000, gain=-5),
+        F('lowpass', f=12500),
+        F('acompressor', threshold=0.12, ratio=2.5, attack=5, release=50, makeup=2.0),
+        F('alimiter', limit=0.98),
+    ]
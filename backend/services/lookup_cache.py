@@ -0,0 +1,207 @@
+"""
+lookup_cache.py — TTL cache for the ai_service lookups
+────────────────────────────────────────────────────────────────────
+Lyrics, MusicBrainz tags, JioSaavn results, OpenRouter moods and the
+/api/description texts change rarely, yet every job (and every page load)
+asked the APIs again. @cached(source) in front of such a lookup:
+  • key = source + function + normalized arguments + LOOKUP_CACHE_VERSION
+  • in-memory LRU (LOOKUP_CACHE_SIZE entries) in front of an optional
+    SQLite file (ATMOS_LOOKUP_CACHE_DB, "" = memory only) that survives restarts
+  • per-source TTLs (TTLS, ATMOS_LOOKUP_TTL_<SOURCE> in seconds); a miss
+    ("" / {} / None, or whatever is_miss says) is kept NEGATIVE_TTL only —
+    the lookups swallow their errors, so a miss may be a transient failure
+  • one fetch per key at a time: concurrent callers of a missing key wait
+    for the first one's answer instead of all calling the API
+  • lookup_cache.<source>.hit / .disk_hit / .negative_hit / .miss and
+    .fetch (count, secs) in /api/metrics; saved_secs credits every hit with
+    the source's mean fetch time; stats() adds the hit rates
+ATMOS_LOOKUP_CACHE=0 turns it off.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+
+from services import metrics
+
+LOOKUP_CACHE_ENABLED = os.getenv("ATMOS_LOOKUP_CACHE", "1") == "1"
+LOOKUP_CACHE_SIZE    = int(os.getenv("ATMOS_LOOKUP_CACHE_SIZE", "2048"))
+LOOKUP_CACHE_DB      = os.getenv("ATMOS_LOOKUP_CACHE_DB", os.path.join("temp", "assets", "lookup_cache.sqlite3"))
+NEGATIVE_TTL         = float(os.getenv("ATMOS_LOOKUP_NEGATIVE_TTL", "900"))
+# Bump when a cached lookup changes what it returns — old entries then stop matching
+LOOKUP_CACHE_VERSION = "l1"
+
+DAY = 86400.0
+TTLS = {source: float(os.getenv(f"ATMOS_LOOKUP_TTL_{source.upper()}", default)) for source, default in {
+    "lyrics":      30 * DAY,
+    "metadata":     7 * DAY,
+    "jiosaavn":     7 * DAY,
+    "mood":         7 * DAY,
+    "description":  1 * DAY,
+}.items()}
+
+_memory = OrderedDict()          # key → (expires, value, negative)
+_lock = threading.Lock()
+_inflight: dict = {}             # key → lock held by the fetching thread
+_db = None
+_db_path = None
+
+
+def _normalize(arg):
+    return " ".join(arg.lower().split()) if isinstance(arg, str) else arg
+
+
+def cache_key(source: str, name: str, args: tuple) -> str:
+    return f"{LOOKUP_CACHE_VERSION}|{source}|{name}|" + json.dumps([_normalize(a) for a in args], sort_keys=True, default=str)
+
+
+def _disk():
+    """The SQLite connection for LOOKUP_CACHE_DB (None = memory only). Callers hold _lock."""
+    global _db, _db_path
+    if _db_path != LOOKUP_CACHE_DB:
+        if _db is not None:
+            _db.close()
+        _db, _db_path = None, LOOKUP_CACHE_DB
+        if LOOKUP_CACHE_DB:
+            try:
+                os.makedirs(os.path.dirname(LOOKUP_CACHE_DB) or ".", exist_ok=True)
+                _db = sqlite3.connect(LOOKUP_CACHE_DB, check_same_thread=False)
+                _db.execute("CREATE TABLE IF NOT EXISTS lookups "
+                            "(key TEXT PRIMARY KEY, value TEXT, expires REAL, negative INTEGER)")
+                _db.execute("DELETE FROM lookups WHERE expires < ?", (time.time(),))
+                _db.commit()
+            except sqlite3.Error as e:
+                print(f"Lookup cache: SQLite tier off ({e})")
+                _db = None
+    return _db
+
+
+def _get(key: str):
+    """(found, value, negative, from disk)"""
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _memory.move_to_end(key)
+                return True, entry[1], entry[2], False
+            del _memory[key]
+        db = _disk()
+        if db is not None:
+            try:
+                row = db.execute("SELECT value, expires, negative FROM lookups WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None and row[1] > now:
+                value = json.loads(row[0])
+                _remember(key, row[1], value, bool(row[2]))
+                return True, value, bool(row[2]), True
+    return False, None, False, False
+
+
+def _remember(key: str, expires: float, value, negative: bool):
+    _memory[key] = (expires, value, negative)
+    _memory.move_to_end(key)
+    while len(_memory) > LOOKUP_CACHE_SIZE:
+        _memory.popitem(last=False)
+
+
+def _put(key: str, value, negative: bool, ttl: float):
+    expires = time.time() + ttl
+    with _lock:
+        _remember(key, expires, value, negative)
+        db = _disk()
+        if db is not None:
+            try:
+                db.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?)",
+                           (key, json.dumps(value), expires, int(negative)))
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Lookup cache: could not persist {key[:60]}: {e}")
+
+
+def _is_empty(value) -> bool:
+    return not value
+
+
+def _saved(source: str) -> float:
+    """Mean fetch time of `source` so far (what a hit saves)."""
+    snap = metrics.snapshot()
+    count = snap.get(f"lookup_cache.{source}.fetch.count", 0)
+    return snap.get(f"lookup_cache.{source}.fetch.secs", 0) / count if count else 0.0
+
+
+def cached(source: str, is_miss=_is_empty):
+    """Caches fn(*args) under TTLS[source] (NEGATIVE_TTL when is_miss(answer)). JSON-serializable answers only."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            if not LOOKUP_CACHE_ENABLED:
+                return fn(*args)
+            key = cache_key(source, fn.__name__, args)
+            hit = _lookup_hit(source, key)
+            if hit is not None:
+                return hit[0]
+            with _lock:
+                flight = _inflight.setdefault(key, threading.Lock())
+            try:
+                with flight:
+                    # The thread that held the lock first has cached its answer by now
+                    hit = _lookup_hit(source, key)
+                    if hit is not None:
+                        return hit[0]
+                    metrics.incr(f"lookup_cache.{source}.miss")
+                    start = time.perf_counter()
+                    try:
+                        value = fn(*args)
+                    finally:
+                        metrics.observe(f"lookup_cache.{source}.fetch", time.perf_counter() - start)
+                    negative = is_miss(value)
+                    _put(key, value, negative, NEGATIVE_TTL if negative else TTLS[source])
+                    return value
+            finally:
+                with _lock:
+                    if _inflight.get(key) is flight:
+                        del _inflight[key]
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def _lookup_hit(source: str, key: str):
+    """(value,) counted as a hit, or None"""
+    found, value, negative, from_disk = _get(key)
+    if not found:
+        return None
+    kind = "negative_hit" if negative else "disk_hit" if from_disk else "hit"
+    metrics.incr(f"lookup_cache.{source}.{kind}")
+    metrics.incr(f"lookup_cache.{source}.saved_secs", _saved(source))
+    return (value,)
+
+
+def stats() -> dict:
+    """{"lookup_cache.<source>.hit_rate": hits / lookups, "lookup_cache.entries": n} for /api/metrics."""
+    snap = metrics.snapshot()
+    out = {}
+    for source in TTLS:
+        hits = sum(snap.get(f"lookup_cache.{source}.{k}", 0) for k in ("hit", "disk_hit", "negative_hit"))
+        total = hits + snap.get(f"lookup_cache.{source}.miss", 0)
+        if total:
+            out[f"lookup_cache.{source}.hit_rate"] = round(hits / total, 4)
+    with _lock:
+        out["lookup_cache.entries"] = len(_memory)
+    return out
+
+
+def clear(disk: bool = False):
+    """Drops the memory tier (and the SQLite rows with disk=True)."""
+    with _lock:
+        _memory.clear()
+        db = _disk()
+        if disk and db is not None:
+            db.execute("DELETE FROM lookups")
+            db.commit()
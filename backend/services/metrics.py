@@ -0,0 +1,32 @@
+"""
+metrics.py — Process-wide counters (served at /api/metrics)
+────────────────────────────────────────────────────────────────────
+  • incr(name, n)       — thread-safe counter, e.g. "decodes.analyzer"
+  • observe(name, secs) — "<name>.count" and "<name>.secs" totals
+  • snapshot()          — sorted copy of every counter
+Per-job numbers live with the job (e.g. JobAudio.counts() in TASK_META);
+these are the totals since the process started.
+"""
+
+import threading
+from collections import defaultdict
+
+_counters = defaultdict(float)
+_lock = threading.Lock()
+
+
+def incr(name: str, n: float = 1):
+    with _lock:
+        _counters[name] += n
+
+
+def observe(name: str, secs: float):
+    with _lock:
+        _counters[f"{name}.count"] += 1
+        _counters[f"{name}.secs"] += secs
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {k: round(v, 4) if isinstance(v, float) and not v.is_integer() else int(v)
+                for k, v in sorted(_counters.items())}
@@ -0,0 +1,225 @@
+"""
+pcm_cache.py — Decode-once PCM shared by every stage of a job
+────────────────────────────────────────────────────────────────────
+Without it one job decodes the same upload over and over: the DNA
+analyzer (librosa.load), the duration probes, the preview scan and cut,
+and an ffmpeg input per render layer (instrumental and vocals are the
+same file when separation falls back). Instead:
+  • JobAudio(job_id).get(path) decodes a source ONCE — ffmpeg → float32
+    stereo at CANONICAL_SR, written to temp/pcm/*.f32 and memory-mapped
+  • view(sr, mono) hands out arrays: the canonical stereo view is the
+    memmap itself (zero-copy), downmixes / resampled variants are derived
+    from it once and memoized
+  • ffmpeg_input() feeds the raw .f32 file back to ffmpeg renders (f32le,
+    seekable, no codec decode) and duration needs no ffprobe
+  • every real decode is counted — per job (counts(), shown in /status)
+    and process-wide as "decodes.<stage>" in /api/metrics; stages that
+    still decode a file themselves call note_decode()
+  • the cache is bounded: a source is decoded only while fewer than
+    PCM_CACHE_MAX_OPEN memmaps / PCM_CACHE_MAX_MB of .f32 are live across
+    all jobs — over budget get() returns None and the stages decode
+  • close() drops the memmap before unlinking (Windows cannot delete a
+    mapped file; a removal that still fails is retried on the next close),
+    and sweep_stale() clears .f32 files a previous process left behind
+ATMOS_PCM_CACHE=0 makes get() return None, i.e. every stage decodes on its own.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+
+import ffmpeg
+import numpy as np
+
+from services import metrics
+
+PCM_CACHE_ENABLED = os.getenv("ATMOS_PCM_CACHE", "1") == "1"
+PCM_DIR = os.path.join("temp", "pcm")
+CANONICAL_SR = 44100
+CANONICAL_CHANNELS = 2
+# Live decoded PCM across all jobs — the soft cap checked before each decode
+PCM_CACHE_MAX_MB   = int(os.getenv("ATMOS_PCM_CACHE_MAX_MB", "2048"))
+PCM_CACHE_MAX_OPEN = int(os.getenv("ATMOS_PCM_CACHE_MAX_OPEN", "32"))
+
+_STARTED = time.time()          # files older than this process are stale
+_live = Counter()               # "files" / "bytes" of live .f32
+_pending = set()                # raw files whose removal failed (still mapped elsewhere)
+_live_lock = threading.Lock()
+
+
+def _over_budget(extra_bytes: int = 0) -> bool:
+    with _live_lock:
+        return (_live["files"] >= PCM_CACHE_MAX_OPEN
+                or _live["bytes"] + extra_bytes > PCM_CACHE_MAX_MB * 1024 * 1024)
+
+
+def _track(raw_path: str, sign: int):
+    with _live_lock:
+        _live["files"] += sign
+        _live["bytes"] += sign * os.path.getsize(raw_path)
+
+
+def _remove(raw_path: str):
+    """Unlinks a raw file; on failure (open mapping on Windows) it is retried by the next removal."""
+    with _live_lock:
+        paths = _pending | {raw_path}
+        _pending.clear()
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            with _live_lock:
+                _pending.add(path)
+
+
+def sweep_stale():
+    """Removes temp/pcm files left by a previous process (killed jobs never reach close())."""
+    if not os.path.isdir(PCM_DIR):
+        return
+    removed = 0
+    for name in os.listdir(PCM_DIR):
+        path = os.path.join(PCM_DIR, name)
+        try:
+            if name.endswith(('.f32', '.part')) and os.path.getmtime(path) < _STARTED:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        print(f"PCM cache: removed {removed} stale file(s) from {PCM_DIR}")
+
+
+class DecodedAudio:
+    """One decoded source: a read-only (frames, 2) float32 memmap plus memoized views."""
+
+    def __init__(self, raw_path: str, frames: int):
+        self.raw_path = raw_path
+        self.frames = frames
+        self.pcm = (np.memmap(raw_path, dtype=np.float32, mode='r', shape=(frames, CANONICAL_CHANNELS))
+                    if frames else np.zeros((0, CANONICAL_CHANNELS), np.float32))
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        return self.frames / CANONICAL_SR
+
+    def view(self, sr: int = CANONICAL_SR, mono: bool = False) -> np.ndarray:
+        """(n,) mono or (n, 2) stereo float32 at `sr`. Canonical stereo is the memmap, the rest is memoized."""
+        if sr == CANONICAL_SR and not mono:
+            return self.pcm
+        key = (sr, mono)
+        with self._lock:
+            if key not in self._views:
+                x = self.pcm.mean(axis=1, dtype=np.float32) if mono else np.asarray(self.pcm)
+                if sr != CANONICAL_SR:
+                    import librosa
+                    x = librosa.resample(x, orig_sr=CANONICAL_SR, target_sr=sr, axis=0).astype(np.float32)
+                    metrics.incr("pcm.resamples")
+                self._views[key] = x
+            return self._views[key]
+
+    def ffmpeg_input(self, **kwargs):
+        """ffmpeg input node reading the decoded PCM (input-side ss / t seek exactly)."""
+        return ffmpeg.input(self.raw_path, f='f32le', ar=CANONICAL_SR, ac=CANONICAL_CHANNELS, **kwargs)
+
+    def close(self):
+        """Drops the memmap (and views derived from it) so the raw file can be unlinked."""
+        self._views.clear()
+        pcm, self.pcm = self.pcm, None
+        del pcm
+
+
+class JobAudio:
+    """Per-job registry: source path → DecodedAudio, decoded on first use, removed by close()."""
+
+    def __init__(self, job_id: str, enabled: bool = None):
+        self.job_id = job_id
+        self.enabled = PCM_CACHE_ENABLED if enabled is None else enabled
+        self.decodes = Counter()
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str):
+        """DecodedAudio for `path`, or None (cache disabled / no such file / undecodable)."""
+        if not self.enabled or not path or not os.path.exists(path):
+            return None
+        key = os.path.abspath(path)
+        with self._lock:
+            if key not in self._sources:
+                self._sources[key] = self._decode(path, len(self._sources))
+            return self._sources[key]
+
+    def adopt(self, path: str, pcm: np.ndarray):
+        """Registers `path` (a file cut from a cached source) with its (n, 2) PCM — never decoded."""
+        if not self.enabled:
+            return None
+        if _over_budget(len(pcm) * 4 * CANONICAL_CHANNELS):
+            metrics.incr("pcm.over_budget")
+            return None
+        with self._lock:
+            os.makedirs(PCM_DIR, exist_ok=True)
+            raw_path = os.path.join(PCM_DIR, f"{self.job_id}_{len(self._sources)}.f32")
+            np.ascontiguousarray(pcm, dtype=np.float32).tofile(raw_path + '.part')
+            os.replace(raw_path + '.part', raw_path)
+            _track(raw_path, +1)
+            audio = self._sources[os.path.abspath(path)] = DecodedAudio(raw_path, len(pcm))
+            return audio
+
+    def _decode(self, path: str, n: int):
+        if _over_budget():
+            print(f"PCM cache: over budget ({PCM_CACHE_MAX_OPEN} files / {PCM_CACHE_MAX_MB} MB), "
+                  f"stages decode {os.path.basename(path)} themselves")
+            metrics.incr("pcm.over_budget")
+            return None
+        os.makedirs(PCM_DIR, exist_ok=True)
+        raw_path = os.path.join(PCM_DIR, f"{self.job_id}_{n}.f32")
+        start = time.perf_counter()
+        try:
+            (ffmpeg.input(path)
+                   .output(raw_path + '.part', format='f32le', acodec='pcm_f32le',
+                           ac=CANONICAL_CHANNELS, ar=CANONICAL_SR)
+                   .run(overwrite_output=True, capture_stdout=True, capture_stderr=True))
+            os.replace(raw_path + '.part', raw_path)
+        except Exception as e:
+            print(f"PCM cache: could not decode {os.path.basename(path)}, stages decode it themselves: {e}")
+            _remove(raw_path + '.part')
+            return None
+        _track(raw_path, +1)
+        self.note_decode("pcm_cache")
+        metrics.observe("pcm.decode", time.perf_counter() - start)
+        frames = os.path.getsize(raw_path) // (4 * CANONICAL_CHANNELS)
+        return DecodedAudio(raw_path, frames)
+
+    def note_decode(self, stage: str):
+        self.decodes[stage] += 1
+        metrics.incr(f"decodes.{stage}")
+
+    def counts(self) -> dict:
+        return {"total": sum(self.decodes.values()), **self.decodes}
+
+    def close(self):
+        with self._lock:
+            sources, self._sources = self._sources, {}
+        for audio in sources.values():
+            if audio is None:
+                continue
+            audio.close()
+            _track(audio.raw_path, -1)
+            _remove(audio.raw_path)
+
+
+def source(pcm: JobAudio, path: str):
+    """pcm.get(path) that tolerates pcm=None (callers outside a job)."""
+    return pcm.get(path) if pcm else None
+
+
+def note_decode(pcm: JobAudio, stage: str):
+    """Counts a stage decoding a file itself (no cache hit)."""
+    if pcm:
+        pcm.note_decode(stage)
+    else:
+        metrics.incr(f"decodes.{stage}")
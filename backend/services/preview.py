@@ -0,0 +1,92 @@
+"""
+preview.py — Short preview excerpts
+────────────────────────────────────────────────────────────────────
+A preview runs the normal process_audio chain on a PREVIEW_SECONDS
+excerpt instead of the whole song:
+  • window = around the Hook/Chorus from analyze_song_structure when we have it
+  • otherwise the loudest PREVIEW_SECONDS of the track (RMS over a cheap 8 kHz mono decode)
+  • the excerpt is cut once to WAV (sample-exact, no MP3 priming at the edges)
+  • with the job's PCM cache (services/pcm_cache.py) the scan and the cut read
+    the decoded PCM — the upload is not decoded again
+"""
+
+import numpy as np
+import ffmpeg
+import soundfile as sf
+from typing import Optional
+
+from services.video_renderer import media_duration
+from services.pcm_cache import source, note_decode, CANONICAL_SR
+
+PREVIEW_SECONDS = 30
+HOOK_LABELS     = ("hook", "chorus")
+ENERGY_SR       = 8000
+ENERGY_HOP      = 0.5    # seconds per RMS frame
+
+
+def hook_window(structure_data: list, duration: float, seconds: float = PREVIEW_SECONDS) -> Optional[float]:
+    """Start of a window centred on the first Hook/Chorus section, or None."""
+    sections = [s for s in (structure_data or []) if isinstance(s, dict) and 'start' in s]
+    hooks = [s for s in sections if any(h in str(s.get('label', '')).lower() for h in HOOK_LABELS)]
+    section = (hooks or sections or [None])[0]
+    if section is None:
+        return None
+    try:
+        start = float(section['start'])
+        end = float(section.get('end', start + seconds))
+    except (TypeError, ValueError):
+        return None
+    if start >= duration:
+        return None
+    centre = (start + min(end, duration)) / 2
+    return max(0.0, min(centre - seconds / 2, duration - seconds))
+
+
+def loudest_window(path: str, seconds: float = PREVIEW_SECONDS, audio=None) -> float:
+    """Start of the PREVIEW_SECONDS window with the most energy."""
+    if audio:
+        # Energy straight off the decoded PCM — no resample needed for a sum of squares
+        y, sr = audio.view(), CANONICAL_SR
+    else:
+        out, _ = (ffmpeg.input(path)
+                  .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=ENERGY_SR)
+                  .run(capture_stdout=True, capture_stderr=True))
+        y, sr = np.frombuffer(out, np.float32), ENERGY_SR
+    hop = int(ENERGY_HOP * sr)
+    frames = len(y) // hop
+    win = int(round(seconds / ENERGY_HOP))
+    if frames <= win:
+        return 0.0
+    frame = y[:frames * hop].reshape(frames, -1)
+    energy = np.einsum('ij,ij->i', frame, frame, dtype=np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(energy)))
+    return float(np.argmax(csum[win:] - csum[:-win]) * ENERGY_HOP)
+
+
+def pick_preview_window(path: str, structure_data: list = None, seconds: float = PREVIEW_SECONDS,
+                        pcm=None) -> tuple:
+    """(start_seconds, reason) — reason is 'hook', 'loudest' or 'full' (song shorter than a preview)."""
+    audio = source(pcm, path)
+    duration = audio.duration if audio else media_duration(path)
+    if duration <= seconds:
+        return 0.0, "full"
+    start = hook_window(structure_data, duration, seconds)
+    if start is not None:
+        return start, "hook"
+    if not audio:
+        note_decode(pcm, "preview_scan")
+    return loudest_window(path, seconds, audio), "loudest"
+
+
+def cut_excerpt(path: str, start: float, output_wav: str, seconds: float = PREVIEW_SECONDS, pcm=None) -> str:
+    audio = source(pcm, path)
+    if audio:
+        # Slice of the decoded PCM: written out for ffmpeg and registered, so the excerpt is never decoded
+        a = int(start * CANONICAL_SR)
+        excerpt = audio.view()[a:a + int(seconds * CANONICAL_SR)]
+        sf.write(output_wav, excerpt, CANONICAL_SR, subtype='PCM_16')
+        pcm.adopt(output_wav, excerpt)
+        return output_wav
+    note_decode(pcm, "preview_cut")
+    ffmpeg.input(path, ss=start, t=seconds).output(output_wav, acodec='pcm_s16le').run(overwrite_output=True, quiet=True)
+    return output_wav
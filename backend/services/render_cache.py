@@ -0,0 +1,114 @@
+"""
+render_cache.py — Content-addressed render cache with request coalescing
+────────────────────────────────────────────────────────────────────
+A finished master depends only on the uploaded audio and the effective
+render params (plus the seed in copyright-free mode), so:
+  • key = sha256(input bytes) + params + RENDER_CACHE_VERSION
+  • completed key  → the existing task's master in temp/processed is served as-is
+  • in-flight key  → the new request attaches to the running task (no second render)
+  • the key → task index is persisted next to the masters (survives restarts)
+  • LRU eviction once the cached tasks' files exceed ATMOS_RENDER_CACHE_MB
+Requests that are not deterministic (copyright-free without a seed) bypass the cache.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+RENDER_CACHE_ENABLED = os.getenv("ATMOS_RENDER_CACHE", "1") == "1"
+RENDER_CACHE_MB      = int(os.getenv("ATMOS_RENDER_CACHE_MB", "2048"))
+
+# Bump when the chain changes audibly — old entries then stop matching
+RENDER_CACHE_VERSION = "r1"
+INDEX_NAME = "render_cache.json"
+
+HIT, COALESCED, NEW = "hit", "coalesced", "new"
+
+
+def input_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def render_key(digest: str, params: dict) -> str:
+    spec = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{RENDER_CACHE_VERSION}|{digest}|{spec}".encode()).hexdigest()[:32]
+
+
+class RenderCache:
+    def __init__(self, processed_dir: str, max_bytes: int):
+        self.processed_dir = str(processed_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}                     # key → task_id
+        self._index_path = os.path.join(self.processed_dir, INDEX_NAME)
+        self._done = self._load()               # key → {task_id, meta, used}
+
+    def _load(self) -> dict:
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save(self):
+        tmp = self._index_path + ".part"
+        with open(tmp, "w") as f:
+            json.dump(self._done, f)
+        os.replace(tmp, self._index_path)
+
+    def _task_files(self, task_id: str) -> list:
+        prefix = task_id + "."
+        return [os.path.join(self.processed_dir, n) for n in os.listdir(self.processed_dir) if n.startswith(prefix)]
+
+    def claim(self, key: str, task_id: str) -> tuple:
+        """
+        (task_id, state): HIT → completed task to serve, COALESCED → running task
+        to attach to, NEW → `task_id` now owns the key and must complete() or abandon() it.
+        """
+        with self._lock:
+            entry = self._done.get(key)
+            if entry and os.path.exists(os.path.join(self.processed_dir, f"{entry['task_id']}.mp3")):
+                entry["used"] = time.time()
+                self._save()
+                return entry["task_id"], HIT
+            if key in self._inflight:
+                return self._inflight[key], COALESCED
+            self._inflight[key] = task_id
+            return task_id, NEW
+
+    def meta(self, key: str) -> dict:
+        with self._lock:
+            return dict(self._done.get(key, {}).get("meta", {}))
+
+    def complete(self, key: str, task_id: str, meta: dict = None):
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._done[key] = {"task_id": task_id, "meta": meta or {}, "used": time.time()}
+            self._evict(keep=key)
+            self._save()
+
+    def abandon(self, key: str):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _evict(self, keep: str):
+        sizes = {k: sum(os.path.getsize(p) for p in self._task_files(e["task_id"]))
+                 for k, e in self._done.items()}
+        total = sum(sizes.values())
+        for k in sorted(self._done, key=lambda k: self._done[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            if k == keep:
+                continue
+            for p in self._task_files(self._done[k]["task_id"]):
+                try: os.remove(p)
+                except: pass
+            total -= sizes[k]
+            print(f"Render cache: evicted {self._done[k]['task_id']} ({sizes[k] / 1e6:.1f} MB)")
+            del self._done[k]
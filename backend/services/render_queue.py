@@ -0,0 +1,56 @@
+"""
+render_queue.py — Priority render slots
+────────────────────────────────────────────────────────────────────
+Jobs spend most of their wall time waiting on network APIs (stem
+separation, lyrics, mood), which can overlap freely. Only the CPU-heavy
+part — DNA analysis + process_audio — takes a render slot:
+  • ATMOS_RENDER_SLOTS slots (default: one per core)
+  • waiting jobs are served by priority, then arrival order
+  • previews (PRIORITY_PREVIEW) jump ahead of queued full renders
+A running render is never interrupted.
+"""
+
+import os
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+PRIORITY_PREVIEW = 0
+PRIORITY_FULL    = 1
+
+RENDER_SLOTS = int(os.getenv("ATMOS_RENDER_SLOTS", "0")) or (os.cpu_count() or 1)
+
+
+class RenderSlots:
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self._free = self.slots
+        self._waiting = []                 # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_FULL):
+        """Blocks until this job is the highest-priority waiter and a slot is free."""
+        with self._cv:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while self._free == 0 or self._waiting[0] != ticket:
+                self._cv.wait()
+            heapq.heappop(self._waiting)
+            self._free -= 1
+            self._cv.notify_all()          # the next waiter may fit in another free slot
+        try:
+            yield
+        finally:
+            with self._cv:
+                self._free += 1
+                self._cv.notify_all()
+
+    def waiting(self) -> int:
+        with self._cv:
+            return len(self._waiting)
+
+
+render_slots = RenderSlots(RENDER_SLOTS)
@@ -0,0 +1,162 @@
+"""
+segment_render.py — Segment-parallel rendering for long tracks
+────────────────────────────────────────────────────────────────────
+One ffmpeg graph runs on one core. For long tracks we instead:
+  • cut the song into segments (one per worker) on a sample-exact grid
+  • render each segment with PREROLL_SECONDS of extra input in front, so the
+    compressor / limiter / echo state is warmed up before the kept part
+  • run the segment graphs as parallel ffmpeg processes
+  • stitch the outputs in order with a short linear crossfade and stream
+    them straight into ONE encoder (MP3 + WAV)
+Segment starts sit on whole resampler-phase and vibrato-LFO cycles, and
+the looped ambience/drums are trimmed to the segment offset, so every
+segment lines up sample for sample with its neighbours.
+"""
+
+import math
+import os
+import numpy as np
+import ffmpeg
+from concurrent.futures import ThreadPoolExecutor
+
+from services.lofi_chain import SR
+from services.live_stream import MP3_MASTER_ARGS
+from services import cpu_budget
+
+SEGMENT_MIN_SECONDS = 30     # shorter segments spend more time in pre-roll than they save
+PREROLL_SECONDS     = 3      # minimum discarded warm-up in front of every segment but the first (rounded up to the grid)
+XFADE_SECONDS       = 0.25   # seam crossfade (output time)
+AUTO_MIN_DURATION   = 120    # auto mode: only segment tracks at least this long
+
+
+def default_workers() -> int:
+    """The job's thread allotment — one single-threaded ffmpeg per worker."""
+    return cpu_budget.job_threads()
+
+
+def _lfo_hz(graph) -> list:
+    return [float(kw.get('f', 5.0)) for chain in graph.chains.values()
+            for name, _, kw in chain if name == 'vibrato']
+
+
+class SegmentTimeline:
+    """
+    Sample-exact mapping from song samples (before the slowdown) to output samples.
+    Segment starts must sit on `grid`: a whole number of resampler phase cycles
+    (asetrate → aresample) and of vibrato LFO periods, otherwise a segment comes
+    out a fraction of a sample off — or out of phase — against its neighbour.
+    """
+
+    def __init__(self, rate: float, lfo_hz: list = ()):
+        self.f_sr = int(SR * rate)   # same asetrate value as mastering_chain()
+        grid = self.f_sr // math.gcd(self.f_sr, SR)
+        for hz in lfo_hz:
+            grid = math.lcm(grid, int(SR / hz))
+        self.grid = grid
+
+    def out_pos(self, n: int) -> int:
+        return n * SR // self.f_sr
+
+    def snap(self, n: int) -> int:
+        return (n // self.grid) * self.grid
+
+
+def plan_segments(total: int, workers: int, timeline: SegmentTimeline, segment_seconds: float = None) -> list:
+    """[(start, end), ...] in song samples, starts on the grid; the last end is None (= EOF)."""
+    if segment_seconds is None:
+        segment_seconds = max(SEGMENT_MIN_SECONDS, total / SR / max(workers, 1))
+    step = max(timeline.grid, timeline.snap(int(math.ceil(segment_seconds * SR)) + timeline.grid - 1))
+    starts = list(range(0, max(total, 1), step))
+    # Fold a short tail into the previous segment
+    if len(starts) > 1 and total - starts[-1] < step / 2:
+        starts.pop()
+    return [(a, starts[i + 1] if i + 1 < len(starts) else None) for i, a in enumerate(starts)]
+
+
+def _segment_inputs(input_instrumental: str, input_vocals: str, has_v: bool, is_fallback: bool,
+                    render_from: float, render_to: float, inst_audio=None, vox_audio=None):
+    """Inputs cut to the segment — from the job's decoded PCM (services/pcm_cache.py) when it has them."""
+    opts = {'ss': render_from} if render_from else {}
+    if render_to is not None:
+        opts['t'] = render_to - render_from
+    inst_src = inst_audio.ffmpeg_input(**opts) if inst_audio else ffmpeg.input(input_instrumental, **opts)
+    vox_src = None
+    if has_v and is_fallback:
+        shared = inst_src.filter_multi_output('asplit')
+        inst_src, vox_src = shared.stream(0), shared.stream(1)
+    elif has_v:
+        vox_src = vox_audio.ffmpeg_input(**opts) if vox_audio else ffmpeg.input(input_vocals, **opts)
+    return inst_src, vox_src
+
+
+def render_segment(job: dict, render_from: float, render_to: float) -> np.ndarray:
+    """Renders song time [render_from, render_to) through the full graph → (2, n) float32."""
+    from services.audio_processor import build_instrumental_mix, build_master
+
+    inst_src, vox_src = _segment_inputs(job['input_instrumental'], job['input_vocals'],
+                                        job['has_v'], job['is_fallback'], render_from, render_to,
+                                        job.get('inst_audio'), job.get('vox_audio'))
+    inst_mix = build_instrumental_mix(inst_src, job['graph'], job['mood'], job['amb_bed'],
+                                      job['drum_path'], offset=render_from)
+    master = build_master(inst_mix, vox_src, job['graph'], job['has_v'], job['is_fallback'])
+    out, _ = job['graph'].run(master.output('pipe:', format='f32le', acodec='pcm_f32le', ac=2, ar=SR),
+                              threads=1, capture_stdout=True, capture_stderr=True)
+    return np.frombuffer(out, np.float32).reshape(-1, 2).T
+
+
+def _open_encoder(output_mp3: str, output_wav: str = None):
+    src = ffmpeg.input('pipe:', format='f32le', ar=SR, ac=2)
+    outs = [ffmpeg.output(src, output_mp3, **MP3_MASTER_ARGS, **cpu_budget.codec_threads())]
+    if output_wav:
+        outs.append(ffmpeg.output(src, output_wav, acodec='pcm_s16le', **cpu_budget.codec_threads()))
+    return (ffmpeg.merge_outputs(*outs).global_args('-loglevel', 'error')
+                  .run_async(pipe_stdin=True, overwrite_output=True))
+
+
+def render_segmented(job: dict, duration: float, output_mp3: str, output_wav: str = None,
+                     workers: int = None, segment_seconds: float = None) -> list:
+    """
+    Renders the job in parallel segments and encodes the stitched master.
+    job = {input_instrumental, input_vocals, has_v, is_fallback, graph, mood, amb_bed, drum_path, rate,
+           inst_audio, vox_audio}   (the *_audio entries are optional DecodedAudio)
+    Returns the output sample positions of the seams.
+    """
+    workers = workers or default_workers()
+    timeline = SegmentTimeline(job['rate'], _lfo_hz(job['graph']))
+    segments = plan_segments(int(duration * SR), workers, timeline, segment_seconds)
+    preroll = timeline.snap(PREROLL_SECONDS * SR + timeline.grid - 1)
+    xf = int(XFADE_SECONDS * SR)
+    fade_in = np.linspace(0.0, 1.0, xf, dtype=np.float32)
+    print(f"Segmented render: {len(segments)} segments × {workers} workers "
+          f"(pre-roll {preroll / SR:.2f}s, crossfade {XFADE_SECONDS * 1000:.0f}ms)")
+
+    def work(seg):
+        a, b = seg
+        render_from = max(0, a - preroll)
+        # Render a little past the end: the crossfade lives in the output timeline
+        render_to = None if b is None else (b + 2 * xf) / SR
+        return render_from, render_segment(job, render_from / SR, render_to)
+
+    encoder = _open_encoder(output_mp3, output_wav)
+    seams, tail = [], None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() yields in segment order, so stitching streams while later segments render
+            for (a, b), (render_from, pcm) in zip(segments, pool.map(work, segments)):
+                base = timeline.out_pos(render_from)
+                lo = timeline.out_pos(a) - base
+                hi = pcm.shape[1] if b is None else timeline.out_pos(b) - base + xf
+                body = pcm[:, lo:hi].copy()
+                if tail is not None:
+                    n = min(xf, body.shape[1], tail.shape[1])
+                    body[:, :n] = tail[:, :n] * (1.0 - fade_in[:n]) + body[:, :n] * fade_in[:n]
+                    seams.append(timeline.out_pos(a))
+                if b is not None:
+                    body, tail = body[:, :-xf], body[:, -xf:]
+                encoder.stdin.write(np.ascontiguousarray(np.clip(body, -1.0, 1.0).T).tobytes())
+    finally:
+        encoder.stdin.close()
+        err = encoder.stderr.read() if encoder.stderr else b""
+        if encoder.wait() != 0:
+            raise RuntimeError(f"segment encoder failed: {err.decode(errors='ignore')}")
+    return seams
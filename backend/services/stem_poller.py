@@ -0,0 +1,187 @@
+"""
+stem_poller.py — One poller thread for every running StemSplit job
+────────────────────────────────────────────────────────────────────
+separate_stems_stemsplit used to hold its worker thread for up to 3 minutes
+in a sleep(5) / GET loop, so a few concurrent separations starved the
+server's threadpool. Instead:
+  • submit(job_id, dest_base) hands a created job to the poller and returns
+    a concurrent.futures.Future; nobody waits in a thread (await it with
+    asyncio.wrap_future)
+  • a single daemon thread polls whichever job is due next (a heap ordered
+    by next poll time), one status GET at a time on the pooled session
+  • adaptive backoff: the first poll after POLL_FIRST, then the interval
+    grows by POLL_FACTOR up to POLL_MAX — or, when the job reports
+    `progress`, follows the estimated time left; 429 / 5xx / network errors
+    double it (Retry-After honoured); ±10 % jitter keeps jobs apart
+  • a COMPLETED job's stems are downloaded in parallel (STEM_DOWNLOAD_WORKERS)
+    and its future resolves to {stem: path} — {} when it failed, timed out
+    (STEMSPLIT_TIMEOUT) or came back without vocals
+stemsplit.poll / .completed / .failed / .timeout and the job and download
+times are counted in /api/metrics.
+Env: ATMOS_STEMSPLIT_POLL_FIRST, ATMOS_STEMSPLIT_POLL_MAX, ATMOS_STEMSPLIT_TIMEOUT,
+ATMOS_STEM_DOWNLOAD_WORKERS.
+"""
+
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from services import metrics
+
+POLL_FIRST            = float(os.getenv("ATMOS_STEMSPLIT_POLL_FIRST", "3"))
+POLL_MAX              = float(os.getenv("ATMOS_STEMSPLIT_POLL_MAX", "20"))
+POLL_FACTOR           = 1.5
+STEMSPLIT_TIMEOUT     = float(os.getenv("ATMOS_STEMSPLIT_TIMEOUT", "180"))
+STEM_DOWNLOAD_WORKERS = int(os.getenv("ATMOS_STEM_DOWNLOAD_WORKERS", "4"))
+MIN_STEM_BYTES        = 50000      # anything smaller is an error page, not audio
+FAILED_STATES         = ("FAILED", "ERROR")
+
+
+class StemJob:
+    def __init__(self, job_id: str, dest_base: str, timeout: float):
+        self.job_id, self.dest_base = job_id, dest_base
+        self.future = Future()
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.interval = None
+        self.progress = None          # (time, percent) of the last progress report
+        self.polls = 0
+
+
+class StemSplitPoller:
+    """
+    status_fn(job_id) → requests.Response of GET /jobs/{job_id};
+    download_fn(url, dest) → dest or None.
+    """
+
+    def __init__(self, status_fn, download_fn, poll_first: float = POLL_FIRST, poll_max: float = POLL_MAX,
+                 factor: float = POLL_FACTOR, timeout: float = STEMSPLIT_TIMEOUT,
+                 download_workers: int = STEM_DOWNLOAD_WORKERS):
+        self.status_fn, self.download_fn = status_fn, download_fn
+        self.poll_first, self.poll_max, self.factor, self.timeout = poll_first, poll_max, factor, timeout
+        self._heap = []                               # (next poll, seq, StemJob)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="stem-download")
+
+    def submit(self, job_id: str, dest_base: str) -> Future:
+        """Watches StemSplit job `job_id`; its stems are saved as {dest_base}_{stem}.mp3."""
+        job = StemJob(job_id, dest_base, self.timeout)
+        with self._cond:
+            self._schedule(job, self.poll_first)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stemsplit-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job.future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _schedule(self, job: StemJob, interval: float):
+        """Caller holds _cond."""
+        job.interval = interval
+        delay = min(interval * random.uniform(0.9, 1.1), max(0.0, job.deadline - time.monotonic()))
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(timeout=self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, job = heapq.heappop(self._heap)
+            if job.future.cancelled():
+                continue
+            try:
+                interval = self._poll(job)
+            except Exception as e:
+                print(f"StemSplit poller error [{job.job_id}]: {e}")
+                interval = None
+                self._finish(job, {}, "failed")
+            if interval is not None and time.monotonic() >= job.deadline:
+                print(f"StemSplit job {job.job_id} timed out after {job.polls} polls")
+                self._finish(job, {}, "timeout")
+            elif interval is not None:
+                with self._cond:
+                    self._schedule(job, interval)
+
+    def _poll(self, job: StemJob):
+        """Next interval, or None when the job is done with."""
+        job.polls += 1
+        metrics.incr("stemsplit.poll")
+        try:
+            r = self.status_fn(job.job_id)
+        except Exception as e:
+            print(f"  StemSplit status [{job.job_id}]: {e}")
+            return min(self.poll_max, job.interval * 2)
+        if r.status_code != 200:
+            retry_after = r.headers.get("Retry-After", "")
+            backoff = min(self.poll_max, job.interval * 2)
+            return max(backoff, float(retry_after)) if retry_after.isdigit() else backoff
+
+        result = r.json()
+        status = result.get("status", "")
+        print(f"  StemSplit status [{job.job_id} #{job.polls}]: {status}")
+        if status == "COMPLETED":
+            self._download(job, result.get("stems", {}))
+            return None
+        if status in FAILED_STATES:
+            print("StemSplit job failed")
+            self._finish(job, {}, "failed")
+            return None
+        return self._next_interval(job, result.get("progress"))
+
+    def _next_interval(self, job: StemJob, progress) -> float:
+        grown = min(self.poll_max, job.interval * self.factor)
+        if not isinstance(progress, (int, float)):
+            return grown
+        now, last = time.monotonic(), job.progress
+        job.progress = (now, float(progress))
+        if last is None or progress <= last[1]:
+            return grown
+        # Time left at the rate since the last report
+        eta = (100.0 - progress) * (now - last[0]) / (progress - last[1])
+        return min(self.poll_max, max(self.poll_first, eta))
+
+    def _download(self, job: StemJob, urls: dict):
+        urls = {name: url for name, url in urls.items() if isinstance(url, str) and url.startswith("http")}
+        if not urls:
+            self._finish(job, {}, "failed")
+            return
+        start = time.monotonic()
+        futures = {name: self._downloads.submit(self.download_fn, url, f"{job.dest_base}_{name}.mp3")
+                   for name, url in urls.items()}
+        left = [len(futures)]
+        lock = threading.Lock()
+
+        def one_done(_):
+            with lock:
+                left[0] -= 1
+                if left[0]:
+                    return
+            metrics.observe("stemsplit.download", time.monotonic() - start)
+            stems = {}
+            for name, fut in futures.items():
+                local = None if fut.exception() else fut.result()
+                if local and os.path.getsize(local) > MIN_STEM_BYTES:
+                    stems[name] = local
+            if stems.get("vocals"):
+                print(f"✅ StemSplit: Vocals separated successfully!")
+                self._finish(job, stems, "completed")
+            else:
+                self._finish(job, {}, "failed")
+
+        for fut in futures.values():
+            fut.add_done_callback(one_done)
+
+    def _finish(self, job: StemJob, stems: dict, outcome: str):
+        metrics.incr(f"stemsplit.{outcome}")
+        metrics.observe("stemsplit.job", time.monotonic() - job.started)
+        if job.future.set_running_or_notify_cancel():
+            job.future.set_result(stems)
@@ -0,0 +1,172 @@
+"""
+video_renderer.py — Cinematic VHS video for the MP4 export
+────────────────────────────────────────────────────────────────────
+The VHS look (scale → noise → vintage curves → hue) only depends on the
+mood background, never on the song. So instead of re-filtering and
+x264-encoding the still image for the full song length on every job we:
+  • encode a short VHS loop ONCE per background/mood variant
+  • cache it in temp/assets/vhs_cache (key = asset content + filter chain)
+  • per job: stream_loop the cached clip + mux the audio, video is copied
+"""
+
+import os
+import re
+import hashlib
+import threading
+import ffmpeg
+
+from services.cpu_budget import codec_threads
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), '..', 'assets')
+VHS_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'temp', 'assets', 'vhs_cache')
+
+BG_MAP = {
+    "Sad": "sad.png",
+    "Heartbreak": "sad.png",
+    "Calm": "calm.png",
+    "Romantic": "calm.png",
+    "Happy": "calm.png",
+    "Cyberpunk": "cyberpunk.png",
+    "Neutral": "lofi_bg.jpg"
+}
+
+LOOP_SECONDS = 10     # length of the pre-encoded loop (noise is random per frame → seamless)
+LOOP_FPS     = 1      # same 1 fps still-image cadence as the original export
+
+# Bump when the filter chain below changes — part of the cache key
+VHS_CHAIN_VERSION = "vhs-v1:scale1280x720|noise35t+p|curves-vintage|even|hue20s1.2"
+
+_loop_locks: dict = {}
+_loop_locks_guard = threading.Lock()
+
+
+def resolve_background(mood: str) -> tuple:
+    """Returns (bg_file, absolute_path) for a mood, falling back to lofi_bg.jpg."""
+    bg_file = BG_MAP.get(mood, "lofi_bg.jpg")
+    bg = os.path.join(ASSETS_DIR, bg_file)
+    if not os.path.exists(bg):
+        bg_file = "lofi_bg.jpg"
+        bg = os.path.join(ASSETS_DIR, bg_file)
+    return bg_file, os.path.abspath(bg)
+
+
+def apply_vhs_filters(v_stream, mood: str):
+    """Application of VHS Overlay Filters."""
+    v_stream = (v_stream
+                .filter('scale', 1280, 720)
+                .filter('noise', alls=35, allf='t+p') # VHS Noise
+                .filter('curves', preset='vintage')   # Retro Film Look
+                .filter('scale', 'trunc(iw/2)*2', 'trunc(ih/2)*2')) # Ensure even dimensions
+
+    # Subtle Glitch for Cyberpunk
+    if mood == 'Cyberpunk':
+        v_stream = v_stream.filter('hue', h=20, s=1.2) # Saturate Cyberpunk colors
+    return v_stream
+
+
+def _loop_cache_key(bg_path: str, mood: str) -> str:
+    h = hashlib.sha1()
+    with open(bg_path, 'rb') as f:
+        h.update(f.read())
+    h.update(VHS_CHAIN_VERSION.encode())
+    h.update(f"{LOOP_SECONDS}s@{LOOP_FPS}fps".encode())
+    h.update(b"cyberpunk" if mood == 'Cyberpunk' else b"standard")
+    return h.hexdigest()[:16]
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _loop_locks_guard:
+        return _loop_locks.setdefault(key, threading.Lock())
+
+
+def get_vhs_loop(mood: str) -> str:
+    """
+    Returns the path of the cached VHS loop for this mood, encoding it on first use.
+    Old loops for the same background variant are removed when the asset changes.
+    """
+    bg_file, bg_abs = resolve_background(mood)
+    variant = os.path.splitext(bg_file)[0] + ("_cyberpunk" if mood == 'Cyberpunk' else "")
+    key = _loop_cache_key(bg_abs, mood)
+    loop_path = os.path.abspath(os.path.join(VHS_CACHE_DIR, f"{variant}_{key}.mp4"))
+
+    if os.path.exists(loop_path):
+        return loop_path
+
+    with _lock_for(loop_path):
+        if os.path.exists(loop_path):
+            return loop_path
+
+        os.makedirs(VHS_CACHE_DIR, exist_ok=True)
+        print(f"Video: Encoding VHS loop for '{variant}' ({LOOP_SECONDS}s, cached)")
+
+        v_stream = apply_vhs_filters(ffmpeg.input(bg_abs, loop=1, framerate=LOOP_FPS, t=LOOP_SECONDS), mood)
+        tmp_path = loop_path + ".part.mp4"
+        ffmpeg.output(v_stream, tmp_path,
+                      vcodec='libx264', tune='stillimage', pix_fmt='yuv420p',
+                      r=LOOP_FPS, g=LOOP_FPS, movflags='+faststart', **codec_threads()
+                      ).run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        os.replace(tmp_path, loop_path)
+
+        # Invalidate stale loops of the same variant (asset or chain changed)
+        stale = re.compile(re.escape(variant) + r"_[0-9a-f]{16}\.mp4$")
+        for name in os.listdir(VHS_CACHE_DIR):
+            old = os.path.abspath(os.path.join(VHS_CACHE_DIR, name))
+            if stale.match(name) and old != loop_path:
+                try: os.remove(old)
+                except: pass
+
+    return loop_path
+
+
+def media_duration(path: str) -> float:
+    """Duration in seconds via ffprobe, falling back to soundfile. 0.0 if unknown."""
+    try:
+        return float(ffmpeg.probe(path)['format']['duration'])
+    except Exception:
+        pass
+    try:
+        import soundfile as sf
+        return float(sf.info(path).duration)
+    except Exception:
+        return 0.0
+
+
+def render_mood_video(audio_path: str, output_mp4: str, mood: str = "Neutral") -> bool:
+    """
+    Builds the MP4 export: cached VHS loop (stream-copied) + song audio.
+    Falls back to a full per-job encode if the cached path fails.
+    """
+    bg_file, bg_abs = resolve_background(mood)
+    print(f"Video: Creating Cinematic Video with bg: {bg_file} (Mood: {mood})")
+
+    # Ensure absolute, normalized paths for Windows FFmpeg
+    audio_abs = os.path.abspath(audio_path)
+    output_mp4_abs = os.path.abspath(output_mp4)
+
+    try:
+        loop_path = get_vhs_loop(mood)
+        v_loop = ffmpeg.input(loop_path, stream_loop=-1)
+        a_stream = ffmpeg.input(audio_abs)
+        # -shortest alone does not stop a stream-copied infinite loop, so bound it explicitly
+        duration = media_duration(audio_abs)
+        limit = {'t': f"{duration:.3f}"} if duration > 0 else {}
+        ffmpeg.output(v_loop.video, a_stream.audio, output_mp4_abs,
+                      vcodec='copy', acodec='aac', movflags='+faststart',
+                      shortest=None, **limit, **codec_threads()).run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        return True
+    except ffmpeg.Error as fe:
+        print(f"ERROR: Cached VHS loop failed, re-encoding: {fe.stderr.decode() if fe.stderr else 'No stderr'}")
+
+    a_stream = ffmpeg.input(audio_abs)
+    try:
+        v_stream = apply_vhs_filters(ffmpeg.input(bg_abs, loop=1, framerate=1), mood)
+        ffmpeg.output(v_stream, a_stream, output_mp4_abs,
+                      vcodec='libx264', tune='stillimage',
+                      pix_fmt='yuv420p', acodec='aac',
+                      shortest=None, **codec_threads()).run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error as fe:
+        print(f"ERROR: FFmpeg Video Error: {fe.stderr.decode() if fe.stderr else 'No stderr'}")
+        # Fallback to simple image if complex filters fail
+        v_simple = ffmpeg.input(bg_abs, loop=1, framerate=1).filter('scale', 'trunc(iw/2)*2', 'trunc(ih/2)*2')
+        ffmpeg.output(v_simple, a_stream, output_mp4_abs, vcodec='libx264', tune='stillimage', pix_fmt='yuv420p', acodec='aac', shortest=None, **codec_threads()).run(overwrite_output=True, quiet=True)
+    return os.path.exists(output_mp4_abs)
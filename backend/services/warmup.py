@@ -0,0 +1,67 @@
+"""
+warmup.py — Background warm-up after startup
+────────────────────────────────────────────────────────────────────
+The API imports its heavy dependencies at first use (api/routes.py), so a
+cold container answers requests before librosa / scipy / numba / yt_dlp /
+firestore have loaded. Right after startup a daemon thread:
+  • preloads WARM_MODULES (the render and analysis stack, downloads, billing)
+  • runs dna_from_signal on a few seconds of synthetic audio, so numba
+    compiles librosa's onset / beat kernels before the first real job
+Both steps are timed into /api/metrics (warmup.imports / warmup.analysis).
+ATMOS_WARMUP=0 skips it.
+"""
+
+import os
+import time
+import importlib
+
+from services import metrics
+
+WARMUP_ENABLED = os.getenv("ATMOS_WARMUP", "1") == "1"
+WARMUP_SECONDS = 6.0     # synthetic audio for the JIT pass
+
+WARM_MODULES = (
+    "services.audio_processor",      # scipy.signal, ffmpeg-python, every render service
+    "services.audio_analyzer",       # librosa (+ numba, soundfile)
+    "services.preview",
+    "services.pcm_cache",
+    "services.artifacts",
+    "services.ai_service",
+    "yt_dlp",
+    "firebase_admin.firestore",      # google-cloud-firestore
+)
+
+
+def warm_imports():
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Warm-up: could not preload {name}: {e}")
+
+
+def warm_analysis(sr: int = 22050):
+    """One DNA pass over a click track + chord — compiles the numba kernels librosa uses."""
+    import numpy as np
+    from services.audio_analyzer import dna_from_signal
+
+    t = np.arange(int(WARMUP_SECONDS * sr)) / sr
+    y = 0.1 * np.sin(2 * np.pi * 220 * t) + 0.1 * np.sin(2 * np.pi * 330 * t)
+    y[::sr // 2] += 0.9                    # clicks at 120 BPM
+    dna_from_signal(y.astype(np.float32), sr)
+
+
+def warm_up():
+    if not WARMUP_ENABLED:
+        return
+    start = time.perf_counter()
+    warm_imports()
+    imported = time.perf_counter()
+    try:
+        warm_analysis()
+    except Exception as e:
+        print(f"Warm-up: analysis pass failed: {e}")
+    done = time.perf_counter()
+    metrics.observe("warmup.imports", imported - start)
+    metrics.observe("warmup.analysis", done - imported)
+    print(f"Warm-up done: imports {imported - start:.2f}s, analysis JIT {done - imported:.2f}s")
@@ -0,0 +1,152 @@
+"""
+test_async_lookups.py — concurrent mood / lyrics lookups, against a local stub server with slow APIs.
+
+Usage:
+    python test_async_lookups.py
+
+The stub answers MusicBrainz, JioSaavn, Lyrics.ovh and OpenRouter after
+configurable delays. Checks that
+  • analyze_mood_smart waits max(MusicBrainz + OpenRouter, JioSaavn) — not
+    the sum the sequential lookups took — and returns the same mood
+  • lyrics: the faster JioSaavn answer does not beat a Lyrics.ovh answer
+    (still preferred), but wins as soon as Lyrics.ovh comes back empty
+  • a hung API is cut off at the deadline with the fallback answer, and
+    the abandoned lookups are cancelled
+  • the sync wrappers also work from a thread whose event loop is running
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from services import ai_service, lookup_cache
+
+DELAYS = {"mb": 0.6, "saavn": 0.8, "lyrics": 0.6, "openrouter": 0.6}
+LYRICS = "la " * 40
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        source = urlparse(self.path).path.split("/")[1]
+        time.sleep(DELAYS[source])
+        if source == "mb":
+            # Neutral tags → the mood pipeline goes on to JioSaavn / OpenRouter
+            rec = {"title": "Song", "tags": [{"name": "indie"}], "genres": []}
+            return self._send(200, {"recordings": [rec]})
+        if source == "saavn":
+            song = {"name": "Song", "language": "english", "description": "a jiosaavn description " * 4}
+            return self._send(200, {"data": {"results": [song]}})
+        if source == "lyrics":
+            return self._send(200 if self.server.lyrics_found else 404, {"lyrics": LYRICS})
+        self._send(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(DELAYS["openrouter"])
+        self._send(200, {"choices": [{"message": {"content": "Romantic."}}]})
+
+
+def start_stub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    server.lyrics_found = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    ai_service.MUSICBRAINZ_BASE = f"{base}/mb"
+    ai_service.JIOSAAVN_BASE = f"{base}/saavn"
+    ai_service.LYRICSOVH_BASE = f"{base}/lyrics"
+    ai_service.OPENROUTER_URL = f"{base}/openrouter"
+    ai_service.OPENROUTER_API_KEY = "stub"
+    lookup_cache.LOOKUP_CACHE_ENABLED = False        # every lookup must reach the stub
+    return server
+
+
+def sequential_mood(filename: str) -> str:
+    """The mood lookups one after another, as analyze_mood_smart used to run them."""
+    artist, title = ai_service._artist_title(filename)
+    metadata = ai_service.get_song_metadata_free(artist, title)
+    ai_service.search_jiosaavn("Artist - Song")
+    return ai_service._openrouter_mood(artist, title, {}, metadata["tags"]) or metadata["mood"]
+
+
+def timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {name:<36} {detail} {'✓' if ok else '✗'}")
+    return ok
+
+
+async def sync_inside_loop() -> tuple:
+    """(mood, lyrics) from the sync wrappers, called from a coroutine (asyncio.run used to raise here)."""
+    return (ai_service.analyze_mood_smart("Artist - Song.mp3", {}),
+            ai_service.transcribe_audio_smart("Artist - Song.mp3"))
+
+
+async def hung_lyrics() -> tuple:
+    """(answer, seconds, loser cancelled) with Lyrics.ovh hanging past a 1 s deadline and JioSaavn failing."""
+    loser = asyncio.ensure_future(asyncio.sleep(30, "too late"))
+    start = time.perf_counter()
+    answer = await ai_service.first_acceptable([(loser, bool), (asyncio.sleep(0.1, ""), bool)], 1.0)
+    await asyncio.sleep(0)
+    return answer, time.perf_counter() - start, loser.cancelled()
+
+
+if __name__ == "__main__":
+    server = start_stub()
+    results = []
+    print("\n--- concurrent lookups against slow stub APIs ---")
+
+    ai_service.get_song_metadata_free("warm", "up")       # open the keep-alive connection outside the timings
+    seq, t_seq = timed(sequential_mood, "Artist - Song.mp3")
+    conc, t_conc = timed(ai_service.analyze_mood_smart, "Artist - Song.mp3", {})
+    expect = max(DELAYS["mb"] + DELAYS["openrouter"], DELAYS["saavn"])
+    results.append(check("mood: sequential vs concurrent", conc == seq and t_conc < expect + 0.3,
+                         f"{seq} in {t_seq:.2f}s → {conc} in {t_conc:.2f}s (floor {expect:.1f}s)"))
+
+    lyrics, t = timed(ai_service.transcribe_audio_smart, "Artist - Song.mp3")
+    results.append(check("lyrics: Lyrics.ovh preferred", lyrics.get("text", "").startswith("la la"),
+                         f"{lyrics.get('text', '')[:12]!r} in {t:.2f}s"))
+    DELAYS["lyrics"], DELAYS["saavn"] = 0.2, 0.6
+    server.lyrics_found = False
+    lyrics, t = timed(asyncio.run, ai_service.get_lyrics_free_async("Artist", "Song"))
+    results.append(check("lyrics: JioSaavn once Lyrics.ovh is empty", lyrics.startswith("a jiosaavn") and t < 0.9,
+                         f"{lyrics[:12]!r} in {t:.2f}s"))
+
+    try:
+        mood, lyrics = asyncio.run(sync_inside_loop())
+        ok, detail = mood == conc and lyrics.get("text", "").startswith("a jiosaavn"), f"{mood}, {lyrics.get('text', '')[:12]!r}"
+    except RuntimeError as e:
+        ok, detail = False, str(e)
+    results.append(check("sync wrappers inside a running loop", ok, detail))
+
+    answer, t, cancelled = asyncio.run(hung_lyrics())
+    results.append(check("deadline: hung API cut off", answer is None and t < 1.3 and cancelled,
+                         f"{answer!r} after {t:.2f}s, loser cancelled {cancelled}"))
+
+    DELAYS["mb"] = 3.0
+    mood, t = timed(asyncio.run, ai_service.analyze_mood_smart_async("Artist - Song.mp3", {}, deadline=1.0))
+    results.append(check("deadline: mood falls back", mood == "Calm" and t < 1.3, f"{mood} after {t:.2f}s"))
+
+    server.shutdown()
+    print("\n✅ ASYNC LOOKUPS OK" if all(results) else "\n❌ ASYNC LOOKUP CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,103 @@
+"""
+test_beat_pool.py — the pre-generated copyright-free beat pool.
+
+Usage:
+    python test_beat_pool.py [input.mp3]        (default: synthetic 3-minute MP3)
+
+Runs seeded copyright-free jobs against an empty pool in temp/bench/beat_pool
+(one BPM, two buckets) and checks that
+  • the first job is a miss: it synthesizes the beat itself and starts the
+    refill process, which renders the missing beats and removes stale ones
+  • the next jobs are hits — piped (ffmpeg reads the pooled file, trimmed)
+    and via a WAV (ATMOS_STREAM_BEAT=0) — and render the same master as the
+    miss (the pool stores 16-bit FLAC)
+  • beat_pool.hit / beat_pool.miss count it in the metrics
+"""
+import glob
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from bench_render import BENCH_DIR, BENCH_DNA, make_synthetic_input
+from services import audio_processor, beat_pool, metrics
+from services.dsp_engine import decode_audio
+from services.presets import get_preset_params
+
+POOL_DIR = os.path.join(BENCH_DIR, "beat_pool")
+MAX_RESIDUAL_DB = -40.0
+SEED = 11
+
+
+def render(src: str, tag: str) -> tuple:
+    """(decoded master, seconds)"""
+    out_mp3 = os.path.join(BENCH_DIR, f"pool_{tag}.mp3")
+    start = time.perf_counter()
+    ok = audio_processor.process_audio(src, src, None, out_mp3, None, get_preset_params("Rainy Cafe"),
+                                       copyright_free=True, dna_data=BENCH_DNA, mood="Neutral",
+                                       single_pass=True, segmented=False, seed=SEED)
+    secs = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError(f"{tag} render failed")
+    master = decode_audio(out_mp3)
+    for path in [out_mp3] + glob.glob(os.path.join(BENCH_DIR, f"cf_beat_pool_{tag}*")):
+        os.remove(path)
+    return master, secs
+
+
+def residual_db(a: np.ndarray, b: np.ndarray) -> float:
+    n = min(a.shape[1], b.shape[1])
+    err = np.sqrt(np.mean((a[:, :n] - b[:, :n]) ** 2))
+    return float(20 * np.log10(err / (np.sqrt(np.mean(a[:, :n] ** 2)) + 1e-12) + 1e-12))
+
+
+def counts() -> tuple:
+    snap = metrics.snapshot()
+    return snap.get("beat_pool.hit", 0), snap.get("beat_pool.miss", 0)
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "in180.mp3"), 180.0)
+    shutil.rmtree(POOL_DIR, ignore_errors=True)
+    os.makedirs(POOL_DIR)
+    stale = os.path.join(POOL_DIR, "p0_78bpm_245s_0.flac")
+    open(stale, "wb").close()
+    beat_pool.BEAT_POOL_DIR = POOL_DIR
+    beat_pool.BEAT_BPMS = (78,)
+    beat_pool.DURATION_BUCKETS = (125.0, 245.0)
+    results = []
+
+    print(f"\n--- beat pool: seeded copyright-free job, cold vs warm pool ({os.path.basename(src)}) ---")
+    miss, t_miss = render(src, "miss")
+    hits, misses = counts()
+    proc = beat_pool._refill_proc
+    ok = misses == 1 and hits == 0 and proc is not None
+    print(f"  miss : {t_miss:5.1f}s  (hit {hits}, miss {misses}, refill started {proc is not None}) {'✓' if ok else '✗'}")
+    results.append(ok)
+
+    if proc is not None:
+        proc.join(timeout=300)
+    filled = not beat_pool.missing_beats() and not os.path.exists(stale)
+    print(f"  refill: {sorted(os.listdir(POOL_DIR))}, stale removed {not os.path.exists(stale)} {'✓' if filled else '✗'}")
+    results.append(filled)
+
+    piped, t_piped = render(src, "hit_piped")
+    audio_processor.STREAM_BEAT = False
+    wav, t_wav = render(src, "hit_wav")
+    hits, misses = counts()
+    for name, master, secs in (("hit (piped)", piped, t_piped), ("hit (WAV)", wav, t_wav)):
+        res = residual_db(miss, master)
+        ok = res <= MAX_RESIDUAL_DB and abs(miss.shape[1] - master.shape[1]) <= 1152
+        print(f"  {name:<11}: {secs:5.1f}s  residual vs miss {res:6.1f} dB, "
+              f"length {master.shape[1]} vs {miss.shape[1]} {'✓' if ok else '✗'}")
+        results.append(ok)
+    ok = (hits, misses) == (2, 1)
+    print(f"  metrics: beat_pool.hit {hits}, beat_pool.miss {misses} {'✓' if ok else '✗'}")
+    results.append(ok)
+
+    shutil.rmtree(POOL_DIR, ignore_errors=True)
+    print("\n✅ BEAT POOL OK" if all(results) else "\n❌ BEAT POOL CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,117 @@
+"""
+test_beat_stream.py — the streamed copyright-free beat: same audio, flat memory, no intermediate file.
+
+Usage:
+    python test_beat_stream.py [input.mp3]        (default: synthetic 3-minute MP3)
+
+Checks that
+  • stream_lofi_beat() yields exactly the samples of generate_lofi_beat(),
+    and the fixed master gain keeps every beat's peak ≤ MASTER_PEAK
+  • the first block of a 10-minute stream arrives within MAX_FIRST_BLOCK
+    seconds, a small fraction of the whole stream's time (no peak pass)
+  • consuming the stream of a 10-minute beat peaks (tracemalloc) within
+    MAX_GROWTH of a 1-minute one
+  • a copyright-free process_audio job renders the same master whether the
+    beat is piped into ffmpeg (ATMOS_STREAM_BEAT=1) or written as a WAV
+    first — single- and two-pass — and the piped job writes no cf_beat file
+"""
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench_render import BENCH_DIR, BENCH_DNA, make_synthetic_input
+from services import audio_processor, beat_pool
+from services.dsp_engine import decode_audio
+from services.lofi_beat_generator import MASTER_PEAK, generate_lofi_beat, stream_lofi_beat
+from services.presets import get_preset_params
+
+MAX_GROWTH      = 1.25      # 10-minute stream peak ≤ 1.25 × 1-minute peak
+MAX_FIRST_BLOCK = 0.5       # seconds to the first block of a 10-minute stream
+MAX_RESIDUAL_DB = -40.0     # piped vs WAV master (the WAV is 16-bit), relative to the signal
+SEED = 7
+
+
+def stream_peak_mb(seconds: float) -> float:
+    tracemalloc.start()
+    for _ in stream_lofi_beat(seconds, 78.0):
+        pass
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return peak
+
+
+def render(src: str, streamed: bool, single_pass: bool) -> tuple:
+    """(decoded master, seconds, cf_beat files left behind)"""
+    tag = f"{'stream' if streamed else 'wav'}_{'sp' if single_pass else 'tp'}"
+    out_mp3 = os.path.join(BENCH_DIR, f"beat_{tag}.mp3")
+    audio_processor.STREAM_BEAT = streamed
+    start = time.perf_counter()
+    ok = audio_processor.process_audio(src, src, None, out_mp3, None, get_preset_params("Rainy Cafe"),
+                                       copyright_free=True, dna_data=BENCH_DNA, mood="Neutral",
+                                       single_pass=single_pass, segmented=False, seed=SEED)
+    secs = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError(f"{tag} render failed")
+    leftovers = glob.glob(os.path.join(BENCH_DIR, f"cf_beat_beat_{tag}*"))
+    master = decode_audio(out_mp3)
+    for path in [out_mp3] + leftovers:
+        os.remove(path)
+    return master, secs, leftovers
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    beat_pool.BEAT_POOL_ENABLED = False      # synthesized beats only (test_beat_pool.py covers the pool)
+    src = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "in180.mp3"), 180.0)
+    results = []
+
+    print("\n--- stream_lofi_beat vs generate_lofi_beat ---")
+    whole = generate_lofi_beat(95.0, 78.0)
+    blocks = list(stream_lofi_beat(95.0, 78.0))
+    same = np.array_equal(whole, np.concatenate(blocks))
+    print(f"  95 s beat: {len(blocks)} blocks, identical samples {'✓' if same else '✗'}")
+    results.append(same)
+
+    start = time.perf_counter()                 # note templates warm from the 95 s beat
+    stream = stream_lofi_beat(600.0, 78.0)
+    next(stream)
+    t_first = time.perf_counter() - start
+    for _ in stream:
+        pass
+    t_all = time.perf_counter() - start
+    ok = t_first <= MAX_FIRST_BLOCK and t_first < 0.05 * t_all
+    print(f"  10 min stream: first block after {t_first * 1000:.0f} ms, whole stream {t_all:.1f}s {'✓' if ok else '✗'}")
+    results.append(ok)
+
+    peaks = {(sec, bpm): float(np.abs(generate_lofi_beat(sec, bpm)).max()) for sec in (10.0, 125.0, 365.0) for bpm in (69.0, 88.0)}
+    ok = all(0.5 * MASTER_PEAK < p <= MASTER_PEAK for p in peaks.values())
+    print(f"  fixed master gain: peaks {min(peaks.values()):.3f}..{max(peaks.values()):.3f} "
+          f"(ceiling {MASTER_PEAK}) {'✓' if ok else '✗'}")
+    results.append(ok)
+
+    stream_peak_mb(60.0)                     # note templates are built once, outside the measurement
+    short, long = stream_peak_mb(60.0), stream_peak_mb(600.0)
+    flat = long <= short * MAX_GROWTH
+    print(f"  peak memory: 1 min {short:.1f} MB, 10 min {long:.1f} MB "
+          f"(whole array {600 * 44100 * 4 / 1e6:.0f} MB) {'✓' if flat else '✗'}")
+    results.append(flat)
+
+    print(f"\n--- copyright-free job: beat piped into ffmpeg vs written as WAV ({os.path.basename(src)}) ---")
+    for single_pass in (True, False):
+        wav, t_wav, _ = render(src, False, single_pass)
+        piped, t_piped, leftovers = render(src, True, single_pass)
+        n = min(wav.shape[1], piped.shape[1])
+        residual = 20 * np.log10(np.sqrt(np.mean((wav[:, :n] - piped[:, :n]) ** 2))
+                                 / (np.sqrt(np.mean(wav[:, :n] ** 2)) + 1e-12) + 1e-12)
+        ok = residual <= MAX_RESIDUAL_DB and abs(wav.shape[1] - piped.shape[1]) <= 1152 and not leftovers
+        print(f"  {'single' if single_pass else 'two'}-pass: WAV {t_wav:.1f}s, piped {t_piped:.1f}s, "
+              f"residual {residual:.1f} dB, length {wav.shape[1]} vs {piped.shape[1]}, "
+              f"cf_beat files {len(leftovers)} {'✓' if ok else '✗'}")
+        results.append(ok)
+
+    print("\n✅ BEAT STREAM OK" if all(results) else "\n❌ BEAT STREAM CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,85 @@
+"""
+test_cold_start.py — `import main` must stay light: a regression check on API cold start.
+
+Usage:
+    python test_cold_start.py [budget_ms]        (default: COLD_START_BUDGET_MS)
+
+Runs `python -X importtime -c "import main"` in fresh interpreters (RUNS
+times, the median is used) and checks that
+  • none of HEAVY_MODULES is imported at startup — they load at first use
+    or in the background warm-up (services/warmup.py)
+  • the cumulative import time of main stays under the budget
+The slowest remaining top-level imports are printed, so a regression shows
+where it came from. Then, informational: the first DNA analysis in a cold
+interpreter vs one after warm_up() (the numba JIT the warm-up takes off the
+first job).
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+RUNS = 3
+COLD_START_BUDGET_MS = 1500
+HEAVY_MODULES = ("librosa", "numba", "scipy", "numpy", "yt_dlp", "google.cloud.firestore",
+                 "soundfile", "services.audio_processor", "services.audio_analyzer", "services.ai_service")
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+FIRST_DNA = """
+import time
+import numpy as np
+{warm}
+from services.audio_analyzer import dna_from_signal
+sr = 22050
+y = (np.random.default_rng(0).standard_normal(sr * 20) * 0.1).astype(np.float32)
+y[::sr // 2] += 0.9
+start = time.perf_counter()
+dna_from_signal(y, sr)
+print(f"{{time.perf_counter() - start:.3f}}")
+"""
+
+
+def import_profile() -> tuple:
+    """(cumulative µs of main, {module: cumulative µs}, top-level [(µs, module)])"""
+    env = dict(os.environ, ATMOS_WARMUP="0")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+    modules, top = {}, []
+    for self_us, cum_us, indent, name in LINE.findall(proc.stderr):
+        modules[name] = int(cum_us)
+        if len(indent) == 3:          # imported directly by main
+            top.append((int(cum_us), name))
+    return modules.get("main", 0), modules, sorted(top, reverse=True)
+
+
+def first_dna_seconds(warm: bool) -> float:
+    code = FIRST_DNA.format(warm="from services.warmup import warm_up; warm_up()" if warm else "")
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                          env=dict(os.environ, ATMOS_WARMUP="1"))
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else COLD_START_BUDGET_MS
+
+    profiles = [import_profile() for _ in range(RUNS)]
+    total_ms = statistics.median(p[0] for p in profiles) / 1000
+    modules, top = profiles[-1][1], profiles[-1][2]
+
+    print(f"\n--- cold start: python -X importtime -c 'import main' (median of {RUNS}) ---")
+    for cum_us, name in top[:8]:
+        print(f"  {cum_us / 1000:8.1f} ms  {name}")
+    heavy = [m for m in HEAVY_MODULES if m in modules]
+    fast = total_ms <= budget_ms
+    print(f"  import main: {total_ms:.0f} ms (budget {budget_ms:.0f} ms) {'✓' if fast else '✗'}")
+    print(f"  heavy modules at startup: {', '.join(heavy) if heavy else 'none'} {'✗' if heavy else '✓'}")
+
+    cold, warm = first_dna_seconds(False), first_dna_seconds(True)
+    print(f"  first DNA analysis (20 s audio): cold {cold:.2f}s, after warm-up {warm:.2f}s")
+
+    ok = fast and not heavy
+    print("\n✅ COLD START OK" if ok else "\n❌ COLD START REGRESSED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,52 @@
+"""
+test_dna_regression.py — the single-STFT analyzer must make the same DNA calls as the legacy one.
+
+Usage:
+    python test_dna_regression.py [audio ...]
+
+For every fixture (default: the synthetic set from bench_audio_analyzer.py)
+the legacy, single-STFT and streaming analyzers run on the same file and the
+engine-facing flags — is_drum_heavy, is_bass_heavy, is_already_dark — must
+match exactly, and so must the BPM (it picks the drum loop tempo): the onset
+envelope is built from the same STFT framing. The default set includes a pair
+of fixtures a few % either side of each flag's threshold (percussiveness 0.35,
+bass_ratio 1.2, centroid 1200 Hz); the legacy flag must land on the intended
+side, so the pair really straddles it. The raw features are printed alongside.
+"""
+import os
+import sys
+
+import librosa
+
+from bench_audio_analyzer import THRESHOLD_FIXTURES, legacy_dna_from_signal, make_dna_fixtures
+from services.audio_analyzer import dna_from_signal, stream_track_dna
+
+FLAGS = ("is_drum_heavy", "is_bass_heavy", "is_already_dark")
+FEATURES = ("bpm", "percussiveness", "brightness", "bass_ratio")
+BPM_TOLERANCE = 0.5
+
+
+def check(path: str) -> bool:
+    y, sr = librosa.load(path, sr=22050, mono=True)
+    old, new, streamed = legacy_dna_from_signal(y, sr), dna_from_signal(y, sr), stream_track_dna(path, sr)
+    same = all(all(bool(old[f]) == bool(dna[f]) for f in FLAGS)
+               and abs(old["bpm"] - dna["bpm"]) <= BPM_TOLERANCE for dna in (new, streamed))
+    flag, expected = THRESHOLD_FIXTURES.get(os.path.splitext(os.path.basename(path))[0], (None, None))
+    straddles = flag is None or bool(old[flag]) == expected
+    feats = "  ".join(f"{f} {old[f]:.4g}→{new[f]:.4g}/{streamed[f]:.4g}" for f in FEATURES)
+    flags = " ".join(f"{f[3:]}={bool(new[f])}" for f in FLAGS)
+    print(f"  {'✓' if same and straddles else '✗'} {os.path.basename(path):<16} {flags}\n      {feats}")
+    if not same:
+        print(f"      legacy flags: {[bool(old[f]) for f in FLAGS]}  new flags: {[bool(new[f]) for f in FLAGS]}"
+              f"  streamed flags: {[bool(streamed[f]) for f in FLAGS]}")
+    if not straddles:
+        print(f"      legacy {flag}={bool(old[flag])}, fixture is meant to give {expected}")
+    return same and straddles
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or make_dna_fixtures()
+    print("\n--- DNA flag regression: legacy vs single STFT / streaming ---")
+    results = [check(p) for p in paths]
+    print("\n✅ DNA FLAGS MATCH" if all(results) else "\n❌ DNA FLAGS DIFFER")
+    sys.exit(0 if all(results) else 1)
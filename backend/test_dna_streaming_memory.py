@@ -0,0 +1,76 @@
+"""
+test_dna_streaming_memory.py — streaming DNA analysis must run in bounded memory.
+
+Usage:
+    python test_dna_streaming_memory.py [hours]        (default: 2)
+
+Builds two synthetic inputs by looping the busy_mix DNA fixture: a 10-minute
+track and a multi-hour mix. Checks that
+  • the streaming analyzer's peak memory (tracemalloc, NumPy buffers included)
+    on the multi-hour mix stays within MAX_GROWTH of the 10-minute peak
+  • on the 10-minute track, streaming and whole-file analysis agree on the
+    DNA flags and the BPM
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import ffmpeg
+
+from bench_audio_analyzer import make_dna_fixtures, FIXTURE_DIR
+from bench_render import BENCH_DIR
+from services.audio_analyzer import stream_track_dna, analyze_track_dna
+
+SHORT_SECONDS = 600
+MAX_GROWTH    = 1.25        # long-mix peak ≤ 1.25 × 10-minute peak (+ the onset envelope)
+FLAGS = ("is_drum_heavy", "is_bass_heavy", "is_already_dark")
+
+
+def make_long_fixture(seconds: float) -> str:
+    path = os.path.join(BENCH_DIR, f"dna_long_{int(seconds)}s.mp3")
+    if not os.path.exists(path):
+        make_dna_fixtures()
+        (ffmpeg.input(os.path.join(FIXTURE_DIR, "busy_mix.wav"), stream_loop=-1)
+               .output(path, t=seconds, ac=1, audio_bitrate="64k")
+               .run(overwrite_output=True, quiet=True))
+    return path
+
+
+def peak_streaming(path: str) -> tuple:
+    """(dna, seconds, peak MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    dna = stream_track_dna(path)
+    secs = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return dna, secs, peak
+
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    short = make_long_fixture(SHORT_SECONDS)
+    long = make_long_fixture(hours * 3600)
+
+    print("\n--- streaming DNA: peak memory vs input length ---")
+    dna_s, t_s, peak_s = peak_streaming(short)
+    print(f"  {SHORT_SECONDS / 60:5.0f} min : {t_s:7.1f}s  peak {peak_s:6.1f} MB")
+    dna_l, t_l, peak_l = peak_streaming(long)
+    # The onset envelope is the only per-frame state: 4 bytes per hop, twice during the tempo pass
+    envelope_mb = 2 * 4 * hours * 3600 * 22050 / 512 / 1e6
+    bounded = peak_l <= peak_s * MAX_GROWTH + envelope_mb
+    print(f"  {hours * 60:5.0f} min : {t_l:7.1f}s  peak {peak_l:6.1f} MB  "
+          f"(limit {peak_s * MAX_GROWTH + envelope_mb:.1f} MB) {'✓' if bounded else '✗'}")
+    print(f"  (a whole-file load of the long mix would hold {hours * 3600 * 22050 * 4 / 1e6:.0f} MB of waveform alone)")
+
+    whole = analyze_track_dna(short, streaming=False)
+    agree = all(bool(whole[f]) == bool(dna_s[f]) for f in FLAGS) and abs(whole["bpm"] - dna_s["bpm"]) <= 0.5
+    print(f"  streaming vs whole-file on {SHORT_SECONDS / 60:.0f} min: "
+          + "  ".join(f"{k} {whole[k]}→{dna_s[k]}" for k in ("bpm", "percussiveness", "brightness", "bass_ratio"))
+          + f" {'✓' if agree else '✗'}")
+
+    ok = bounded and agree
+    print("\n✅ STREAMING DNA BOUNDED" if ok else "\n❌ STREAMING DNA CHECK FAILED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,137 @@
+"""
+test_http_client.py — pooled keep-alive HTTP for ai_service, against a local stub server.
+
+Usage:
+    python test_http_client.py
+
+Starts StubServer (HTTP/1.1, keep-alive; it counts the TCP connections it
+accepts), points the ai_service API bases at it and checks that
+  • repeated lyrics / MusicBrainz / JioSaavn lookups share one connection
+  • concurrent lookups open at most HTTP_POOL_SIZE connections
+  • a GET answered 503 is retried with backoff; a POST is not retried
+  • _download_file() hands its connection back to the pool
+  • pool_stats() reports the connections and requests per host
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from services import ai_service, http_client, lookup_cache
+
+LYRICS = "la " * 40
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"          # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        self.server.hits[path.split("/")[1]] += 1
+        if path.startswith("/lyrics/"):
+            return self._send(200, json.dumps({"lyrics": LYRICS}).encode())
+        if path.startswith("/mb/recording"):
+            rec = {"title": "Song", "tags": [{"name": "sad"}], "genres": [{"name": "pop"}]}
+            return self._send(200, json.dumps({"recordings": [rec]}).encode())
+        if path.startswith("/saavn/search/songs"):
+            song = {"name": "Song", "primaryArtists": "A", "album": {"name": "B"}, "language": "hindi"}
+            return self._send(200, json.dumps({"data": {"results": [song]}}).encode())
+        if path.startswith("/flaky"):
+            self.server.flaky += 1
+            status = 503 if self.server.flaky == 1 else 200
+            return self._send(status, b"{}")
+        if path.startswith("/file"):
+            time.sleep(0.01)
+            return self._send(200, b"\0" * 200_000, "application/octet-stream")
+        self._send(404, b"{}")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.hits["post"] += 1
+        self._send(503, b"{}")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.connections, self.flaky, self.hits = 0, 0, Counter()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {name:<34} {detail} {'✓' if ok else '✗'}")
+    return ok
+
+
+if __name__ == "__main__":
+    server = StubServer()
+    ai_service.LYRICSOVH_BASE = f"{server.base}/lyrics"
+    ai_service.MUSICBRAINZ_BASE = f"{server.base}/mb"
+    ai_service.JIOSAAVN_BASE = f"{server.base}/saavn"
+    http_client._session = http_client.make_session(pool_size=4, backoff=0.05)
+    lookup_cache.LOOKUP_CACHE_ENABLED = False        # every lookup must reach the stub
+    results = []
+
+    print("\n--- http_client: keep-alive pool against a local stub server ---")
+    for _ in range(5):
+        ai_service.get_lyrics_free("Artist", "Title")
+        ai_service.get_song_metadata_free("Artist", "Title")
+        ai_service.search_jiosaavn("Title Artist")
+    results.append(check("15 sequential lookups", server.connections == 1,
+                         f"{sum(server.hits.values())} requests, {server.connections} connection(s)"))
+
+    before = server.connections
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: ai_service.get_lyrics_free("Artist", "Title"), range(40)))
+    opened = server.connections - before
+    results.append(check("40 lookups on 4 threads", opened <= 3, f"{opened} new connection(s) (pool size 4)"))
+
+    start = time.perf_counter()
+    r = http_client.get(f"{server.base}/flaky", timeout=5)
+    results.append(check("GET 503 → retried", r.status_code == 200 and server.flaky == 2,
+                         f"{server.flaky} attempts, {time.perf_counter() - start:.2f}s"))
+    r = http_client.post(f"{server.base}/post", json={}, timeout=5)
+    results.append(check("POST 503 → not retried", r.status_code == 503 and server.hits["post"] == 1,
+                         f"{server.hits['post']} attempt(s)"))
+
+    before = server.connections
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(3):
+            ai_service._download_file(f"{server.base}/file", os.path.join(tmp, f"stem{i}.mp3"))
+    opened = server.connections - before
+    results.append(check("3 stem downloads", opened == 0, f"{opened} new connection(s)"))
+
+    stats = http_client.pool_stats()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    ok = stats.get(f"http.{host}.connections") == server.connections and stats.get(f"http.{host}.requests", 0) >= 60
+    results.append(check("pool_stats()", ok, json.dumps(stats)))
+
+    server.shutdown()
+    print("\n✅ HTTP POOL OK" if all(results) else "\n❌ HTTP POOL CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,152 @@
+"""
+test_lookup_cache.py — the TTL cache in front of the ai_service lookups, against a slow local stub server.
+
+Usage:
+    python test_lookup_cache.py
+
+Uses a fresh SQLite tier in temp/bench and checks that
+  • repeated lyrics / metadata / JioSaavn / description lookups reach the
+    API once, and the repeats answer from memory
+  • misses are cached for NEGATIVE_TTL only, answers for their source's TTL
+  • 8 threads asking for the same uncached song make one API call
+  • after a restart (memory tier dropped) the SQLite tier still answers
+  • hit rates and saved seconds show up in the metrics
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from services import ai_service, lookup_cache, metrics
+
+BENCH_DIR = os.path.join("temp", "bench")
+DB_PATH = os.path.join(BENCH_DIR, "lookup_cache_test.sqlite3")
+DELAY = 0.3
+LYRICS = "la " * 40
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        self.server.hits[path.split("/")[1]] += 1
+        time.sleep(DELAY)
+        if path.startswith("/lyrics/"):
+            found = "Unknown" not in path
+            return self._send(200 if found else 404, {"lyrics": LYRICS} if found else {})
+        if path.startswith("/mb/"):
+            rec = {"title": "Song", "tags": [{"name": "sad"}], "genres": [{"name": "pop"}]}
+            return self._send(200, {"recordings": [rec]})
+        if path.startswith("/saavn/"):
+            return self._send(200, {"data": {"results": [{"name": "Song", "language": "hindi"}]}})
+        self._send(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.hits["openrouter"] += 1
+        time.sleep(DELAY)
+        self._send(200, {"choices": [{"message": {"content": "Rain on a quiet window."}}]})
+
+
+def start_stub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    server.hits = Counter()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    ai_service.LYRICSOVH_BASE = f"{base}/lyrics"
+    ai_service.MUSICBRAINZ_BASE = f"{base}/mb"
+    ai_service.JIOSAAVN_BASE = f"{base}/saavn"
+    ai_service.OPENROUTER_URL = f"{base}/openrouter"
+    ai_service.OPENROUTER_API_KEY = "stub"
+    return server
+
+
+def timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {name:<32} {detail} {'✓' if ok else '✗'}")
+    return ok
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    lookup_cache.LOOKUP_CACHE_DB = DB_PATH
+    lookup_cache.NEGATIVE_TTL = 0.5
+    server = start_stub()
+    hits = server.hits
+    results = []
+    print("\n--- lookup cache: repeats against a slow stub API ---")
+
+    first, t_first = timed(ai_service._lyrics_ovh, "Artist", "Song")
+    again, t_again = timed(ai_service._lyrics_ovh, "  artist ", "SONG")
+    results.append(check("lyrics repeat", again == first and hits["lyrics"] == 1 and t_again < 0.01,
+                         f"{t_first * 1000:.0f} ms → {t_again * 1000:.2f} ms, {hits['lyrics']} API call(s)"))
+
+    for _ in range(5):
+        ai_service.get_song_metadata_free("Artist", "Song")
+        ai_service.search_jiosaavn("Song Artist")
+        desc = ai_service.generate_preset_description("Sad")
+    results.append(check("metadata / JioSaavn / description", (hits["mb"], hits["saavn"], hits["openrouter"]) == (1, 1, 1)
+                         and desc == "Rain on a quiet window.", f"API calls {dict(hits)}"))
+
+    ai_service._lyrics_ovh("Unknown", "Song")
+    ai_service._lyrics_ovh("Unknown", "Song")
+    cached_miss = hits["lyrics"] == 2
+    time.sleep(0.6)
+    ai_service._lyrics_ovh("Unknown", "Song")
+    results.append(check("miss cached NEGATIVE_TTL only", cached_miss and hits["lyrics"] == 3,
+                         f"{hits['lyrics'] - 1} calls for 3 lookups across the 0.5 s TTL"))
+
+    lookup_cache.TTLS["jiosaavn"] = 0.3
+    ai_service.search_jiosaavn("Other Song")
+    time.sleep(0.4)
+    ai_service.search_jiosaavn("Other Song")
+    lookup_cache.TTLS["jiosaavn"] = 7 * lookup_cache.DAY
+    results.append(check("answer expires after its TTL", hits["saavn"] == 3, f"{hits['saavn'] - 1} calls for 2 lookups"))
+
+    before = hits["lyrics"]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        answers, t = timed(lambda: list(pool.map(lambda _: ai_service._lyrics_ovh("Crowd", "Hit"), range(8))))
+    calls = hits["lyrics"] - before
+    results.append(check("8 concurrent first lookups", calls == 1 and len(set(answers)) == 1,
+                         f"{calls} API call(s), {t * 1000:.0f} ms"))
+
+    lookup_cache.clear()
+    before = sum(hits.values())
+    again, t = timed(ai_service._lyrics_ovh, "Artist", "Song")
+    disk_hits = metrics.snapshot().get("lookup_cache.lyrics.disk_hit", 0)
+    results.append(check("restart: SQLite tier", again == first and sum(hits.values()) == before and disk_hits == 1,
+                         f"{t * 1000:.2f} ms, disk hits {disk_hits}"))
+
+    snap = {**metrics.snapshot(), **lookup_cache.stats()}
+    rate, saved = snap.get("lookup_cache.lyrics.hit_rate", 0), snap.get("lookup_cache.lyrics.saved_secs", 0)
+    results.append(check("metrics", rate > 0.5 and saved > 1.0, f"lyrics hit rate {rate:.2f}, {saved:.2f}s saved"))
+
+    lookup_cache.clear(disk=True)
+    server.shutdown()
+    print("\n✅ LOOKUP CACHE OK" if all(results) else "\n❌ LOOKUP CACHE CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,98 @@
+"""
+test_pcm_cache.py — the decode-once PCM cache cleans up after itself and stays bounded.
+
+Usage:
+    python test_pcm_cache.py
+
+Checks that
+  • close() drops the memmap and removes the job's .f32 files, and the live
+    file / byte totals return to zero
+  • a removal that fails (a file still mapped, as on Windows) is retried by
+    the next close()
+  • over PCM_CACHE_MAX_OPEN / PCM_CACHE_MAX_MB get() and adopt() return None
+    (stages decode themselves) without decoding, and counts it in metrics
+  • sweep_stale() removes .f32 / .part files older than the process, and
+    leaves newer ones alone
+"""
+import os
+import sys
+
+from bench_render import BENCH_DIR, make_synthetic_input
+from services import metrics, pcm_cache
+from services.pcm_cache import JobAudio, PCM_DIR, sweep_stale
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {name:<34} {detail} {'✓' if ok else '✗'}")
+    return ok
+
+
+def live() -> tuple:
+    return pcm_cache._live["files"], pcm_cache._live["bytes"]
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    src = make_synthetic_input(os.path.join(BENCH_DIR, "pcm_10s.mp3"), 10.0)
+    results = []
+    print("\n--- PCM cache cleanup and budget ---")
+
+    job = JobAudio("pcmtest_a", enabled=True)
+    audio = job.get(src)
+    cut = job.adopt(os.path.join(BENCH_DIR, "pcm_cut.wav"), audio.view()[:44100])
+    paths = [audio.raw_path, cut.raw_path]
+    files, size = live()
+    job.close()
+    results.append(check("close() removes the raw files", audio.pcm is None and not any(map(os.path.exists, paths))
+                         and live() == (0, 0), f"{files} files / {size / 1e6:.1f} MB live → {live()}"))
+
+    real_remove, failed = os.remove, []
+
+    def mapped_remove(path):
+        if not failed:
+            failed.append(path)
+            raise PermissionError(13, "The process cannot access the file", path)
+        real_remove(path)
+
+    job = JobAudio("pcmtest_b", enabled=True)
+    first = job.get(src).raw_path
+    os.remove = mapped_remove
+    job.close()
+    os.remove = real_remove
+    stuck = os.path.exists(first) and first in pcm_cache._pending
+    job = JobAudio("pcmtest_c", enabled=True)
+    second = job.get(src).raw_path
+    job.close()
+    results.append(check("failed removal retried", stuck and not os.path.exists(first) and not os.path.exists(second)
+                         and not pcm_cache._pending, f"kept after a PermissionError: {stuck}, gone after the next close()"))
+
+    other = make_synthetic_input(os.path.join(BENCH_DIR, "pcm_5s.mp3"), 5.0)
+    before = metrics.snapshot().get("pcm.over_budget", 0)
+    refused = []
+    for limit in ("PCM_CACHE_MAX_OPEN", "PCM_CACHE_MAX_MB"):
+        default = getattr(pcm_cache, limit)
+        setattr(pcm_cache, limit, 1)          # 1 file / 1 MB: the 10 s source (3.5 MB) fills it
+        job = JobAudio(f"pcmtest_{limit[-4:].lower()}", enabled=True)
+        kept = job.get(src)
+        refused.append(kept is not None and job.get(other) is None and job.counts()["total"] == 1
+                       and job.adopt(os.path.join(BENCH_DIR, "pcm_cut.wav"), kept.view()[:44100]) is None)
+        job.close()
+        setattr(pcm_cache, limit, default)
+    over = metrics.snapshot().get("pcm.over_budget", 0) - before
+    results.append(check("over budget → None", all(refused) and over == 4 and live() == (0, 0),
+                         f"max 1 file / 1 MB: 2nd source and adopt refused {refused}, pcm.over_budget +{over}"))
+
+    os.makedirs(PCM_DIR, exist_ok=True)
+    old = [os.path.join(PCM_DIR, n) for n in ("pcmtest_old_0.f32", "pcmtest_old_1.f32.part")]
+    new = os.path.join(PCM_DIR, "pcmtest_new_0.f32")
+    for path in old + [new]:
+        open(path, "wb").close()
+    for path in old:
+        os.utime(path, (pcm_cache._STARTED - 60, pcm_cache._STARTED - 60))
+    sweep_stale()
+    swept = not any(map(os.path.exists, old)) and os.path.exists(new)
+    results.append(check("sweep_stale()", swept, f"{len(old)} older than the process removed, newer one kept"))
+    os.remove(new)
+
+    print("\n✅ PCM CACHE OK" if all(results) else "\n❌ PCM CACHE CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,111 @@
+"""
+test_segment_seams.py — seam continuity check for the segmented render.
+
+Usage:
+    python test_segment_seams.py [instrumental.mp3] [vocals.mp3]
+
+Renders the same job twice through services/segment_render.py: once as a
+single segment (= continuous render) and once cut into 20s segments. At
+every seam it checks that
+  • there is no click: the largest sample step near the seam is no bigger
+    than in the continuous render
+  • the stitched audio matches the continuous render around the seam
+Both the fallback path (vocals == instrumental) and the real-stems vocal
+path are exercised, on steady material and on a non-stationary song (level
+steps and noise bursts at every phase of the seams), where the compressor /
+limiter state at a seam depends on what happened before the pre-roll.
+"""
+import os
+import sys
+
+import ffmpeg
+import numpy as np
+import soundfile as sf
+
+from bench_render import BENCH_DIR, make_synthetic_input
+from services.ambience import get_ambience_bed
+from services.drum_generator import get_drum_loop
+from services.filter_compiler import compile_graph
+from services.segment_render import render_segmented
+from services.video_renderer import media_duration
+
+SEGMENT_SECONDS = 20
+CLICK_WINDOW    = 0.005     # ±5 ms around the seam
+MATCH_WINDOW    = 0.5       # ±0.5 s around the seam
+MAX_RESIDUAL_DB = -45.0     # stitched vs continuous, relative to the signal (worst seen: -55 dB, non-stationary + stems)
+
+
+def make_synthetic_vocals(path: str, duration: float = 180.0) -> str:
+    """A 440 Hz tone gated at 2 Hz — plenty of work for compressor / echo / speechnorm."""
+    if not os.path.exists(path):
+        tone = (ffmpeg.input(f"sine=f=440:d={duration}:r=44100", f="lavfi")
+                      .filter("tremolo", f=2, d=0.9))
+        ffmpeg.output(tone, path, audio_bitrate="192k").run(overwrite_output=True, quiet=True)
+    return path
+
+
+def make_nonstationary_input(path: str, duration: float = 180.0) -> str:
+    """Tone + noise with ±12 dB level steps every 6.5 s and 0.3 s full-scale noise bursts every 4.3 s."""
+    if not os.path.exists(path):
+        rng = np.random.default_rng(7)
+        t = np.arange(int(duration * 44100)) / 44100
+        x = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+        x *= np.where((t // 6.5) % 2, 1.0, 0.25)
+        burst = (t % 4.3) < 0.3
+        x[burst] += 0.6 * rng.standard_normal(burst.sum())
+        sf.write(path, np.clip(np.stack([x, x], axis=1), -1, 1).astype(np.float32), 44100, subtype="PCM_16")
+    return path
+
+
+def render(job: dict, tag: str, segment_seconds: float) -> tuple:
+    out_mp3 = os.path.join(BENCH_DIR, f"seams_{tag}.mp3")
+    out_wav = os.path.join(BENCH_DIR, f"seams_{tag}.wav")
+    seams = render_segmented(job, media_duration(job["input_instrumental"]), out_mp3, out_wav,
+                             workers=2, segment_seconds=segment_seconds)
+    audio, _ = sf.read(out_wav, dtype="float32")
+    return audio, seams
+
+
+def check_seams(name: str, job: dict) -> bool:
+    print(f"\n--- {name} ---")
+    cont, _ = render(job, f"{name}_continuous", 10 ** 6)
+    seg, seams = render(job, f"{name}_segmented", SEGMENT_SECONDS)
+
+    ok = abs(len(cont) - len(seg)) <= 1
+    print(f"  length       : continuous {len(cont)} / segmented {len(seg)} samples {'✓' if ok else '✗'}")
+    n = min(len(cont), len(seg))
+    cont, seg = cont[:n], seg[:n]
+
+    cw, mw = int(CLICK_WINDOW * 44100), int(MATCH_WINDOW * 44100)
+    for pos in seams:
+        c_step = np.abs(np.diff(cont[pos - cw:pos + cw], axis=0)).max()
+        s_step = np.abs(np.diff(seg[pos - cw:pos + cw], axis=0)).max()
+        ref, got = cont[pos - mw:pos + mw], seg[pos - mw:pos + mw]
+        residual_db = 20 * np.log10(np.sqrt(np.mean((got - ref) ** 2)) / (np.sqrt(np.mean(ref ** 2)) + 1e-12) + 1e-12)
+
+        no_click = s_step <= c_step * 1.5 + 1e-3
+        matches = residual_db <= MAX_RESIDUAL_DB
+        ok = ok and no_click and matches
+        print(f"  seam @ {pos / 44100:7.2f}s : step {s_step:.4f} (continuous {c_step:.4f}) "
+              f"{'✓' if no_click else '✗ CLICK'} | residual {residual_db:6.1f} dB {'✓' if matches else '✗'}")
+    return ok
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    inst = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_input(os.path.join(BENCH_DIR, "synthetic_3min.mp3"), 180.0)
+    vocals = sys.argv[2] if len(sys.argv) > 2 else make_synthetic_vocals(os.path.join(BENCH_DIR, "synthetic_vocals_3min.mp3"))
+    steps = make_nonstationary_input(os.path.join(BENCH_DIR, "nonstationary_3min.wav"))
+
+    graph = compile_graph(5, 7500, 2.0, 0.05, 1.0, 0.85, "Neutral")
+    base = dict(graph=graph, mood="Neutral", amb_bed=get_ambience_bed("Neutral"),
+                drum_path=get_drum_loop(80), rate=0.85, has_v=True)
+
+    results = [
+        check_seams("fallback", dict(base, input_instrumental=inst, input_vocals=inst, is_fallback=True)),
+        check_seams("stems", dict(base, input_instrumental=inst, input_vocals=vocals, is_fallback=False)),
+        check_seams("steps_fallback", dict(base, input_instrumental=steps, input_vocals=steps, is_fallback=True)),
+        check_seams("steps_stems", dict(base, input_instrumental=steps, input_vocals=vocals, is_fallback=False)),
+    ]
+    print("\n✅ ALL SEAMS CLEAN" if all(results) else "\n❌ SEAM CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
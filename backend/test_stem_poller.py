@@ -0,0 +1,185 @@
+"""
+test_stem_poller.py — StemSplit separations on the shared poller, against a local fake StemSplit server.
+
+Usage:
+    python test_stem_poller.py
+
+FakeStemSplit implements /upload, /jobs, /jobs/{id} (PROCESSING with a
+progress % until the job's time is up, then COMPLETED with 4 stem URLs)
+and slow stem downloads. Checks that
+  • 6 concurrent separate_stems_async calls finish in about the longest
+    job's time, with one poller thread and no thread waiting per job, while
+    the event loop stays responsive
+  • the adaptive backoff polls far less than a fixed-interval loop and
+    still notices a finished job soon after it is ready
+  • a job's 4 stems download in parallel
+  • 429 answers are backed off (Retry-After) and the job still completes
+  • failed and never-finishing jobs resolve to {} → original-audio fallback
+  • the blocking separate_stems still works
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from services import ai_service, lookup_cache, metrics
+from services.stem_poller import StemSplitPoller
+
+BENCH_DIR = os.path.join("temp", "bench")
+INPUT = os.path.join(BENCH_DIR, "Artist - Stem Test.mp3")
+STEMS = ("vocals", "drums", "bass", "other")
+STEM_BYTES = 60_000
+DOWNLOAD_DELAY = 0.4
+
+
+class FakeStemSplitHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        for k, v in (headers or {"Content-Type": "application/json"}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        srv = self.server
+        if self.path == "/upload":
+            return self._send(200, json.dumps({"uploadKey": "up-1"}).encode())
+        # Job length / behaviour comes from the next queued plan
+        with srv.lock:
+            job_id = f"job{len(srv.jobs)}"
+            srv.jobs[job_id] = {"created": time.monotonic(), **srv.plans.pop(0)}
+        self._send(201, json.dumps({"jobId": job_id}).encode())
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        srv = self.server
+        if path.startswith("/files/"):
+            time.sleep(DOWNLOAD_DELAY)
+            return self._send(200, b"\0" * STEM_BYTES, {"Content-Type": "audio/mpeg"})
+        job_id = path.rsplit("/", 1)[1]
+        job = srv.jobs[job_id]
+        srv.polls[job_id] += 1
+        if job.get("throttle") and srv.polls[job_id] <= job["throttle"]:
+            return self._send(429, b"{}", {"Content-Type": "application/json", "Retry-After": "1"})
+        elapsed = time.monotonic() - job["created"]
+        if job.get("fail"):
+            return self._send(200, json.dumps({"status": "FAILED"}).encode())
+        if elapsed < job["secs"]:
+            progress = int(100 * elapsed / job["secs"])
+            return self._send(200, json.dumps({"status": "PROCESSING", "progress": progress}).encode())
+        srv.seen_done.setdefault(job_id, elapsed - job["secs"])
+        base = f"http://127.0.0.1:{srv.server_address[1]}/files/{job_id}"
+        stems = {name: f"{base}/{name}.mp3" for name in STEMS}
+        self._send(200, json.dumps({"status": "COMPLETED", "stems": stems}).encode())
+
+
+class FakeStemSplit(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeStemSplitHandler)
+        self.lock = threading.Lock()
+        self.jobs, self.plans, self.polls, self.seen_done = {}, [], Counter(), {}
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {name:<34} {detail} {'✓' if ok else '✗'}")
+    return ok
+
+
+async def separate_many(n: int) -> tuple:
+    """(results, seconds, largest event-loop stall, peak thread count)"""
+    stall, peak, running = [0.0], [threading.active_count()], [True]
+
+    async def heartbeat():
+        while running[0]:
+            t = time.perf_counter()
+            await asyncio.sleep(0.02)
+            stall[0] = max(stall[0], time.perf_counter() - t - 0.02)
+            peak[0] = max(peak[0], threading.active_count())
+
+    beat = asyncio.ensure_future(heartbeat())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(ai_service.separate_stems_async(INPUT) for _ in range(n)))
+    secs = time.perf_counter() - start
+    running[0] = False
+    await beat
+    return results, secs, stall[0], peak[0]
+
+
+def separated(stems: dict) -> bool:
+    return all(stems.get(s, INPUT) != INPUT for s in STEMS) and all(os.path.getsize(stems[s]) == STEM_BYTES for s in STEMS)
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(INPUT, "wb") as f:
+        f.write(b"\0" * 1000)
+    shutil.rmtree(os.path.join("temp", "stems"), ignore_errors=True)
+    server = FakeStemSplit()
+    ai_service.STEMSPLIT_BASE = f"http://127.0.0.1:{server.server_address[1]}"
+    ai_service.STEMSPLIT_API_KEY = "stub"
+    ai_service.BYTEZ_API_KEY = ""
+    lookup_cache.LOOKUP_CACHE_ENABLED = False
+    ai_service._stem_poller = StemSplitPoller(ai_service._stemsplit_status, ai_service._download_file,
+                                              poll_first=0.3, poll_max=2.0, timeout=3.0, download_workers=8)
+    results = []
+    print("\n--- StemSplit poller against a fake StemSplit server ---")
+
+    job_secs = [1.0, 1.5, 2.0, 2.0, 2.5, 2.5]
+    server.plans = [{"secs": s} for s in job_secs]
+    threads_before = threading.active_count()
+    out, secs, stall, peak = asyncio.run(separate_many(len(job_secs)))
+    results.append(check("6 concurrent separations", all(separated(o) for o in out) and secs < max(job_secs) + 1.5,
+                         f"{secs:.2f}s (longest job {max(job_secs)}s, sum {sum(job_secs)}s)"))
+    pollers = sum(t.name == "stemsplit-poller" for t in threading.enumerate())
+    results.append(check("one poller, loop responsive", pollers == 1 and stall < 0.1,
+                         f"{pollers} poller thread, threads {threads_before} → {peak} peak, loop stall {stall * 1000:.0f} ms"))
+
+    polls = sum(server.polls.values())
+    fixed = sum(int(s / 0.3) + 1 for s in job_secs)
+    lag = max(server.seen_done.values())
+    results.append(check("adaptive backoff", polls < fixed and lag < 0.8,
+                         f"{polls} polls vs {fixed} at a fixed 0.3s, done noticed ≤{lag:.2f}s late"))
+
+    server.plans = [{"secs": 0.5, "throttle": 2}]
+    before = metrics.snapshot().get("stemsplit.download.secs", 0)
+    start = time.perf_counter()
+    stems = ai_service.separate_stems(INPUT)
+    job = f"job{len(server.jobs) - 1}"
+    results.append(check("429 → backed off, then completes", separated(stems) and server.polls[job] >= 3,
+                         f"{server.polls[job]} polls, {time.perf_counter() - start:.2f}s (sync separate_stems)"))
+    download = metrics.snapshot()["stemsplit.download.secs"] - before
+    results.append(check("parallel stem downloads", download < 2 * DOWNLOAD_DELAY,
+                         f"{len(STEMS)} stems × {DOWNLOAD_DELAY}s in {download:.2f}s"))
+
+    server.plans = [{"secs": 0.5, "fail": True}, {"secs": 60}]
+    failed = asyncio.run(ai_service.separate_stems_async(INPUT))
+    start = time.perf_counter()
+    hung = asyncio.run(ai_service.separate_stems_async(INPUT))
+    t_hung = time.perf_counter() - start
+    fallback = {"vocals": INPUT, "other": INPUT}
+    snap = metrics.snapshot()
+    results.append(check("failed / timed-out job → fallback", failed == fallback and hung == fallback and t_hung < 3.6,
+                         f"timeout after {t_hung:.2f}s, metrics failed {snap.get('stemsplit.failed', 0)} "
+                         f"timeout {snap.get('stemsplit.timeout', 0)}"))
+
+    server.shutdown()
+    shutil.rmtree(os.path.join("temp", "stems"), ignore_errors=True)
+    os.remove(INPUT)
+    print("\n✅ STEM POLLER OK" if all(results) else "\n❌ STEM POLLER CHECK FAILED")
+    sys.exit(0 if all(results) else 1)
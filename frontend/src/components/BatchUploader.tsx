@@ -119,22 +119,38 @@ export default function BatchUploader({
         }
     };
 
+    /* ── Upload one item (once) ── */
+    const uploadItem = async (item: BatchItem): Promise<string | undefined> => {
+        if (item.fileId) return item.fileId;
+        update(item.id, { status: 'uploading' });
+        try {
+            const fd = new FormData(); fd.append('file', item.file);
+            const res = await axios.post(`${API}/api/upload`, fd);
+            update(item.id, { fileId: res.data.file_id });
+            return res.data.file_id;
+        } catch {
+            update(item.id, { status: 'error', error: 'Upload failed' }); return undefined;
+        }
+    };
+
+    /* ── Analyse the whole batch on the server's process pool ── */
+    const analyzeBatch = (fileIds: string[]) => {
+        // Fire-and-forget: the server keeps each result and /process picks it up
+        // (waiting for it if still running), so nothing here depends on the stream
+        fetch(`${API}/api/analyze-batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ file_ids: fileIds }),
+        }).then(res => res.body?.pipeTo(new WritableStream())).catch(() => { });
+    };
+
     /* ── Process one item ── */
     const processItem = async (item: BatchItem) => {
         if (abortRef.current) return;
 
         // UPLOAD
-        let fileId: string | undefined = item.fileId;
-        if (!fileId) {
-            update(item.id, { status: 'uploading' });
-            try {
-                const fd = new FormData(); fd.append('file', item.file);
-                const res = await axios.post(`${API}/api/upload`, fd);
-                fileId = res.data.file_id;
-            } catch {
-                update(item.id, { status: 'error', error: 'Upload failed' }); return;
-            }
-        }
+        const fileId = await uploadItem(item);
+        if (!fileId) return;
 
         // PROCESS
         update(item.id, { status: 'processing', progress: 5 });
@@ -190,7 +206,17 @@ export default function BatchUploader({
         abortRef.current = false;
         setRunning(true);
         const queued = items.filter(i => i.status === 'queued' || i.status === 'error');
+
+        // Upload everything first so the DNA analysis of the batch runs in parallel
+        const uploaded: BatchItem[] = [];
         for (const item of queued) {
+            if (abortRef.current) break;
+            const fileId = await uploadItem(item);
+            if (fileId) uploaded.push({ ...item, fileId });
+        }
+        if (uploaded.length > 1) analyzeBatch(uploaded.map(i => i.fileId!));
+
+        for (const item of uploaded) {
             if (abortRef.current) break;
             await processItem(item);
         }